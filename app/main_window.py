@@ -1,3 +1,6 @@
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, Qt, pyqtSignal
+from PyQt6.QtGui import QCloseEvent
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout,
     QPushButton, QLabel, QMessageBox
@@ -6,17 +9,48 @@ from PyQt6.QtWidgets import (
 from app.dialogs import ExcludeDocsDialog, ExcludeDoctorsDialog, AppearanceDialog, FolderPathDialog
 from utils.config_manager import ConfigManager
 from services.coordinate_tracker import CoordinateTracker
-from services.csv_excel_transfer import transfer_csv_to_excel
+from services.csv_excel_transfer import (
+    transfer_csv_to_excel,
+    transfer_all_csv_to_excel,
+    transfer_csv_files_to_excel
+)
+from services.backup_worker import BackupJob, backup_worker
+from services.folder_watcher import FolderWatcher
 from services.file_manager import cleanup_old_backup_files
 from app import __version__
 
 
+class BackupNotifier(QObject):
+    """ワーカースレッドのバックアップの完了・失敗をGUIスレッドに通知する
+
+    ウィンドウより長く存在し、閉じたウィンドウへの接続はQtが自動的に解除する
+    """
+    finished = pyqtSignal(object)
+
+
+_backup_notifier = None
+
+
+def get_backup_notifier() -> BackupNotifier:
+    """バックアップの通知用オブジェクトを取得（QApplicationを作り直した場合は作り直す）"""
+    global _backup_notifier
+    if _backup_notifier is None or sip.isdeleted(_backup_notifier):
+        _backup_notifier = BackupNotifier()
+        backup_worker.set_listener(_backup_notifier.finished.emit)
+    return _backup_notifier
+
+
 class MainWindow(QMainWindow):
+    csv_files_ready = pyqtSignal(list)
+
     def __init__(self):
         super().__init__()
         self.config = ConfigManager()
+        self.watcher = None
 
-        cleanup_old_backup_files()
+        # バックアップの完了・失敗はワーカースレッドからシグナルで受け取る
+        get_backup_notifier().finished.connect(self.on_backup_finished)
+        backup_worker.submit(cleanup_old_backup_files)
 
         self.tracker = CoordinateTracker()
         font = self.font()
@@ -56,6 +90,10 @@ class MainWindow(QMainWindow):
         csv_button.clicked.connect(self.import_csv)
         layout.addWidget(csv_button)
 
+        batch_csv_button = QPushButton("未処理CSVを一括取り込み")
+        batch_csv_button.clicked.connect(self.import_all_csv)
+        layout.addWidget(batch_csv_button)
+
         settings_label = QLabel("設定")
         layout.addWidget(settings_label)
 
@@ -85,12 +123,56 @@ class MainWindow(QMainWindow):
 
         main_widget.setLayout(layout)
 
+        if self.config.get_watcher_enabled():
+            self.start_folder_watcher()
+
     def import_csv(self):
         try:
             transfer_csv_to_excel()
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"CSVファイルの取り込み中にエラーが発生しました:\n{str(e)}")
 
+    def import_all_csv(self):
+        try:
+            transfer_all_csv_to_excel()
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"CSVファイルの一括取り込み中にエラーが発生しました:\n{str(e)}")
+
+    def start_folder_watcher(self):
+        # 取り込みはGUIスレッドで実行し、完了するまで監視側のワーカーを待機させる
+        # PyQt6の型スタブのconnectには接続方法の引数（type）が定義されていない
+        self.csv_files_ready.connect(self.import_csv_files,
+                                     type=Qt.ConnectionType.BlockingQueuedConnection)  # type: ignore[call-arg]
+        self.watcher = FolderWatcher(
+            self.config.get_downloads_path(),
+            self.csv_files_ready.emit,
+            stable_seconds=self.config.get_watcher_stable_seconds(),
+            debounce_seconds=self.config.get_watcher_debounce_seconds(),
+            poll_interval=self.config.get_watcher_poll_interval()
+        )
+        self.watcher.start()
+
+    def import_csv_files(self, csv_paths):
+        try:
+            transfer_csv_files_to_excel(csv_paths)
+        except Exception as e:
+            QMessageBox.critical(self, "エラー", f"CSVファイルの自動取り込み中にエラーが発生しました:\n{str(e)}")
+
+    def on_backup_finished(self, job: BackupJob):
+        if job.error is not None:
+            QMessageBox.warning(self, "警告", f"バックアップの処理中にエラーが発生しました:\n{str(job.error)}")
+        elif job.excel_path is not None:
+            print(f"バックアップが完了しました（{job.seconds:.2f}秒）: {job.excel_path}")
+
+    def closeEvent(self, event: QCloseEvent | None) -> None:  # type: ignore[override]
+        if self.watcher is not None:
+            self.watcher.stop(timeout=1.0)
+            self.watcher = None
+        # 実行中のバックアップが終わるまで待ってから終了する
+        if not backup_worker.flush(timeout=30.0):
+            print("バックアップが終わらないまま終了します")
+        super().closeEvent(event)
+
     def show_exclude_docs_dialog(self):
         dialog = ExcludeDocsDialog(self)
         dialog.exec()
@@ -0,0 +1,109 @@
+import datetime
+import random
+from pathlib import Path
+from typing import Optional
+
+from openpyxl import Workbook
+
+# Papyrusの書類受付リストの列（11列）
+PAPYRUS_HEADER = ['職員ID', '受付番号', '区分', '預り日', '患者ID', '患者名',
+                  '文書名', '診療科', '備考', '医師名', '状態']
+EXCEL_HEADER = ['預り日', '患者ID', '患者名', '文書名', '診療科', '医師名']
+
+FAMILY_NAMES = ['佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤',
+                '吉田', '山田', '佐々木', '山口', '松本', '井上', '木村', '林', '斎藤', '清水']
+GIVEN_NAMES = ['太郎', '花子', '一郎', '美咲', '健太', '陽子', '翔太', '由美', '大輔', '明美',
+               '直樹', '恵子', '拓也', '裕子', '誠', '真由美', '隆', '久美子', '浩二', '幸子']
+DOCUMENTS = ['診断書', '生命保険診断書', '傷病手当金意見書', '主治医意見書', '紹介状',
+             '身体障害者診断書', '介護保険意見書', '通院証明書', '入院証明書', '死亡診断書']
+DEPARTMENTS = ['内科', '外科', '整形外科', '眼科', '皮膚科', '小児科', '泌尿器科',
+               '耳鼻咽喉科', '産婦人科', '脳神経外科', '循環器内科', '消化器内科']
+
+PREAMBLE = ['Papyrus書類受付リスト', '出力日時,{exported}', '']
+
+Record = tuple[datetime.date, int, str, str, str, str]
+
+
+def generate_records(rows: int, duplicate_ratio: float = 0.0, seed: int = 0,
+                     start_date: datetime.date = datetime.date(2025, 1, 1)) -> list[Record]:
+    """預り日・患者ID・患者名・文書名・診療科・医師名の組を生成
+
+    Args:
+        rows: 生成する行数
+        duplicate_ratio: 先に生成した行と同じ内容にする行の割合（0～1）
+        seed: 乱数のシード（同じ値なら同じ内容を生成）
+        start_date: 最初の預り日（1日あたり約200件ずつ進める）
+
+    Returns:
+        生成した行のリスト
+    """
+    rng = random.Random(seed)
+    doctors = [f"{rng.choice(FAMILY_NAMES)}{rng.choice(GIVEN_NAMES)}" for _ in range(40)]
+    doctor_departments = [rng.choice(DEPARTMENTS) for _ in doctors]
+
+    records: list[Record] = []
+    for i in range(rows):
+        if records and rng.random() < duplicate_ratio:
+            records.append(rng.choice(records))
+            continue
+        doctor_index = rng.randrange(len(doctors))
+        records.append((
+            start_date + datetime.timedelta(days=i // 200),
+            rng.randint(1, 99_999_999),
+            f"{rng.choice(FAMILY_NAMES)}{rng.choice(GIVEN_NAMES)}",
+            rng.choice(DOCUMENTS),
+            doctor_departments[doctor_index],
+            doctors[doctor_index],
+        ))
+    return records
+
+
+def write_papyrus_csv(path: str | Path, records: list[Record], encoding: str = 'shift-jis',
+                      staff_id: str = '0001') -> str:
+    """Papyrus出力形式（先頭3行の前置き＋ヘッダー）のCSVファイルを作成
+
+    文書名・医師名には実際の出力と同様に半角・全角スペースを含める
+
+    Args:
+        path: 作成するCSVファイルのパス
+        records: generate_recordsで生成した行
+        encoding: CSVファイルのエンコーディング
+        staff_id: 職員ID列の値
+
+    Returns:
+        作成したCSVファイルのパス
+    """
+    exported = datetime.datetime.now().strftime('%Y/%m/%d %H:%M')
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        for line in PREAMBLE:
+            f.write(line.format(exported=exported) + '\r\n')
+        f.write(','.join(PAPYRUS_HEADER) + '\r\n')
+        for i, (date, patient_id, patient, document, department, doctor) in enumerate(records, 1):
+            fields = [
+                staff_id, str(i), '受付', date.strftime('%Y%m%d'), str(patient_id), patient,
+                f"{document[:2]} {document[2:]}", department, '', f"{doctor[:2]}　{doctor[2:]}", '済',
+            ]
+            f.write(','.join(fields) + '\r\n')
+    return str(path)
+
+
+def write_excel_workbook(path: str | Path, records: Optional[list[Record]] = None) -> str:
+    """見出し行と指定した行を持つ転記先のExcelファイル（.xlsm）を作成
+
+    大量の行を短時間で作成するため書き込み専用モードで保存する
+
+    Args:
+        path: 作成するExcelファイルのパス
+        records: 既存データとして書き込む行（generate_recordsで生成した行）
+
+    Returns:
+        作成したExcelファイルのパス
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(EXCEL_HEADER)
+    for date, patient_id, patient, document, department, doctor in records or []:
+        ws.append([datetime.datetime.combine(date, datetime.time()), patient_id, patient,
+                   document, department, doctor])
+    wb.save(path)
+    return str(path)
@@ -0,0 +1,215 @@
+import argparse
+import datetime
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import openpyxl
+import polars as pl
+from openpyxl import load_workbook
+from openpyxl.worksheet.worksheet import Worksheet
+
+from benchmarks.generators import generate_records, write_excel_workbook, write_papyrus_csv
+from services.csv_processor import (
+    convert_date_format,
+    load_processed_csv,
+    process_csv_data,
+    read_csv_with_encoding
+)
+from services.excel_processor import (
+    _read_existing_keys,
+    append_batches_to_workbook,
+    apply_cell_formats,
+    get_last_row,
+    write_data_to_excel
+)
+from services.workbook_reader import read_key_columns
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 500_000]
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+
+def measure(func: Callable[[], Any], repeat: int,
+            setup: Optional[Callable[[], None]] = None) -> dict[str, Any]:
+    """関数をrepeat回実行し、所要時間（秒）とメモリ使用量の増加を記録
+
+    Args:
+        func: 計測する処理
+        repeat: 実行回数
+        setup: 毎回の実行前に行う準備（計測に含めない）
+
+    Returns:
+        最小・平均・各回の所要時間と、プロセスのメモリ使用量の増加（psutilがない場合はNone）
+    """
+    times = []
+    rss_delta = None
+    process = psutil.Process() if psutil else None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        rss_before = process.memory_info().rss if process else 0
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+        if process:
+            delta = process.memory_info().rss - rss_before
+            rss_delta = delta if rss_delta is None else max(rss_delta, delta)
+    return {
+        'min_seconds': min(times),
+        'mean_seconds': statistics.fmean(times),
+        'runs': times,
+        'rss_delta_bytes': rss_delta,
+    }
+
+
+def benchmark_size(rows: int, work_dir: Path, repeat: int, duplicate_ratio: float,
+                   overlap_ratio: float) -> list[dict[str, Any]]:
+    """指定した行数のCSVファイルとExcelファイルを作成して各処理の所要時間を計測
+
+    Args:
+        rows: CSVファイルの行数（Excelファイルの既存行数も同じ）
+        work_dir: テストデータを作成するフォルダ
+        repeat: 各処理の実行回数
+        duplicate_ratio: CSVファイル内で重複する行の割合
+        overlap_ratio: Excelファイルに既に存在する行の割合
+
+    Returns:
+        処理ごとの計測結果
+    """
+    existing = generate_records(rows, seed=1)
+    overlap = int(rows * overlap_ratio)
+    incoming = existing[:overlap] + generate_records(rows - overlap, duplicate_ratio, seed=2)
+
+    csv_path = write_papyrus_csv(work_dir / f"0001_{rows}.csv", incoming)
+    template_path = write_excel_workbook(work_dir / f"template_{rows}.xlsm", existing)
+    excel_path = str(work_dir / f"bench_{rows}.xlsm")
+
+    def restore_workbook() -> None:
+        shutil.copyfile(template_path, excel_path)
+
+    def read_keys_with_openpyxl() -> None:
+        # 従来の方法: ブック全体を読み込み、セルを1つずつ取得
+        keys_wb = load_workbook(template_path, keep_vba=True)
+        keys_ws: Worksheet = keys_wb.active  # type: ignore[assignment]
+        _read_existing_keys(keys_ws, get_last_row(keys_ws))
+        keys_wb.close()
+
+    raw_df = read_csv_with_encoding(csv_path)
+    loaded_df = load_processed_csv(csv_path)
+    if raw_df is None or loaded_df is None:
+        raise ValueError(f"CSVファイルを読み込めませんでした: {csv_path}")
+    processed_df = process_csv_data(raw_df)
+
+    wb = load_workbook(template_path, keep_vba=True)
+    ws: Worksheet = wb.active  # type: ignore[assignment]
+
+    cases: list[tuple[str, Callable[[], Any], Optional[Callable[[], None]]]] = [
+        ('read_csv_with_encoding', lambda: read_csv_with_encoding(csv_path), None),
+        ('process_csv_data', lambda: process_csv_data(raw_df), None),
+        ('convert_date_format', lambda: convert_date_format(processed_df), None),
+        ('load_processed_csv', lambda: load_processed_csv(csv_path), None),
+        ('get_last_row', lambda: get_last_row(ws), None),
+        ('existing_keys_openpyxl', read_keys_with_openpyxl, None),
+        ('read_key_columns', lambda: read_key_columns(template_path), None),
+        ('apply_cell_formats', lambda: apply_cell_formats(ws, 2), None),
+        ('write_data_to_excel', lambda: write_data_to_excel(excel_path, loaded_df), restore_workbook),
+        ('append_batches_to_workbook_patch',
+         lambda: append_batches_to_workbook(excel_path, [loaded_df], engine='patch'), restore_workbook),
+    ]
+
+    results = []
+    for name, func, setup in cases:
+        print(f"  {name} ({rows:,}行)...", flush=True)
+        result = measure(func, repeat, setup)
+        result.update({'function': name, 'rows': rows})
+        results.append(result)
+        print(f"    {result['min_seconds']:.3f}秒", flush=True)
+    wb.close()
+    return results
+
+
+def environment_info() -> dict[str, Any]:
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'polars': pl.__version__,
+        'openpyxl': openpyxl.__version__,
+    }
+
+
+def run_benchmarks(sizes: list[int], output: str, repeat: int = 3, duplicate_ratio: float = 0.05,
+                   overlap_ratio: float = 0.1, work_dir: Optional[str] = None) -> dict[str, Any]:
+    """行数ごとに各処理の所要時間を計測し、JSONファイルに出力
+
+    Args:
+        sizes: 計測する行数
+        output: 結果を出力するJSONファイルのパス
+        repeat: 各処理の実行回数
+        duplicate_ratio: CSVファイル内で重複する行の割合
+        overlap_ratio: Excelファイルに既に存在する行の割合
+        work_dir: テストデータを作成するフォルダ（省略時は一時フォルダを作成して削除）
+
+    Returns:
+        出力した計測結果
+    """
+    report: dict[str, Any] = {
+        'environment': environment_info(),
+        'parameters': {
+            'sizes': sizes,
+            'repeat': repeat,
+            'duplicate_ratio': duplicate_ratio,
+            'overlap_ratio': overlap_ratio,
+        },
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory(prefix='csv2xl_bench_') as temp_dir:
+        base_dir = Path(work_dir or temp_dir)
+        base_dir.mkdir(parents=True, exist_ok=True)
+        for rows in sizes:
+            print(f"{rows:,}行のデータで計測しています", flush=True)
+            report['results'].extend(
+                benchmark_size(rows, base_dir, repeat, duplicate_ratio, overlap_ratio))
+            # 途中で中断しても計測済みの結果が残るように毎回出力する
+            Path(output).write_text(json.dumps(report, ensure_ascii=False, indent=2),
+                                    encoding='utf-8')
+
+    print(f"計測結果を出力しました: {output}")
+    return report
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="合成データで読み込み・加工・書き込みの所要時間を計測"
+    )
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="計測する行数（既定値: 1000 10000 100000 500000）")
+    parser.add_argument('--repeat', type=int, default=3, help="各処理の実行回数（既定値: 3）")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.05,
+                        help="CSVファイル内で重複する行の割合（既定値: 0.05）")
+    parser.add_argument('--overlap-ratio', type=float, default=0.1,
+                        help="Excelファイルに既に存在する行の割合（既定値: 0.1）")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help=f"結果を出力するJSONファイル（既定値: {DEFAULT_OUTPUT}）")
+    parser.add_argument('--work-dir', help="テストデータを作成するフォルダ（省略時は一時フォルダ）")
+    args = parser.parse_args(argv)
+
+    run_benchmarks(args.sizes, args.output, args.repeat, args.duplicate_ratio,
+                   args.overlap_ratio, args.work_dir)
+
+
+if __name__ == "__main__":
+    main()
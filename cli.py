@@ -0,0 +1,81 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import sys
+from typing import Optional
+
+from services.backup_worker import backup_worker
+from services.excel_processor import ExcelFileLockedError
+from services.file_manager import list_backups, restore_backup
+from services.import_pipeline import format_stats, rollback_workbook, run_import, undo_import
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m cli",
+        description="CSVファイルをGUIを使わずにExcelファイルへ取り込む"
+    )
+    parser.add_argument('--csv', help="取り込むCSVファイル（省略時はダウンロードフォルダの最新ファイル）")
+    parser.add_argument('--excel', help="転記先のExcelファイル（省略時は設定ファイルの値）")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="重複確認までを行い、ファイルの変更は行わない")
+    parser.add_argument('--json-stats', action='store_true',
+                        help="処理段階ごとの所要時間と行数をJSON形式で出力")
+    parser.add_argument('--no-sort', action='store_true',
+                        help="Excelでのソートと共有を行わない")
+    parser.add_argument('--undo', action='store_true',
+                        help="保存後に中断した取り込みで追記した行を取り消す")
+    parser.add_argument('--rollback', action='store_true',
+                        help="Excelファイルを最後に保存する前の状態に戻す")
+    parser.add_argument('--list-backups', action='store_true',
+                        help="保存しているバックアップの一覧を表示する")
+    parser.add_argument('--restore-backup', metavar='SNAPSHOT_ID',
+                        help="バックアップからExcelファイルを復元する")
+    parser.add_argument('--restore-to', metavar='PATH',
+                        help="復元先のファイル（省略時はバックアップフォルダに作成）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    # JSON出力時は処理中のメッセージを標準エラーに出力し、標準出力をJSONのみにする
+    output = sys.stderr if args.json_stats else sys.stdout
+    try:
+        if args.undo:
+            removed = undo_import(args.excel)
+            print(f"{removed:,}行の追記を取り消しました")
+            return 0
+        if args.rollback:
+            rollback_workbook(args.excel)
+            print("Excelファイルを保存前の状態に戻しました")
+            return 0
+        if args.list_backups:
+            for snapshot in list_backups():
+                print(f"{snapshot.snapshot_id}  {snapshot.created}  {snapshot.size:,}バイト  {snapshot.source}")
+            return 0
+        if args.restore_backup:
+            restore_backup(args.restore_backup, args.restore_to)
+            return 0
+        with contextlib.redirect_stdout(output):
+            stats = run_import(args.csv, args.excel, dry_run=args.dry_run, sort=not args.no_sort)
+    except (FileNotFoundError, ValueError, ExcelFileLockedError) as e:
+        print(f"エラー: {str(e)}", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"CSVファイルの取り込み中にエラーが発生しました: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        # ワーカースレッドのバックアップが終わるまで待ってから終了する
+        backup_worker.flush()
+
+    if args.json_stats:
+        print(json.dumps(stats.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(format_stats(stats))
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
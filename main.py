@@ -1,12 +1,19 @@
+import multiprocessing
 import sys
 
-from PyQt6.QtWidgets import QApplication
 
-from app.main_window import MainWindow
+def main() -> int:
+    # プロセスプールの子プロセスでQtを読み込まないよう、freeze_supportの後に読み込む
+    from PyQt6.QtWidgets import QApplication
 
+    from app.main_window import MainWindow
 
-if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec())
+    return app.exec()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # PyInstallerで生成した実行ファイルでプロセスプールを使用するため
+    sys.exit(main())
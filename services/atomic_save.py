@@ -0,0 +1,98 @@
+import os
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from services.backup_store import fsync_file
+
+# 保存前のファイルを残す世代のファイル名（<ファイル名>.prev.xlsm）
+ROLLBACK_SUFFIX = '.prev'
+
+
+def rollback_path_for(excel_path: str) -> Path:
+    """保存前のファイル（1世代前）のパスを取得"""
+    path = Path(excel_path)
+    return path.with_name(path.stem + ROLLBACK_SUFFIX + path.suffix)
+
+
+@contextmanager
+def atomic_write(target_path: str, keep_rollback: bool = True) -> Iterator[str]:
+    """同じフォルダの一時ファイルに書き込み、ディスクに反映してから置き換える
+
+    置き換える前のファイルはハードリンク（使えない場合はコピー）で1世代前として残す。
+    書き込み中に失敗した場合は一時ファイルを削除し、元のファイルは変更しない
+
+    Args:
+        target_path: 置き換えるファイルのパス
+        keep_rollback: Falseの場合は1世代前のファイルを残さない
+
+    Yields:
+        書き込む一時ファイルのパス
+    """
+    target = os.path.abspath(target_path)
+    directory = os.path.dirname(target)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    os.close(fd)
+    rollback_temp = None
+    try:
+        yield temp_path
+        fsync_file(Path(temp_path))
+        if os.path.exists(target):
+            shutil.copymode(target, temp_path)
+            if keep_rollback:
+                rollback_temp = _link_previous(target, directory)
+        os.replace(temp_path, target)
+        if rollback_temp is not None:
+            os.replace(rollback_temp, rollback_path_for(target))
+            rollback_temp = None
+        fsync_directory(directory)
+    finally:
+        for path in (temp_path, rollback_temp):
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+
+
+def rollback_file(target_path: str) -> Path:
+    """1世代前のファイルに戻す（名前の変更のみのためファイルの大きさによらない）
+
+    Args:
+        target_path: 戻すファイルのパス
+
+    Returns:
+        戻したファイルのパス
+
+    Raises:
+        FileNotFoundError: 1世代前のファイルがない場合
+    """
+    previous = rollback_path_for(target_path)
+    if not previous.exists():
+        raise FileNotFoundError(f"元に戻せるファイルがありません: {previous}")
+    os.replace(previous, target_path)
+    fsync_directory(os.path.dirname(os.path.abspath(target_path)))
+    return Path(target_path)
+
+
+def _link_previous(target: str, directory: str) -> str:
+    """置き換える前のファイルをハードリンクで残す（ハードリンクを使えないドライブではコピーする）"""
+    fd, link_path = tempfile.mkstemp(suffix='.prev.tmp', dir=directory)
+    os.close(fd)
+    os.remove(link_path)
+    try:
+        os.link(target, link_path)
+    except OSError:
+        shutil.copy2(target, link_path)
+    return link_path
+
+
+def fsync_directory(directory: str) -> None:
+    """名前の変更をディスクに反映（Windowsではフォルダを開けないため何もしない）"""
+    if sys.platform.startswith('win'):
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
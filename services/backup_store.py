@@ -0,0 +1,284 @@
+import datetime
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+# バックアップフォルダ内のスナップショット保存先
+STORE_DIRNAME = 'store'
+OBJECTS_DIRNAME = 'objects'
+SNAPSHOTS_DIRNAME = 'snapshots'
+SNAPSHOT_ID_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+@dataclass
+class SnapshotPart:
+    """スナップショットに含まれるzip内の部品
+
+    Attributes:
+        name: zip内のファイル名
+        digest: 内容のSHA-256（保存先のオブジェクト名）
+        size: 展開後のサイズ
+        crc: zipに記録されたCRC
+        compress_type: zipの圧縮方式
+        date_time: zipに記録された更新日時
+    """
+    name: str
+    digest: str
+    size: int
+    crc: int
+    compress_type: int
+    date_time: list[int]
+
+
+@dataclass
+class Snapshot:
+    """Excelファイルのバックアップ1回分の記録
+
+    Attributes:
+        snapshot_id: 作成日時から作る識別子
+        source: バックアップ元のExcelファイルのパス
+        created: 作成日時（ISO形式）
+        parts: zip内の部品（元のファイルでの順）
+        stored_bytes: 作成時に新たに保存したオブジェクトのサイズ（圧縮後）
+    """
+    snapshot_id: str
+    source: str
+    created: str
+    parts: list[SnapshotPart] = field(default_factory=list)
+    stored_bytes: int = 0
+
+    @property
+    def size(self) -> int:
+        return sum(part.size for part in self.parts)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Snapshot':
+        parts = [SnapshotPart(**part) for part in data.get('parts', [])]
+        return cls(data['snapshot_id'], data['source'], data['created'], parts,
+                   data.get('stored_bytes', 0))
+
+
+class BackupStore:
+    """Excelファイル（.xlsm）をzip内の部品ごとに内容のハッシュで保存するバックアップ
+
+    部品は内容のSHA-256を名前にしたオブジェクトとして1回だけ保存し、スナップショットには部品の一覧のみを記録する。
+    前回のスナップショットと名前・CRC・サイズが同じ部品は読み込まずに再利用するため、
+    バックアップの読み書きは変更された部品（主にワークシートと共有文字列）の大きさに比例する
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = Path(root)
+        self.objects_dir: Path = self.root / OBJECTS_DIRNAME
+        self.snapshots_dir: Path = self.root / SNAPSHOTS_DIRNAME
+
+    def snapshot(self, excel_path: str) -> Snapshot:
+        """Excelファイルのスナップショットを作成
+
+        Args:
+            excel_path: バックアップ元のExcelファイルのパス
+
+        Returns:
+            作成したスナップショット
+
+        Raises:
+            OSError: ファイルの読み書きに失敗した場合
+            zipfile.BadZipFile: Excelファイルがzip形式でない場合
+        """
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+
+        source = os.path.abspath(excel_path)
+        previous = self._latest_parts(source)
+        now = datetime.datetime.now()
+        snapshot = Snapshot(self._new_snapshot_id(now), source, now.isoformat(timespec='seconds'))
+        with zipfile.ZipFile(excel_path) as zf:
+            for info in zf.infolist():
+                part = previous.get((info.filename, info.CRC, info.file_size))
+                if part is None or not self._object_path(part.digest).exists():
+                    data = zf.read(info)
+                    digest = hashlib.sha256(data).hexdigest()
+                    snapshot.stored_bytes += self._put_object(digest, data)
+                else:
+                    digest = part.digest
+                snapshot.parts.append(SnapshotPart(
+                    info.filename, digest, info.file_size, info.CRC,
+                    info.compress_type, list(info.date_time)))
+
+        _write_atomic(self.snapshot_path(snapshot.snapshot_id),
+                      json.dumps(asdict(snapshot), ensure_ascii=False).encode('utf-8'))
+        return snapshot
+
+    def list_snapshots(self) -> list[Snapshot]:
+        """保存しているスナップショットを作成日時の古い順に取得（読み込めない記録は無視する）"""
+        snapshots = []
+        if not self.snapshots_dir.exists():
+            return snapshots
+        for path in sorted(self.snapshots_dir.glob('*.json')):
+            try:
+                snapshots.append(Snapshot.from_dict(json.loads(path.read_text(encoding='utf-8'))))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"スナップショットを読み込めません: {path} - {str(e)}")
+        return snapshots
+
+    def get(self, snapshot_id: str) -> Snapshot:
+        """スナップショットを取得
+
+        Raises:
+            ValueError: スナップショットが見つからない場合
+        """
+        try:
+            data = self.snapshot_path(snapshot_id).read_text(encoding='utf-8')
+        except OSError:
+            raise ValueError(f"バックアップが見つかりません: {snapshot_id}")
+        return Snapshot.from_dict(json.loads(data))
+
+    def restore(self, snapshot_id: str, dest_path: str) -> Path:
+        """スナップショットからExcelファイルを復元
+
+        部品を元の順・圧縮方式・更新日時でzipに書き込み、一時ファイルから置き換える
+
+        Args:
+            snapshot_id: 復元するスナップショット
+            dest_path: 復元先のファイルパス
+
+        Returns:
+            復元したファイルのパス
+
+        Raises:
+            ValueError: スナップショットが見つからない場合や部品の内容が壊れている場合
+        """
+        snapshot = self.get(snapshot_id)
+        dest = Path(dest_path)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = dest.with_name(dest.name + '.tmp')
+        try:
+            with zipfile.ZipFile(temp_path, 'w') as zf:
+                for part in snapshot.parts:
+                    year, month, day, hour, minute, second = part.date_time
+                    info = zipfile.ZipInfo(part.name, (year, month, day, hour, minute, second))
+                    info.compress_type = part.compress_type
+                    zf.writestr(info, self._get_object(part.digest))
+            fsync_file(temp_path)
+            os.replace(temp_path, dest)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+        return dest
+
+    def prune(self, older_than: datetime.datetime) -> int:
+        """指定した日時より前に作成したスナップショットと、参照されなくなったオブジェクトを削除
+
+        Args:
+            older_than: この日時より前のスナップショットを削除する
+
+        Returns:
+            削除したスナップショットの数
+        """
+        removed = 0
+        for snapshot in self.list_snapshots():
+            if datetime.datetime.fromisoformat(snapshot.created) < older_than:
+                try:
+                    self.snapshot_path(snapshot.snapshot_id).unlink()
+                    removed += 1
+                except OSError as e:
+                    print(f"バックアップ削除中にエラーが発生しました: {snapshot.snapshot_id} - {str(e)}")
+        if removed:
+            self.collect_garbage()
+        return removed
+
+    def collect_garbage(self) -> int:
+        """どのスナップショットからも参照されないオブジェクトを削除
+
+        Returns:
+            削除したオブジェクトの数
+        """
+        if not self.objects_dir.exists():
+            return 0
+        referenced = {part.digest for snapshot in self.list_snapshots() for part in snapshot.parts}
+        removed = 0
+        for path in self.objects_dir.glob('*/*'):
+            if path.name not in referenced:
+                try:
+                    path.unlink()
+                    removed += 1
+                except OSError as e:
+                    print(f"バックアップ削除中にエラーが発生しました: {path} - {str(e)}")
+        return removed
+
+    def object_sizes(self) -> dict[str, int]:
+        """保存しているオブジェクトごとのディスク上のサイズ（圧縮後）を取得"""
+        if not self.objects_dir.exists():
+            return {}
+        sizes = {}
+        for path in self.objects_dir.glob('*/*'):
+            try:
+                sizes[path.name] = path.stat().st_size
+            except OSError:
+                continue
+        return sizes
+
+    def _latest_parts(self, source: str) -> dict[tuple[str, int, int], SnapshotPart]:
+        """同じExcelファイルの最新のスナップショットの部品を名前・CRC・サイズから引けるようにする"""
+        for snapshot in reversed(self.list_snapshots()):
+            if snapshot.source == source:
+                return {(part.name, part.crc, part.size): part for part in snapshot.parts}
+        return {}
+
+    def _new_snapshot_id(self, now: datetime.datetime) -> str:
+        snapshot_id = now.strftime(SNAPSHOT_ID_FORMAT)
+        while self.snapshot_path(snapshot_id).exists():
+            now += datetime.timedelta(microseconds=1)
+            snapshot_id = now.strftime(SNAPSHOT_ID_FORMAT)
+        return snapshot_id
+
+    def _put_object(self, digest: str, data: bytes) -> int:
+        """部品の内容を圧縮して保存（保存済みの場合は何もしない）し、書き込んだバイト数を返す"""
+        path = self._object_path(digest)
+        if path.exists():
+            return 0
+        path.parent.mkdir(exist_ok=True)
+        compressed = zlib.compress(data)
+        _write_atomic(path, compressed)
+        return len(compressed)
+
+    def _get_object(self, digest: str) -> bytes:
+        try:
+            data = zlib.decompress(self._object_path(digest).read_bytes())
+        except (OSError, zlib.error) as e:
+            raise ValueError(f"バックアップの部品を読み込めません: {digest} - {str(e)}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"バックアップの部品の内容が壊れています: {digest}")
+        return data
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest
+
+    def snapshot_path(self, snapshot_id: str) -> Path:
+        """スナップショットの記録ファイルのパス（削除するとスナップショットを削除したことになる）"""
+        return self.snapshots_dir / f"{snapshot_id}.json"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """一時ファイルに書き込んでディスクに反映してから置き換える"""
+    temp_path = path.with_name(path.name + '.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def fsync_file(path: Path) -> None:
+    """書き込んだファイルの内容をディスクに反映"""
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+
+
+def open_backup_store(backup_dir: Path) -> BackupStore:
+    """バックアップフォルダ内のスナップショット保存先を取得"""
+    return BackupStore(Path(backup_dir) / STORE_DIRNAME)
+
@@ -0,0 +1,133 @@
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+
+@dataclass
+class BackupJob:
+    """バックアップ・古いファイルの削除など、ワーカースレッドで実行する処理
+
+    Attributes:
+        name: 処理の名前（表示用）
+        func: 実行する関数
+        args: 関数に渡す引数
+        excel_path: 処理対象のExcelファイル（完了を待つ場合のキー）
+        on_success: 成功した場合にワーカースレッドで呼び出す関数
+        error: 失敗した場合の例外
+        seconds: 所要時間（秒）
+    """
+    name: str
+    func: Callable[..., Any]
+    args: tuple[Any, ...] = ()
+    excel_path: Optional[str] = None
+    on_success: Optional[Callable[[], None]] = None
+    error: Optional[Exception] = None
+    seconds: float = 0.0
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.done.is_set() and self.error is None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """処理が終わるまで待機（時間内に終わった場合はTrue）"""
+        return self.done.wait(timeout)
+
+
+class BackupWorker:
+    """バックアップと古いファイルの削除を取り込み・GUIのスレッドとは別の単一のワーカースレッドで順に実行
+
+    Excelファイルを変更する処理（書き込み・取り消し・Excelでのソート）は、
+    そのファイルのバックアップが終わるまで`wait`で待機してから行う。
+    完了・失敗はリスナー（GUIではシグナルのemit）に通知する
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue[BackupJob] = queue.Queue()
+        self._pending: list[BackupJob] = []
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._listener: Optional[Callable[[BackupJob], None]] = None
+
+    def set_listener(self, listener: Optional[Callable[[BackupJob], None]]) -> None:
+        """処理の完了・失敗を通知する関数を設定（ワーカースレッドから呼び出す）"""
+        self._listener = listener
+
+    def submit(self, func: Callable[..., Any], *args: Any, excel_path: Optional[str] = None,
+               on_success: Optional[Callable[[], None]] = None) -> BackupJob:
+        """処理をキューに追加
+
+        Args:
+            func: 実行する関数
+            *args: 関数に渡す引数
+            excel_path: 処理対象のExcelファイル（このファイルを変更する前に完了を待つ）
+            on_success: 成功した場合に呼び出す関数
+
+        Returns:
+            追加した処理
+        """
+        job = BackupJob(getattr(func, '__name__', str(func)), func, args,
+                        os.path.abspath(excel_path) if excel_path else None, on_success)
+        with self._condition:
+            self._pending.append(job)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="BackupWorker", daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def wait(self, excel_path: Optional[str] = None, timeout: Optional[float] = None) -> bool:
+        """キュー済みの処理が終わるまで待機
+
+        Args:
+            excel_path: 指定した場合はこのファイルの処理のみを待つ
+            timeout: 最大の待機秒数（省略時は終わるまで待つ）
+
+        Returns:
+            時間内にすべて終わった場合はTrue
+        """
+        target = os.path.abspath(excel_path) if excel_path else None
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while any(target is None or job.excel_path == target for job in self._pending):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """すべての処理が終わるまで待機（コマンドラインの終了時・ウィンドウを閉じる時に使う）"""
+        return self.wait(None, timeout)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            started = time.perf_counter()
+            try:
+                job.func(*job.args)
+                if job.on_success is not None:
+                    job.on_success()
+            except Exception as e:
+                job.error = e
+                print(f"{job.name}の実行中にエラーが発生しました: {str(e)}")
+            job.seconds = time.perf_counter() - started
+
+            with self._condition:
+                self._pending.remove(job)
+                job.done.set()
+                self._condition.notify_all()
+
+            listener = self._listener
+            if listener is not None:
+                try:
+                    listener(job)
+                except Exception as e:
+                    print(f"バックアップの完了通知中にエラーが発生しました: {str(e)}")
+
+
+# 取り込みで共有するワーカー
+backup_worker = BackupWorker()
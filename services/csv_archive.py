@@ -0,0 +1,151 @@
+import datetime
+from pathlib import Path
+from typing import Iterable, Optional
+
+import polars as pl
+
+from services.atomic_save import atomic_write
+from services.csv_schema import PAPYRUS_SCHEMA
+
+# 預り日の年月ごとのフォルダ（month=YYYY-MM）。預り日を日付に変換できない行はmonth=unknown
+PARTITION_COLUMN = 'month'
+UNKNOWN_PARTITION = 'unknown'
+SOURCE_COLUMN = '取込元'
+PART_PREFIX = 'part-'
+COMPACTED_PREFIX = 'data-'
+FILE_RANK_COLUMN = '__file_rank'
+
+ARCHIVE_SCHEMA = {
+    "預り日": pl.Date,
+    "患者ID": pl.Int64,
+    "患者名": pl.String,
+    "文書名": pl.String,
+    "診療科": pl.String,
+    "医師名": pl.String,
+    SOURCE_COLUMN: pl.String,
+}
+
+
+def normalize_archive_rows(df: pl.DataFrame, source: str) -> pl.DataFrame:
+    """加工済みのDataFrameをアーカイブの列・型に揃え、取込元のCSVファイル名を追加
+
+    日付変換に失敗して預り日が文字列のままの場合は変換できる値のみ日付にする
+    """
+    date_col = PAPYRUS_SCHEMA.names[0]
+    date_expr = pl.col(date_col)
+    if df.schema[date_col] != pl.Date:
+        date_expr = date_expr.cast(pl.String).str.strptime(pl.Date, format="%Y%m%d", strict=False)
+    exprs = [date_expr.alias(date_col)]
+    exprs += [pl.col(name).cast(ARCHIVE_SCHEMA[name], strict=False) for name in PAPYRUS_SCHEMA.names[1:]]
+    exprs.append(pl.lit(source, dtype=pl.String).alias(SOURCE_COLUMN))
+    return df.select(exprs)
+
+
+def archive_frames(archive_dir: Path, frames: Iterable[pl.DataFrame], source: str) -> int:
+    """加工済みの行を預り日の年月ごとのParquetファイルに追加
+
+    ファイル名は取込元のCSVファイル名から決めるため、同じCSVファイルを再度保存した場合は置き換える
+
+    Args:
+        archive_dir: アーカイブのフォルダ
+        frames: 加工済みのDataFrame
+        source: 取込元のCSVファイル名
+
+    Returns:
+        保存した行数
+    """
+    normalized = [normalize_archive_rows(df, source) for df in frames]
+    if not normalized:
+        return 0
+    rows = pl.concat(normalized, how='vertical')
+    if rows.is_empty():
+        return 0
+
+    rows = rows.with_columns(
+        pl.col("預り日").dt.strftime('%Y-%m').fill_null(UNKNOWN_PARTITION).alias(PARTITION_COLUMN))
+    for (month,), part in rows.partition_by(PARTITION_COLUMN, as_dict=True, include_key=False).items():
+        partition_dir = archive_dir / f"{PARTITION_COLUMN}={month}"
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        _write_parquet(part, partition_dir / f"{PART_PREFIX}{Path(source).stem}.parquet")
+    return len(rows)
+
+
+def compact_archive(archive_dir: Path, max_parts: int) -> int:
+    """ファイル数が上限を超えた年月のParquetファイルを1つにまとめる
+
+    同じCSVファイルを再度保存した場合は、そのCSVファイルの行を最も新しいファイルの分のみ残す。
+    Excelへの取り込みと同じく、1つのCSVファイル内で重複する行は除かない
+
+    Args:
+        archive_dir: アーカイブのフォルダ
+        max_parts: 年月ごとのファイル数の上限
+
+    Returns:
+        まとめた年月の数
+    """
+    compacted = 0
+    for partition_dir in sorted(archive_dir.glob(f"{PARTITION_COLUMN}=*")):
+        files = _files_oldest_first(partition_dir)
+        if len(files) <= max_parts:
+            continue
+        rows = (
+            pl.concat([
+                pl.read_parquet(path, hive_partitioning=False).with_columns(pl.lit(rank).alias(FILE_RANK_COLUMN))
+                for rank, path in enumerate(files)
+            ], how='vertical')
+            .filter(pl.col(FILE_RANK_COLUMN) == pl.col(FILE_RANK_COLUMN).max().over(SOURCE_COLUMN))
+            .drop(FILE_RANK_COLUMN)
+            .sort("預り日", maintain_order=True)
+        )
+        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f')
+        _write_parquet(rows, partition_dir / f"{COMPACTED_PREFIX}{timestamp}.parquet")
+        # まとめたファイルを保存してから元のファイルを削除する（途中で中断しても行は失われない）
+        for path in files:
+            path.unlink()
+        compacted += 1
+    return compacted
+
+
+def scan_archive(archive_dir: Path, start: Optional[datetime.date] = None,
+                 end: Optional[datetime.date] = None) -> pl.LazyFrame:
+    """アーカイブを預り日の範囲で読み込むLazyFrameを作成
+
+    範囲外の年月のフォルダは読み込まず、ファイル内も預り日の条件で読み飛ばす
+
+    Args:
+        archive_dir: アーカイブのフォルダ
+        start: 預り日の開始日（この日を含む）
+        end: 預り日の終了日（この日を含む）
+
+    Returns:
+        アーカイブの行（列は預り日～医師名・取込元・month）
+    """
+    archive_dir = Path(archive_dir)
+    if not any(archive_dir.glob(f"{PARTITION_COLUMN}=*/*.parquet")):
+        return pl.LazyFrame(schema={**ARCHIVE_SCHEMA, PARTITION_COLUMN: pl.String})
+
+    lf = pl.scan_parquet(str(archive_dir / '**' / '*.parquet'), hive_partitioning=True)
+    if start is not None:
+        lf = lf.filter((pl.col(PARTITION_COLUMN) >= start.strftime('%Y-%m'))
+                       & (pl.col(PARTITION_COLUMN) != UNKNOWN_PARTITION)
+                       & (pl.col("預り日") >= start))
+    if end is not None:
+        lf = lf.filter((pl.col(PARTITION_COLUMN) <= end.strftime('%Y-%m'))
+                       & (pl.col("預り日") <= end))
+    return lf
+
+
+def _files_oldest_first(partition_dir: Path) -> list[Path]:
+    """年月のフォルダのParquetファイルを保存した順に並べる
+
+    まとめたファイル（日時順）は、それより後に保存した取込元ごとのファイルより前に並べる
+    """
+    compacted = sorted(partition_dir.glob(f"{COMPACTED_PREFIX}*.parquet"))
+    parts = sorted(partition_dir.glob(f"{PART_PREFIX}*.parquet"))
+    return compacted + parts
+
+
+def _write_parquet(df: pl.DataFrame, path: Path) -> None:
+    """一時ファイルに書き込んでから置き換える（読み込み中のファイルを壊さない）"""
+    with atomic_write(str(path), keep_rollback=False) as temp_path:
+        df.write_parquet(temp_path)
@@ -1,47 +1,58 @@
-from pathlib import Path
+from typing import Any, Callable
 
 from PyQt6.QtWidgets import QMessageBox
 
-from services.csv_processor import (
-    find_latest_csv,
-    read_csv_with_encoding,
-    process_csv_data,
-    convert_date_format,
-    process_completed_csv
-)
-from services.excel_processor import write_data_to_excel, open_and_sort_excel
-from services.file_manager import backup_excel_file, cleanup_old_csv_files, ensure_directories_exist
+from services.csv_processor import find_pending_csvs
+from services.excel_processor import ExcelFileLockedError
+from services.import_pipeline import ImportStats, run_batch_import, run_import
 from utils.config_manager import ConfigManager
 
+RESUMED_MESSAGE = ("前回中断した取り込み（CSVファイルの移動・バックアップ）を完了しました。\n"
+                   "新しいCSVファイルは取り込んでいないため、もう一度取り込みを実行してください。")
+
 
 def transfer_csv_to_excel() -> None:
     """ダウンロードフォルダからCSVファイルを読み込みExcelファイルに転記"""
+    _run_with_dialogs(run_import)
+
+
+def transfer_all_csv_to_excel() -> None:
+    """ダウンロードフォルダの未処理CSVファイルをすべて読み込み、1回の保存でExcelファイルに転記"""
     try:
         config = ConfigManager()
-        downloads_path = config.get_downloads_path()
-        excel_path = config.get_excel_path()
-        processed_dir = Path(config.get_processed_path())
+        pending_csvs = find_pending_csvs(config.get_downloads_path())
+        if not pending_csvs:
+            QMessageBox.warning(None, "警告", "ダウンロードフォルダにCSVファイルが見つかりません。")
+            return
 
-        ensure_directories_exist()
+        transfer_csv_files_to_excel(pending_csvs)
 
-        cleanup_old_csv_files(processed_dir)
+    except Exception as e:
+        QMessageBox.critical(None, "エラー", f"CSVファイルの取り込み中にエラーが発生しました:\n{str(e)}")
 
-        latest_csv = find_latest_csv(downloads_path)
-        if not latest_csv:
-            QMessageBox.warning(None, "警告", "ダウンロードフォルダにCSVファイルが見つかりません。")
-            return
 
-        df = read_csv_with_encoding(latest_csv)
-        if df is None:
-            QMessageBox.warning(None, "警告", "CSVファイルの読み込みに失敗しました。")
-            return
-        df = process_csv_data(df)
-        df = convert_date_format(df)
+def transfer_csv_files_to_excel(csv_paths: list[str]) -> None:
+    """指定したCSVファイルを並列に読み込み、1回の保存でExcelファイルに転記
 
-        if write_data_to_excel(excel_path, df):
-            process_completed_csv(latest_csv)
-            backup_excel_file(excel_path)
-            open_and_sort_excel(excel_path)
+    Args:
+        csv_paths: 取り込むCSVファイルのパス
+    """
+    _run_with_dialogs(run_batch_import, csv_paths)
 
+
+def _run_with_dialogs(run: Callable[..., ImportStats], *args: Any) -> None:
+    """取り込みを実行し、失敗した場合はメッセージボックスで通知
+
+    バックアップの失敗はワーカースレッドの完了通知で表示するため、完了を待たない。
+    前回中断した取り込みの続きのみを行った場合は、新しいCSVファイルを取り込んでいないことを通知する
+    """
+    try:
+        stats = run(*args, wait_for_backup=False)
+        if stats.resumed:
+            QMessageBox.information(None, "取り込み再開", RESUMED_MESSAGE)
+    except (FileNotFoundError, ValueError) as e:
+        QMessageBox.warning(None, "警告", str(e))
+    except ExcelFileLockedError as e:
+        QMessageBox.critical(None, "エラー", str(e))
     except Exception as e:
         QMessageBox.critical(None, "エラー", f"CSVファイルの取り込み中にエラーが発生しました:\n{str(e)}")
@@ -1,37 +1,164 @@
+import codecs
+import multiprocessing
+import os
+import re
 import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 import polars as pl
 
+from services.backup_worker import backup_worker
+from services.csv_archive import archive_frames, compact_archive
+from services.csv_schema import PAPYRUS_SCHEMA, CsvSchema
+from services.file_manager import open_csv_manifest
 from utils.config_manager import ConfigManager
 
 
-def read_csv_with_encoding(file_path: str) -> Optional[pl.DataFrame]:
-    """複数のエンコーディングを試してCSVファイルを読み込む"""
-    encodings = ['shift-jis', 'cp932', 'utf-8']
+ENCODINGS = ['shift-jis', 'cp932', 'utf-8']
+ENCODING_SAMPLE_SIZE = 64 * 1024  # エンコーディング判定に使用する先頭バイト数
+CSV_BATCH_SIZE = 50_000  # 分割読み込み時の1回あたりの行数
+TRANSCODE_CHUNK_SIZE = 1024 * 1024  # UTF-8への変換時の1回あたりのバイト数
+
+# CP932(Windows-31J)でのみ使われる第1バイト（NEC特殊文字、NEC選定IBM拡張、IBM拡張）
+CP932_ONLY_LEAD_BYTES = frozenset([0x87, 0xED, 0xEE, 0xFA, 0xFB, 0xFC])
+
+# 職員ID(5文字以内)_YYYYMMDDHHmmss.csv
+PAPYRUS_CSV_PATTERN = re.compile(r'^[^_]{0,5}_(\d{14})\.csv$', re.IGNORECASE)
+CSV_INDEX_RACY_NS = 2_000_000_000  # フォルダ更新時刻の精度を考慮した猶予（FATは2秒）
+FILE_INDEX_COLUMN = '__file_index'  # 一括取り込みで行の読み込み元のファイルを区別するための列名
+
+_encoding_cache: dict[tuple[str, int, int], str] = {}
+_csv_index: dict[str, tuple[int, list[tuple[str, str]]]] = {}
+_fallback_parse_count = 0
+
+
+def sniff_encoding(sample: bytes) -> str:
+    """先頭バイト列からCSVファイルのエンコーディングを判定
+
+    BOM、UTF-8としての妥当性、Shift-JIS/CP932の第1バイトの分布を順に確認する
+
+    Args:
+        sample: ファイル先頭のバイト列
+
+    Returns:
+        判定したエンコーディング名
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    if sample.isascii():  # ASCIIのみなら従来どおりShift-JISを優先
+        return ENCODINGS[0]
+
+    try:
+        # サンプル末尾で途切れたマルチバイト文字は許容する
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    i = 0
+    length = len(sample)
+    while i < length:
+        byte = sample[i]
+        if byte < 0x80 or 0xA1 <= byte <= 0xDF:  # ASCIIと半角カナは1バイト
+            i += 1
+            continue
+        if byte in CP932_ONLY_LEAD_BYTES and i + 1 < length:
+            return 'cp932'
+        i += 2
+
+    return 'shift-jis'
+
+
+def detect_encoding(file_path: str) -> str:
+    """CSVファイルのエンコーディングを判定し、パス・サイズ・更新時刻ごとにキャッシュ
+
+    Args:
+        file_path: CSVファイルのパス
+
+    Returns:
+        判定したエンコーディング名
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    encoding = _encoding_cache.get(key)
+    if encoding is None:
+        with open(file_path, 'rb') as f:
+            encoding = sniff_encoding(f.read(ENCODING_SAMPLE_SIZE))
+        _encoding_cache[key] = encoding
+    return encoding
+
+
+def get_fallback_parse_count() -> int:
+    """判定結果で読み込めずに別のエンコーディングで再読込した回数を取得"""
+    return _fallback_parse_count
+
+
+def clear_encoding_cache() -> None:
+    """エンコーディング判定のキャッシュと再読込回数をリセット"""
+    global _fallback_parse_count
+    _encoding_cache.clear()
+    _fallback_parse_count = 0
+
+
+def _encoding_candidates(file_path: str) -> list[str]:
+    """判定したエンコーディングを先頭に、試行するエンコーディングの順序を取得"""
+    try:
+        detected = detect_encoding(file_path)
+    except OSError as e:
+        print(f"エンコーディング判定中にエラー: {str(e)}")
+        detected = ENCODINGS[0]
+
+    return [detected] + [encoding for encoding in ENCODINGS if encoding != detected]
+
+
+def _open_csv_source(file_path: str, encoding: str) -> bytes:
+    """polarsのスキャンに渡すUTF-8のバイト列を取得
+
+    デコードできない場合はUnicodeDecodeErrorを送出し、他のエンコーディングを試せるようにする
+    """
+    with open(file_path, 'rb') as f:
+        data = f.read()
+    text = data.decode(encoding)
+    return data if encoding == 'utf-8' else text.encode('utf-8')
+
+
+def scan_csv_with_encoding(file_path: str, schema: Optional[CsvSchema] = None) -> Optional[pl.LazyFrame]:
+    """エンコーディングを判定してCSVファイルのLazyFrameを作成
+
+    判定したエンコーディングでのみ読み込み、失敗した場合のみ他のエンコーディングを試す
+
+    Args:
+        file_path: CSVファイルのパス
+        schema: 列定義。指定した場合は列名と型を列位置で設定する
+    """
+    global _fallback_parse_count
 
-    for encoding in encodings:
+    for attempt, encoding in enumerate(_encoding_candidates(file_path)):
+        if attempt > 0:
+            _fallback_parse_count += 1
         try:
-            schema = {
-                "患者ID": pl.Int64,
-            }
-            df = pl.read_csv(
-                file_path,
-                encoding=encoding,
+            lf = pl.scan_csv(
+                _open_csv_source(file_path, encoding),
                 separator=',',
                 skip_rows=3,  # 最初の3行をスキップ
                 has_header=True,  # 4行目をヘッダーとして使用
                 infer_schema_length=0,
-                schema_overrides=schema
+                new_columns=list(schema.new_columns) if schema else None,
+                schema_overrides=schema.schema_overrides if schema else {"患者ID": pl.Int64}
             )
 
-            if len(df.columns) > 1:
+            columns = lf.collect_schema().names()
+            if len(columns) > 1:
                 print(f"エンコーディング {encoding} で正常に読み込みました")
-                print(f"列数: {len(df.columns)}")
-                print(f"行数: {len(df)}")
-                print(f"列名: {df.columns}")
-                return df
+                print(f"列数: {len(columns)}")
+                print(f"列名: {columns}")
+                return lf
         except Exception as e:
             print(f"{encoding}での読み込み試行中にエラー: {str(e)}")
             continue
@@ -40,46 +167,87 @@ def read_csv_with_encoding(file_path: str) -> Optional[pl.DataFrame]:
     return None
 
 
-def process_csv_data(df: pl.DataFrame) -> pl.DataFrame:
-    """CSVデータをExcel出力用に加工
-    列名の一意化、スペースと*の除去、指定列の削除、除外データのフィルタリング"""
-    try:
-        # 列名を一意にするためインデックスと元の名前を組み合わせて識別子を作成
-        original_columns = df.columns
-        unique_columns = []
-        for i, col in enumerate(original_columns):
-            unique_columns.append(f"col_{i}_{col}")
-        df = df.select([
-            pl.col(old_name).alias(new_name)
-            for old_name, new_name in zip(original_columns, unique_columns)
-        ])
-
-        # 文書名(G列)と医師名(J列)のスペースと全角スペース、*を除去
-        df = df.with_columns([
-            pl.col(df.columns[6]).cast(pl.String).str.replace_all(r'[\s*　]', ''),
-            pl.col(df.columns[9]).cast(pl.String).str.replace_all(r'[\s*　]', ''),
-        ])
-
-        # I列(8)とK列(10)を削除
-        columns_to_keep = [i for i in range(len(df.columns)) if i not in [8, 10]]
-        df = df.select([df.columns[i] for i in columns_to_keep])
-
-        # 最初の3列(A～C)を削除
-        df = df.select(df.columns[3:])
+def read_csv_with_encoding(file_path: str) -> Optional[pl.DataFrame]:
+    """エンコーディングを判定してCSVファイルを読み込む"""
+    lf = scan_csv_with_encoding(file_path)
+    if lf is None:
+        return None
 
-        config = ConfigManager()
-        exclude_docs = config.get_exclude_docs()
-        exclude_doctors = config.get_exclude_doctors()
+    df = lf.collect()
+    print(f"行数: {len(df)}")
+    return df
 
-        if exclude_docs:
-            for doc in exclude_docs:
-                df = df.filter(~pl.col(df.columns[3]).cast(pl.String).str.contains(doc, literal=True))
 
-        if exclude_doctors:
-            for doctor in exclude_doctors:
-                df = df.filter(~pl.col(df.columns[5]).cast(pl.String).str.contains(doctor, literal=True))
+@lru_cache(maxsize=16)
+def compile_exclusion_filter(doc_col: str, exclude_docs: tuple[str, ...],
+                             doctor_col: str, exclude_doctors: tuple[str, ...]) -> Optional[pl.Expr]:
+    """除外する文書名・医師名から行を残す条件式を作成
+
+    各列の除外リストを1つの複数パターン検索(Aho-Corasick)にまとめ、
+    リストの件数によらず1回の走査で判定する。除外リストの内容ごとにキャッシュされる
+
+    Args:
+        doc_col: 文書名の列名
+        exclude_docs: 除外する文書名（部分一致）
+        doctor_col: 医師名の列名
+        exclude_doctors: 除外する医師名（部分一致）
+
+    Returns:
+        除外対象でない行でTrueとなる条件式、除外リストが空の場合はNone
+    """
+    conditions = []
+    if exclude_docs:
+        conditions.append(pl.col(doc_col).cast(pl.String).str.contains_any(list(exclude_docs)))
+    if exclude_doctors:
+        conditions.append(pl.col(doctor_col).cast(pl.String).str.contains_any(list(exclude_doctors)))
+
+    if not conditions:
+        return None
+    return ~pl.any_horizontal(conditions)
+
+
+def build_transform_plan(lf: pl.LazyFrame, schema: CsvSchema = PAPYRUS_SCHEMA,
+                         projected: bool = False) -> pl.LazyFrame:
+    """CSVデータをExcel出力用に加工するクエリプランを作成
+
+    列定義に従って取り込む列を列位置で選択し、スペースと*の除去、
+    除外データのフィルタリングと合わせてpolarsに最適化させる。
+    取り込まない列は読み込み時に展開されない
+    （projectedがTrueの場合は取り込む列のみを読み込んだデータとして扱う）
+    """
+    lf = lf.select(schema.select_exprs(projected))
+
+    config = ConfigManager()
+    exclude_filter = compile_exclusion_filter(
+        "文書名", tuple(config.get_exclude_docs()),
+        "医師名", tuple(config.get_exclude_doctors())
+    )
+    if exclude_filter is not None:
+        lf = lf.filter(exclude_filter)
+
+    return lf
 
-        return df
+
+def build_date_plan(lf: pl.LazyFrame, date_col: Optional[str] = None) -> pl.LazyFrame:
+    """日付列をYYYYMMDD形式からDate型に変換するクエリプランを作成
+
+    Args:
+        lf: 変換対象のLazyFrame
+        date_col: 日付列の列名（未指定時は先頭列）
+    """
+    if date_col is None:
+        date_col = lf.collect_schema().names()[0]
+    return lf.with_columns([
+        pl.col(date_col).str.strptime(pl.Date, format="%Y%m%d")
+        .alias(date_col)
+    ])
+
+
+def process_csv_data(df: pl.DataFrame) -> pl.DataFrame:
+    """CSVデータをExcel出力用に加工
+    列定義に従った列の選択と命名、スペースと*の除去、除外データのフィルタリング"""
+    try:
+        return build_transform_plan(df.lazy()).collect()
 
     except Exception as e:
         print(f"データ処理中にエラーが発生しました: {str(e)}")
@@ -89,19 +257,139 @@ def process_csv_data(df: pl.DataFrame) -> pl.DataFrame:
 def convert_date_format(df: pl.DataFrame) -> pl.DataFrame:
     """日付列をYYYYMMDD形式からDate型に変換"""
     try:
-        date_col = df.columns[0]
-        df = df.with_columns([
-            pl.col(date_col).str.strptime(pl.Date, format="%Y%m%d")
-            .alias(date_col)
-        ])
-        return df
+        return build_date_plan(df.lazy()).collect()
     except Exception as e:
         print(f"日付変換中にエラーが発生しましたが、処理を継続します: {str(e)}")
         return df
 
 
+def load_processed_csv(file_path: str) -> Optional[pl.DataFrame]:
+    """CSVファイルの読み込みから加工、日付変換までを1つのクエリプランで実行
+
+    日付変換に失敗した場合は日付変換を除いたプランで再実行する
+
+    Args:
+        file_path: CSVファイルのパス
+
+    Returns:
+        加工済みのDataFrame、または読み込みに失敗した場合はNone
+    """
+    lf = scan_csv_with_encoding(file_path, PAPYRUS_SCHEMA)
+    if lf is None:
+        return None
+
+    try:
+        plan = build_transform_plan(lf, PAPYRUS_SCHEMA)
+    except Exception as e:
+        print(f"データ処理中にエラーが発生しました: {str(e)}")
+        raise
+
+    df = _collect_with_dates(plan, PAPYRUS_SCHEMA.names[0])
+    print(f"行数: {len(df)}")
+    return df
+
+
+def _collect_with_dates(plan: pl.LazyFrame, date_col: str) -> pl.DataFrame:
+    """日付変換を含めてプランを実行し、日付変換に失敗した場合は日付変換なしで再実行"""
+    try:
+        return build_date_plan(plan, date_col).collect()
+    except pl.exceptions.PolarsError as e:
+        print(f"日付変換中にエラーが発生しましたが、処理を継続します: {str(e)}")
+        return plan.collect()
+
+
+def _validate_encoding(file_path: str, encoding: str) -> None:
+    """CSVファイルを一定サイズずつデコードし、デコードできない場合はUnicodeDecodeErrorを送出"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(TRANSCODE_CHUNK_SIZE):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+
+
+def _transcode_to_utf8(file_path: str, encoding: str) -> str:
+    """CSVファイルを一定サイズずつUTF-8に変換した一時ファイルを作成
+
+    Returns:
+        一時ファイルのパス（呼び出し側で削除する）
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    fd, temp_path = tempfile.mkstemp(prefix='csv2xl_', suffix='.csv')
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            while chunk := src.read(TRANSCODE_CHUNK_SIZE):
+                dst.write(decoder.decode(chunk).encode('utf-8'))
+            dst.write(decoder.decode(b'', final=True).encode('utf-8'))
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+
+def iter_processed_csv_batches(file_path: str, batch_size: int = CSV_BATCH_SIZE) -> Iterator[pl.DataFrame]:
+    """CSVファイルを一定行数ずつ読み込み、加工・日付変換済みのDataFrameを順に返す
+
+    ファイル全体を読み込まないため、メモリ使用量はバッチの行数に比例する。
+    UTF-8以外のファイルは一定サイズずつUTF-8の一時ファイルに変換してから読み込む
+
+    Args:
+        file_path: CSVファイルのパス
+        batch_size: 1回に読み込む行数の目安
+
+    Yields:
+        バッチごとの加工済みDataFrame
+
+    Raises:
+        ValueError: すべてのエンコーディングで読み込めなかった場合
+    """
+    global _fallback_parse_count
+
+    source = None
+    temp_path = None
+    for attempt, encoding in enumerate(_encoding_candidates(file_path)):
+        if attempt > 0:
+            _fallback_parse_count += 1
+        try:
+            if encoding == 'utf-8':
+                _validate_encoding(file_path, encoding)
+                source = file_path
+            else:
+                temp_path = _transcode_to_utf8(file_path, encoding)
+                source = temp_path
+            break
+        except UnicodeDecodeError as e:
+            print(f"{encoding}での読み込み試行中にエラー: {str(e)}")
+
+    if source is None:
+        raise ValueError(f"CSVファイルの読み込みに失敗しました: {file_path}")
+
+    try:
+        # 一括読み込みと同じく、取り込まない列は読み込み時に展開しない
+        reader = pl.read_csv_batched(
+            source,
+            separator=',',
+            skip_rows=3,  # 最初の3行をスキップ
+            has_header=True,  # 4行目をヘッダーとして使用
+            infer_schema_length=0,
+            columns=PAPYRUS_SCHEMA.source_indices,
+            new_columns=PAPYRUS_SCHEMA.projected_columns,
+            schema_overrides=PAPYRUS_SCHEMA.schema_overrides,
+            batch_size=batch_size
+        )
+        while batches := reader.next_batches(1):
+            for batch in batches:
+                plan = build_transform_plan(batch.lazy(), PAPYRUS_SCHEMA, projected=True)
+                yield _collect_with_dates(plan, PAPYRUS_SCHEMA.names[0])
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
 def process_completed_csv(csv_path: str) -> None:
-    """処理済みCSVファイルを指定ディレクトリに移動"""
+    """処理済みCSVファイルを指定ディレクトリに移動
+
+    アーカイブが有効な場合は、移動したファイルのアーカイブへの保存をワーカースレッドに依頼する
+    """
     try:
         csv_file = Path(csv_path)
         if not csv_file.exists():
@@ -113,16 +401,105 @@ def process_completed_csv(csv_path: str) -> None:
 
         new_path = processed_dir / csv_file.name
         shutil.move(str(csv_file), str(new_path))
+        open_csv_manifest(processed_dir).add(new_path)
+
+        if config.get_archive_enabled():
+            backup_worker.submit(archive_processed_csv, str(new_path),
+                                 config.get_archive_path(), config.get_archive_max_parts())
 
     except Exception as e:
         print(f"CSVファイルの処理中にエラーが発生しました: {str(e)}")
         raise
 
 
+def archive_processed_csv(csv_path: str, archive_dir: str, max_parts: int) -> int:
+    """処理済みCSVファイルを加工して預り日の年月ごとのParquetのアーカイブに追加
+
+    ワーカースレッドで実行し、年月ごとのファイル数が上限を超えた場合は1つにまとめる。
+    保存できない場合も取り込みは中断せずメッセージを出力する
+
+    Args:
+        csv_path: 処理済みCSVファイル（移動後のパス）
+        archive_dir: アーカイブのフォルダ
+        max_parts: 年月ごとのファイル数の上限
+
+    Returns:
+        保存した行数
+    """
+    try:
+        archived = archive_frames(Path(archive_dir), iter_processed_csv_batches(csv_path), Path(csv_path).name)
+        compact_archive(Path(archive_dir), max_parts)
+    except (OSError, ValueError, pl.exceptions.PolarsError) as e:
+        print(f"CSVファイルをアーカイブに保存できません: {csv_path} - {str(e)}")
+        return 0
+    return archived
+
+
+def is_papyrus_csv_name(name: str) -> bool:
+    """ファイル名が職員ID_YYYYMMDDHHmmss.csv形式かどうかを判定"""
+    return PAPYRUS_CSV_PATTERN.match(name) is not None
+
+
+def _list_papyrus_csvs(downloads_path: str) -> list[tuple[str, str]]:
+    """ダウンロードフォルダの職員ID_YYYYMMDDHHmmss形式のCSVファイルを取得
+
+    フォルダの更新時刻が変わらない間は前回の一覧を再利用する。
+    更新時刻の精度より短い間隔での追加を見逃さないよう、一覧作成時点で
+    フォルダの更新から一定時間経っていない場合はキャッシュしない
+
+    Returns:
+        ファイル名のタイムスタンプとファイル名の組（タイムスタンプ順）
+    """
+    directory = os.path.abspath(downloads_path)
+    dir_mtime = os.stat(directory).st_mtime_ns
+
+    cached = _csv_index.get(directory)
+    if cached is not None and cached[0] == dir_mtime:
+        return cached[1]
+
+    listed_at = time.time_ns()
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            match = PAPYRUS_CSV_PATTERN.match(entry.name)
+            if match and entry.is_file():
+                entries.append((match.group(1), entry.name))
+    entries.sort()
+
+    if listed_at - dir_mtime >= CSV_INDEX_RACY_NS:
+        _csv_index[directory] = (dir_mtime, entries)
+    else:
+        _csv_index.pop(directory, None)
+    return entries
+
+
+def _order_by_timestamp(downloads_path: str, entries: list[tuple[str, str]]) -> list[Path]:
+    """タイムスタンプ順に並べ、同じタイムスタンプのファイルのみ更新時刻で並べる"""
+    directory = Path(downloads_path)
+    ordered = []
+    i = 0
+    while i < len(entries):
+        j = i + 1
+        while j < len(entries) and entries[j][0] == entries[i][0]:
+            j += 1
+        group = [directory / name for _, name in entries[i:j]]
+        if len(group) > 1:
+            group.sort(key=lambda f: f.stat().st_mtime)
+        ordered.extend(group)
+        i = j
+    return ordered
+
+
+def clear_csv_index() -> None:
+    """CSVファイル一覧のキャッシュを破棄"""
+    _csv_index.clear()
+
+
 def find_latest_csv(downloads_path: str) -> Optional[str]:
     """ダウンロードフォルダから最新のCSVファイルを取得
 
-    職員ID_YYYYMMDDHHmmss形式のファイルを検索して最も新しいものを返す
+    職員ID_YYYYMMDDHHmmss形式のファイルをファイル名のタイムスタンプで比較して
+    最も新しいものを返す。タイムスタンプが同じ場合のみ更新時刻で比較する
 
     Args:
         downloads_path: ダウンロードフォルダのパス
@@ -130,12 +507,81 @@ def find_latest_csv(downloads_path: str) -> Optional[str]:
     Returns:
         最新CSVファイルのパス、または見つからない場合はNone
     """
-    csv_files = [f for f in Path(downloads_path).glob('*.csv')
-                 if len(f.name.split('_')) == 2 and
-                 (0 <= len(f.name.split('_')[0]) <= 5) and
-                 len(f.name.split('_')[1].split('.')[0]) == 14]
+    entries = _list_papyrus_csvs(downloads_path)
 
-    if not csv_files:
+    if not entries:
         return None
 
-    return str(max(csv_files, key=lambda f: f.stat().st_mtime))
+    latest_timestamp = entries[-1][0]
+    latest = [entry for entry in entries if entry[0] == latest_timestamp]
+    return str(_order_by_timestamp(downloads_path, latest)[-1])
+
+
+def find_pending_csvs(downloads_path: str) -> list[str]:
+    """ダウンロードフォルダから未処理のCSVファイルをすべて取得
+
+    Args:
+        downloads_path: ダウンロードフォルダのパス
+
+    Returns:
+        職員ID_YYYYMMDDHHmmss形式のCSVファイルのパス（ファイル名のタイムスタンプの古い順）
+    """
+    entries = _list_papyrus_csvs(downloads_path)
+    return [str(f) for f in _order_by_timestamp(downloads_path, entries)]
+
+
+def load_processed_csvs(csv_paths: list[str],
+                        max_workers: Optional[int] = None) -> list[tuple[str, Optional[pl.DataFrame]]]:
+    """複数のCSVファイルを読み込み・加工
+
+    プロセスの起動には時間がかかるため、合計サイズが`[Import] parallel_load_threshold_mb`以上の場合のみ
+    プロセスプールで並列に読み込み、それ以外は順に読み込む
+
+    Args:
+        csv_paths: CSVファイルのパス
+        max_workers: 最大プロセス数（未指定時はファイル数とCPU数の小さい方）
+
+    Returns:
+        CSVファイルのパスと加工済みDataFrame（読み込み失敗時はNone）の組
+    """
+    if not _should_load_in_parallel(csv_paths):
+        return [(csv_path, load_processed_csv(csv_path)) for csv_path in csv_paths]
+
+    if max_workers is None:
+        max_workers = min(len(csv_paths), os.cpu_count() or 1)
+
+    # polarsはスレッドを使用するためforkではなくspawnでプロセスを起動する。
+    # 子プロセスはこのモジュール（Qtを読み込まない）のみを読み込む
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        return list(zip(csv_paths, executor.map(load_processed_csv, csv_paths)))
+
+
+def _should_load_in_parallel(csv_paths: list[str]) -> bool:
+    """CSVファイルの合計サイズがプロセスプールで読み込む大きさかどうかを判定"""
+    if len(csv_paths) <= 1:
+        return False
+    total = 0
+    for csv_path in csv_paths:
+        try:
+            total += os.path.getsize(csv_path)
+        except OSError:
+            continue
+    return total >= ConfigManager().get_parallel_load_threshold_mb() * 1024 * 1024
+
+
+def combine_processed_frames(frames: list[pl.DataFrame]) -> pl.DataFrame:
+    """加工済みのDataFrameを結合し、前のファイルと重複する行を除去
+
+    1ファイルずつ取り込む場合と同じ結果にするため、同じファイル内で重複する行は残す
+    """
+    combined = pl.concat(
+        [df.with_columns(pl.lit(i).alias(FILE_INDEX_COLUMN)) for i, df in enumerate(frames)],
+        how='vertical_relaxed'
+    )
+    columns = [name for name in combined.columns if name != FILE_INDEX_COLUMN]
+    return (
+        combined
+        .filter(pl.col(FILE_INDEX_COLUMN) == pl.col(FILE_INDEX_COLUMN).min().over(columns))
+        .drop(FILE_INDEX_COLUMN)
+    )
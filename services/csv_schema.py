@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from typing import Any
+
+import polars as pl
+
+# 文書名・医師名から除去する文字（半角・全角スペースと*）
+NORMALIZE_PATTERN = r'[\s*　]'
+
+
+@dataclass(frozen=True)
+class CsvColumn:
+    """Papyrus出力CSVから取り込む列の定義
+
+    Attributes:
+        source_index: CSV上の列位置（0始まり）
+        name: 取り込み後の列名
+        dtype: 読み込み時の型
+        normalize: スペースと*を除去するかどうか
+    """
+    source_index: int
+    name: str
+    dtype: Any = pl.String
+    normalize: bool = False
+
+
+@dataclass(frozen=True)
+class CsvSchema:
+    """列定義から作成した読み込み・加工用の設定
+
+    Attributes:
+        columns: 取り込む列の定義（出力順）
+        new_columns: 読み込み時に付ける列名（取り込まない列は仮の名前）
+        schema_overrides: 読み込み時に型を指定する列
+    """
+    columns: tuple[CsvColumn, ...]
+    new_columns: tuple[str, ...]
+    schema_overrides: dict[str, Any]
+
+    @property
+    def names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+    @property
+    def source_indices(self) -> list[int]:
+        """取り込む列のCSV上の列位置（昇順。読み込み時に列を選択する場合に使用）"""
+        return sorted(column.source_index for column in self.columns)
+
+    @property
+    def projected_columns(self) -> list[str]:
+        """source_indicesの列のみを読み込んだ場合に付ける列名"""
+        return [self.new_columns[i] for i in self.source_indices]
+
+    def column(self, name: str) -> CsvColumn:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError(name)
+
+    def select_exprs(self, projected: bool = False) -> list[pl.Expr]:
+        """列位置で取り込む列を選択する式を作成（元の列名によらず使用できる）
+
+        projectedがTrueの場合はsource_indicesの列のみを読み込んだDataFrameの列位置を使用する
+        """
+        positions = {index: i for i, index in enumerate(self.source_indices)}
+        exprs = []
+        for column in self.columns:
+            expr = pl.nth(positions[column.source_index] if projected else column.source_index)
+            if column.normalize:
+                expr = expr.cast(pl.String).str.replace_all(NORMALIZE_PATTERN, '')
+            exprs.append(expr.alias(column.name))
+        return exprs
+
+
+def compile_csv_schema(columns: tuple[CsvColumn, ...]) -> CsvSchema:
+    """列定義から読み込み・加工用の設定を作成
+
+    Args:
+        columns: 取り込む列の定義（出力順）
+
+    Returns:
+        読み込み時に渡す列名・型と、列を選択する式を持つ設定
+    """
+    by_index = {column.source_index: column for column in columns}
+    new_columns = tuple(
+        by_index[i].name if i in by_index else f"_{i}"
+        for i in range(max(by_index) + 1)
+    )
+    schema_overrides = {
+        column.name: column.dtype for column in columns if column.dtype != pl.String
+    }
+    return CsvSchema(columns, new_columns, schema_overrides)
+
+
+# Papyrusの書類受付リスト（11列）のうち、Excelに転記するA～F列
+PAPYRUS_COLUMNS = (
+    CsvColumn(3, "預り日"),
+    CsvColumn(4, "患者ID", pl.Int64),
+    CsvColumn(5, "患者名"),
+    CsvColumn(6, "文書名", normalize=True),
+    CsvColumn(7, "診療科"),
+    CsvColumn(9, "医師名", normalize=True),
+)
+
+PAPYRUS_SCHEMA = compile_csv_schema(PAPYRUS_COLUMNS)
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import sqlite3
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+INDEX_SUFFIX = '.dedup.sqlite'
+INDEX_VERSION = 1
+
+# 重複チェックに使うA～F列のキー（預り日はYYYYMMDD形式の文字列）
+RowKey = tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class WorkbookSignature:
+    """インデックス作成時のExcelファイルの状態
+
+    Attributes:
+        size: ファイルサイズ
+        mtime_ns: 更新時刻（ナノ秒）
+        checksum: ワークシートと共有文字列の内容から求めたチェックサム
+    """
+    size: int
+    mtime_ns: int
+    checksum: str
+
+    @classmethod
+    def from_file(cls, excel_path: str) -> 'WorkbookSignature':
+        stat = os.stat(excel_path)
+        return cls(stat.st_size, stat.st_mtime_ns, sheet_checksum(excel_path))
+
+
+def sheet_checksum(excel_path: str) -> str:
+    """ワークシートと共有文字列のチェックサムを計算
+
+    zipの中央ディレクトリに記録されたCRCを使うため、ファイル全体を読み込まずに計算できる
+
+    Args:
+        excel_path: Excelファイルのパス
+
+    Returns:
+        ワークシート・共有文字列の名前・CRC・サイズから求めたハッシュ値
+    """
+    with zipfile.ZipFile(excel_path) as zf:
+        parts = sorted(
+            f"{info.filename}:{info.CRC:08x}:{info.file_size}"
+            for info in zf.infolist()
+            if info.filename.startswith('xl/worksheets/') or info.filename == 'xl/sharedStrings.xml'
+        )
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def index_path_for(excel_path: str) -> Path:
+    """Excelファイルと同じフォルダに置くインデックスファイルのパスを取得"""
+    path = Path(excel_path)
+    return path.with_name(path.stem + INDEX_SUFFIX)
+
+
+class DedupIndex:
+    """Excelファイルの既存データ（A～F列）のキーを保持するSQLiteのインデックス
+
+    取り込みのたびにワークシート全体を読み込まずに重複チェックできるようにする。
+    保存後に追記した行のキーのみを追加し、Excelファイルが手動で編集された場合
+    （ワークシートのチェックサムが一致しない場合）はワークシートから作り直す
+    """
+
+    def __init__(self, index_path: str | Path) -> None:
+        self.path: Path = Path(index_path)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS row_keys (
+                a TEXT, b TEXT, c TEXT, d TEXT, e TEXT, f TEXT,
+                PRIMARY KEY (a, b, c, d, e, f)
+            ) WITHOUT ROWID;
+        """)
+
+    @classmethod
+    def open(cls, excel_path: str) -> Optional['DedupIndex']:
+        """Excelファイルに対応するインデックスを開く。使用できない場合はNone"""
+        if not os.path.isfile(excel_path):
+            return None
+        try:
+            return cls(index_path_for(excel_path))
+        except (sqlite3.Error, OSError) as e:
+            print(f"重複チェック用インデックスを使用できません: {str(e)}")
+            return None
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _meta(self) -> dict[str, str]:
+        return dict(self._conn.execute("SELECT name, value FROM meta").fetchall())
+
+    @property
+    def last_row(self) -> Optional[int]:
+        """インデックス作成時のExcelファイルの最終行"""
+        value = self._meta().get('last_row')
+        return int(value) if value is not None else None
+
+    @property
+    def last_key(self) -> Optional[RowKey]:
+        """インデックス作成時のExcelファイルの最終行のキー（記録されていない場合はNone）"""
+        value = self._meta().get('last_key')
+        return tuple(json.loads(value)) if value is not None else None
+
+    def matches(self, signature: WorkbookSignature) -> bool:
+        """インデックスがExcelファイルの現在の内容に対応しているかを判定
+
+        サイズ・更新時刻が異なっていても、ワークシートの内容が同じであれば有効とみなす
+        """
+        meta = self._meta()
+        if meta.get('version') != str(INDEX_VERSION) or meta.get('checksum') != signature.checksum:
+            return False
+        if (meta.get('size'), meta.get('mtime_ns')) != (str(signature.size), str(signature.mtime_ns)):
+            with self._conn:
+                self._write_meta(signature)
+        return True
+
+    def load_keys(self) -> list[RowKey]:
+        """保持しているキーをすべて取得（主キーのため重複はない）"""
+        return self._conn.execute("SELECT a, b, c, d, e, f FROM row_keys").fetchall()
+
+    def rebuild(self, keys: Iterable[RowKey], signature: WorkbookSignature, last_row: int,
+                last_key: Optional[RowKey] = None) -> None:
+        """インデックスを作り直す"""
+        with self._conn:
+            self._conn.execute("DELETE FROM row_keys")
+            self._conn.execute("DELETE FROM meta")
+            self._insert(keys)
+            self._write_meta(signature, last_row, last_key)
+
+    def append(self, keys: Iterable[RowKey], signature: WorkbookSignature, last_row: int,
+               last_key: Optional[RowKey] = None) -> None:
+        """追記した行のキーを追加し、保存後のExcelファイルの状態を記録"""
+        with self._conn:
+            self._insert(keys)
+            self._conn.execute("DELETE FROM meta WHERE name = 'last_key'")
+            self._write_meta(signature, last_row, last_key)
+
+    def remove(self, keys: Iterable[RowKey], signature: WorkbookSignature, last_row: int,
+               last_key: Optional[RowKey] = None) -> None:
+        """取り消した行のキーを削除し、保存後のExcelファイルの状態を記録"""
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM row_keys WHERE a = ? AND b = ? AND c = ? AND d = ? AND e = ? AND f = ?", keys)
+            self._conn.execute("DELETE FROM meta WHERE name = 'last_key'")
+            self._write_meta(signature, last_row, last_key)
+
+    def _insert(self, keys: Iterable[RowKey]) -> None:
+        self._conn.executemany("INSERT OR IGNORE INTO row_keys VALUES (?, ?, ?, ?, ?, ?)", keys)
+
+    def _write_meta(self, signature: WorkbookSignature, last_row: Optional[int] = None,
+                    last_key: Optional[RowKey] = None) -> None:
+        values = {
+            'version': INDEX_VERSION,
+            'size': signature.size,
+            'mtime_ns': signature.mtime_ns,
+            'checksum': signature.checksum,
+        }
+        if last_row is not None:
+            values['last_row'] = last_row
+        if last_key is not None:
+            values['last_key'] = json.dumps(list(last_key), ensure_ascii=False)
+        self._conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                               [(name, str(value)) for name, value in values.items()])
@@ -1,58 +1,166 @@
 import datetime
+import heapq
+import itertools
+import re
+import sqlite3
 import time
+import zipfile
+from copy import copy
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, cast
+from typing import Any, Iterable, Optional, cast
+from xml.etree import ElementTree
 
 import polars as pl
-import pyautogui
-import win32com.client
-import win32gui
 from openpyxl import load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import Cell
 from openpyxl.styles import Alignment
+from openpyxl.styles.cell_style import StyleArray
 from openpyxl.worksheet.worksheet import Worksheet
-from PyQt6.QtWidgets import QMessageBox
-
+from PyQt6.QtWidgets import QApplication, QMessageBox
+
+from services.atomic_save import atomic_write, rollback_file
+from services.backup_worker import backup_worker
+from services.dedup_index import DedupIndex, RowKey, WorkbookSignature
+from services.import_journal import STAGE_MOVE, ImportJournal
+from services.workbook_cache import WorkbookCache, close_workbook, workbook_cache
+from services.workbook_reader import KEY_COLUMNS, KEY_SCHEMA, read_key_columns
+from services.xlsm_patcher import PatchCell, WorkbookPatchError, XlsmPatcher
 from utils.config_manager import ConfigManager
 
+# Excelの操作（ソート・共有）はWindowsのCOMが使える環境でのみ実行する
+try:
+    import win32com.client
+    import win32gui
+    COM_AVAILABLE = True
+except ImportError:
+    win32com = None
+    win32gui = None
+    COM_AVAILABLE = False
+
+try:
+    import pyautogui
+except Exception:  # 画面のない環境では読み込み時に失敗する
+    pyautogui = None
+
+LOCKED_ON_OPEN_MESSAGE = "Excelファイルが別のプロセスで開かれています。\nファイルを閉じてから再度実行してください。"
+LOCKED_ON_SAVE_MESSAGE = "Excelファイルが別のプロセスで開かれているため、保存できません。\nファイルを閉じてから再度実行してください。"
+
+# 重複チェックで元の行の順序を保つための列名
+ROW_INDEX_COLUMN = '__row_index'
+
+# Excelでのソートと同じ範囲（A～I列）の行を並べ替えの対象とする
+SORT_COLUMN_COUNT = 9
+# ソートのキー: 預り日（A列）、診療科（E列）、患者ID（B列）の順（キーのタプルでの位置）
+SORT_KEY_POSITIONS = (0, 4, 1)
+DATE_KEY = re.compile(r'\d{8}')
+# polarsで日付に変換する預り日の形式（それ以外はdatetime.strptimeで変換を試みる）
+DATE_PATTERN = r'^\d{4}-\d{1,2}-\d{1,2}$'
+INTEGER_KEY = re.compile(r'-?\d+')
+
+# 預り日（A列）・患者ID（B列）の表示形式
+DATE_FORMAT = 'yyyy/mm/dd'
+PATIENT_ID_FORMAT = '0'
+
+# A～F列の配置。A,B列とE,F列は中央揃え、C列とD列は左揃えで縮小して全体を表示
+CENTER_ALIGNMENT = Alignment(horizontal='center')
+SHRINK_LEFT_ALIGNMENT = Alignment(horizontal='left', shrink_to_fit=True)
+COLUMN_ALIGNMENTS = {
+    1: CENTER_ALIGNMENT,
+    2: CENTER_ALIGNMENT,
+    3: SHRINK_LEFT_ALIGNMENT,
+    4: SHRINK_LEFT_ALIGNMENT,
+    5: CENTER_ALIGNMENT,
+    6: CENTER_ALIGNMENT,
+}
+
+
+class ExcelFileLockedError(PermissionError):
+    """Excelファイルが他のプロセスで開かれていて読み書きできない場合のエラー"""
+
+
+@dataclass
+class AppendResult:
+    """Excelファイルへの追記結果
+
+    Attributes:
+        existing_rows: 追記前のデータ行数（見出し行を除く）
+        incoming_rows: CSVから読み込んだ行数
+        appended_rows: 重複を除いて追記した行数
+        timings: 処理段階ごとの所要時間（秒）
+    """
+    existing_rows: int = 0
+    incoming_rows: int = 0
+    appended_rows: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+@dataclass
+class _ExistingRows:
+    """重複チェック用に読み込んだ既存データ
+
+    Attributes:
+        keys: A～F列のキー（重複チェック用のDataFrame）
+        last_row: 最後のデータ行番号（見出し行を含む）
+        from_index: インデックスから取得したかどうか
+        last_key: 最終行のキー（分からない場合はNone）
+    """
+    keys: pl.DataFrame
+    last_row: int
+    from_index: bool
+    last_key: Optional[RowKey] = None
+
+
+def show_error(message: str) -> None:
+    """エラーを表示（GUI実行時はメッセージボックス、それ以外は標準出力）"""
+    if QApplication.instance() is None:
+        print(message)
+        return
+    QMessageBox.critical(None, "エラー", message)
+
 
 def get_last_row(worksheet: Worksheet) -> int:
     """ワークシートの最後のデータ行番号を取得
 
+    ワークシートの使用範囲の最終行（max_row）から、値のない行を後ろから除いて求める。
+    先頭から全行を調べないため、行数によらずほぼ一定の時間で取得できる
+
     Args:
         worksheet: openpyxlのワークシートオブジェクト
 
     Returns:
         最後のデータが存在する行番号
     """
-    last_row = 0
-    for row in worksheet.iter_rows():
-        if all(cell.value is None for cell in row):
-            break
-        last_row += 1
+    last_row = worksheet.max_row
+    while last_row > 0 and _is_blank_row(worksheet, last_row):
+        last_row -= 1
     return last_row
 
 
-def apply_cell_formats(worksheet: Worksheet, start_row: int) -> None:
+def _is_blank_row(worksheet: Worksheet, row: int) -> bool:
+    """指定した行のすべてのセルが空かどうかを判定"""
+    values = next(worksheet.iter_rows(min_row=row, max_row=row, values_only=True), ())
+    return all(value is None for value in values)
+
+
+def apply_cell_formats(worksheet: Worksheet, start_row: int, end_row: Optional[int] = None) -> None:
     """指定された行からセルのフォーマットと配置を適用
 
     Args:
         worksheet: openpyxlのワークシートオブジェクト
         start_row: フォーマット開始行番号
+        end_row: フォーマット終了行番号。省略時はワークシートの最終行
     """
-    last_row = get_last_row(worksheet)
+    last_row = end_row if end_row is not None else get_last_row(worksheet)
 
-    # A～F列に対して、垂直中央配置を設定し、特定列の水平配置を調整
+    # A～F列に対して、列ごとの配置を設定（セルごとに作成せず共有のAlignmentを使う）
     for row in range(start_row, last_row + 1):
-        for col in range(1, 7):
-            cell = worksheet.cell(row=row, column=col)
-
-            cell.alignment = Alignment(vertical='center')
-
-            if col in [1, 2, 5, 6]:  # A,B列とE,F列
-                cell.alignment = Alignment(horizontal='center')
-
-            elif col in [3, 4]:  # C列とD列
-                cell.alignment = Alignment(horizontal='left', shrink_to_fit=True)
+        for col, alignment in COLUMN_ALIGNMENTS.items():
+            worksheet.cell(row=row, column=col).alignment = alignment
 
 
 def sort_excel_data(worksheet: Any) -> int:
@@ -95,6 +203,9 @@ def bring_excel_to_front() -> bool:
     Returns:
         成功時はTrue、失敗時はFalse
     """
+    if not COM_AVAILABLE or win32gui is None:
+        return False
+
     for _ in range(2):
         hwnd = win32gui.FindWindow("XLMAIN", None)
         if hwnd:
@@ -104,7 +215,8 @@ def bring_excel_to_front() -> bool:
     return False
 
 
-def write_data_to_excel(excel_path: str, df: pl.DataFrame) -> bool:
+def write_data_to_excel(excel_path: str, df: pl.DataFrame,
+                        journal: Optional[ImportJournal] = None) -> bool:
     """DataFrameのデータをExcelファイルに重複排除して書き込み
 
     既存データを確認して重複していないデータのみを追加。日付と患者IDの形式変換も実施
@@ -112,124 +224,685 @@ def write_data_to_excel(excel_path: str, df: pl.DataFrame) -> bool:
     Args:
         excel_path: Excelファイルのパス
         df: 書き込むpolarsのDataFrame
+        journal: 保存と追記した行を記録するジャーナル
 
     Returns:
         成功時はTrue、失敗時はFalse
     """
-    if not Path(excel_path).exists() or not excel_path.endswith('.xlsm'):
-        print(f"Excelファイルが見つかりません: {excel_path}")
-        return False
+    return write_batches_to_excel(excel_path, [df], journal=journal)
+
+
+def write_batches_to_excel(excel_path: str, batches: Iterable[pl.DataFrame],
+                           journal: Optional[ImportJournal] = None) -> bool:
+    """複数のDataFrameを順にExcelファイルに重複排除して書き込み、1回で保存
+
+    バッチを1つずつ変換・書き込みするため、CSV側のメモリ使用量はバッチの大きさに比例する
+
+    Args:
+        excel_path: Excelファイルのパス
+        batches: 書き込むpolarsのDataFrame（分割読み込みのジェネレータも可）
+        journal: 保存と追記した行を記録するジャーナル
 
+    Returns:
+        成功時はTrue、失敗時はFalse
+    """
     try:
-        wb = load_workbook(filename=excel_path, keep_vba=True)
-    except PermissionError:
-        QMessageBox.critical(None,
-                             "エラー",
-                             "Excelファイルが別のプロセスで開かれています。\nファイルを閉じてから再度実行してください。"
-                             )
+        append_batches_to_workbook(excel_path, batches, journal=journal)
+        return True
+    except FileNotFoundError as e:
+        print(str(e))
+        return False
+    except ExcelFileLockedError as e:
+        show_error(str(e))
         return False
 
-    ws = cast(Worksheet, wb.active)
 
-    last_row = get_last_row(ws)
+def append_batches_to_workbook(excel_path: str, batches: Iterable[pl.DataFrame],
+                               dry_run: bool = False, engine: Optional[str] = None,
+                               journal: Optional[ImportJournal] = None) -> AppendResult:
+    """複数のDataFrameを順にExcelファイルに重複排除して追記し、1回で保存
 
-    # 既存データのセットを構築して重複チェック用のキーを作成（A～F列の値で識別）
-    existing_data = set()
-    for row in range(2, last_row + 1):
-        # 日付をYYYYMMDD形式の文字列として取得
-        cell1 = ws.cell(row=row, column=1)
-        date_value = cast(Any, cell1).value if cell1 else None
-        if isinstance(date_value, datetime.datetime):
-            date_str = date_value.strftime('%Y%m%d')
-        else:
-            date_str = str(date_value or '')
-
-        # A列からF列までの値を取得（日付は数値形式で保持）
-        cell2 = ws.cell(row=row, column=2)
-        cell3 = ws.cell(row=row, column=3)
-        cell4 = ws.cell(row=row, column=4)
-        cell5 = ws.cell(row=row, column=5)
-        cell6 = ws.cell(row=row, column=6)
-        row_data = (
-            date_str,  # 日付を8桁の数値文字列として保持
-            str(cast(Any, cell2).value or '') if cell2 else '',
-            str(cast(Any, cell3).value or '') if cell3 else '',
-            str(cast(Any, cell4).value or '') if cell4 else '',
-            str(cast(Any, cell5).value or '') if cell5 else '',
-            str(cast(Any, cell6).value or '') if cell6 else ''
-        )
-        existing_data.add(row_data)
-
-    # DataFrameのすべての値を文字列に変換
-    temp_df = df.select([
-        pl.col('*').cast(pl.String)
-    ])
-    data_to_write = temp_df.to_numpy().tolist()
-
-    # 既存データセットに存在しないデータのみを抽出
-    unique_data = []
-    for row in data_to_write:
-        # 日付形式をYYYYMMDD形式に統一して比較
-        csv_date = row[0]
-        if isinstance(csv_date, str):
+    メッセージを表示せずに例外で失敗を通知するため、GUIを使わない実行でも使用できる
+
+    Args:
+        excel_path: Excelファイルのパス
+        batches: 書き込むpolarsのDataFrame（分割読み込みのジェネレータも可）
+        dry_run: Trueの場合は重複確認までを行い、書き込みと保存は行わない
+        engine: 書き込み方法（'openpyxl'・'patch'）。省略時は設定ファイルの値
+        journal: 保存と追記した行を記録するジャーナル
+
+    Returns:
+        行数と処理段階ごとの所要時間
+
+    Raises:
+        FileNotFoundError: Excelファイル（.xlsm）が存在しない場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    if not Path(excel_path).exists() or not excel_path.endswith('.xlsm'):
+        raise FileNotFoundError(f"Excelファイルが見つかりません: {excel_path}")
+
+    if not dry_run:
+        # 前回の取り込みのバックアップが終わってから変更する
+        backup_worker.wait(excel_path)
+
+    config = ConfigManager()
+    result = AppendResult()
+    started = time.perf_counter()
+    cache = None
+    if _workbook_cache_enabled(config):
+        cache = workbook_cache
+        cache.configure(config.get_workbook_cache_idle_seconds(), config.get_workbook_cache_max_memory_mb())
+    # 確認のみの実行では書き込まないため、ブックを開かずにキーのみを読み込む
+    writer = None if dry_run else _open_writer(excel_path, engine or config.get_excel_writer(), cache)
+
+    index = DedupIndex.open(excel_path) if _dedup_index_enabled(config) else None
+    try:
+        try:
+            existing = _load_existing_keys(writer, excel_path, index)
+            if writer is not None:
+                writer.prepare(existing.last_row + 1)
+        except WorkbookPatchError as e:
+            print(f"Excelファイルを直接書き換えられないため、openpyxlで書き込みます: {str(e)}")
+            if writer is not None:
+                writer.close()
+            writer = _OpenpyxlWriter(excel_path, cache)
+            existing = _load_existing_keys(writer, excel_path, index)
+        last_row = existing.last_row
+        result.existing_rows = max(last_row - 1, 0)
+        result.add_time('open', time.perf_counter() - started)
+
+        # 並べ替えて挿入する場合のみ新規の行をすべて保持し、それ以外はバッチごとに書き込む
+        sorted_insert = not dry_run and _sorted_insert_enabled(config)
+        new_rows: list[tuple[Any, ...]] = []
+        new_keys: list[RowKey] = []
+        next_row = last_row + 1
+
+        batch_iter = iter(batches)
+        while True:
+            started = time.perf_counter()
+            df = next(batch_iter, None)
+            result.add_time('read', time.perf_counter() - started)
+            if df is None:
+                break
+            result.incoming_rows += len(df)
+
+            started = time.perf_counter()
+            unique_data, unique_keys = _filter_new_rows(df, existing.keys)
+            result.add_time('dedup', time.perf_counter() - started)
+            result.appended_rows += len(unique_data)
+            if writer is None:
+                continue
+            new_keys.extend(unique_keys)
+            if sorted_insert:
+                new_rows.extend(unique_data)
+            elif unique_data:
+                started = time.perf_counter()
+                writer.write_rows(unique_data, next_row)
+                next_row += len(unique_data)
+                result.add_time('write', time.perf_counter() - started)
+
+        if writer is None:
+            return result
+
+        last_key = new_keys[-1] if new_keys else existing.last_key
+        if new_rows:
+            started = time.perf_counter()
+            # 預り日・診療科・患者IDの順に並べ、既存データの並びに合わせて挿入する
+            order = sorted(range(len(new_keys)), key=lambda i: _sort_key(new_keys[i]))
+            new_rows = [new_rows[i] for i in order]
+            new_keys = [new_keys[i] for i in order]
+            if isinstance(writer, _PatchWriter) and not _appends_in_order(existing, new_keys[0]):
+                print("既存データの途中に挿入する行があるため、openpyxlで書き込みます")
+                writer.close()
+                writer = _OpenpyxlWriter(excel_path, cache)
+            last_key = writer.insert_sorted_rows(new_rows, new_keys, last_row) or last_key
+            next_row = last_row + 1 + len(new_rows)
+            result.add_time('write', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        writer.format_rows()
+        result.add_time('format', time.perf_counter() - started)
+
+        started = time.perf_counter()
+        writer.save()
+        if journal is not None:
+            journal.record_saved(writer.first_row or next_row, writer.new_rows, next_row - 1)
+        result.add_time('save', time.perf_counter() - started)
+
+        if index is not None:
+            started = time.perf_counter()
+            # 作り直す場合は既存のキーと追記したキーをまとめて登録する
+            keys = new_keys if existing.from_index else itertools.chain(existing.keys.iter_rows(), new_keys)
+            _update_index(index, excel_path, keys, next_row - 1, existing.from_index, last_key)
+            result.add_time('index', time.perf_counter() - started)
+        return result
+    finally:
+        if index is not None:
+            index.close()
+        if writer is not None:
+            writer.close()
+
+
+def undo_pending_import(excel_path: str) -> int:
+    """中断した取り込みで追記・挿入した行を取り消す
+
+    ジャーナルに記録した行のみを削除し、並べ替えて挿入した際に移動した既存の行を元の位置に戻す。
+    保存後にExcelファイルが変更された場合やCSVファイルを移動済みの場合は取り消さない
+
+    Args:
+        excel_path: Excelファイルのパス
+
+    Returns:
+        取り消した行数
+
+    Raises:
+        ValueError: 取り消せる取り込みがない場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    backup_worker.wait(excel_path)
+    journal = ImportJournal(excel_path)
+    entry = journal.pending()
+    if entry is None or not entry.saved or entry.first_row is None or entry.last_row is None:
+        raise ValueError("取り消せる取り込みがありません")
+    if STAGE_MOVE in entry.completed:
+        raise ValueError("CSVファイルを移動済みのため取り消せません")
+    signature = entry.signature
+    if signature is None or WorkbookSignature.from_file(excel_path) != signature:
+        raise ValueError("取り込み後にExcelファイルが変更されているため取り消せません")
+
+    config = ConfigManager()
+    writer = _OpenpyxlWriter(excel_path, workbook_cache if _workbook_cache_enabled(config) else None)
+    try:
+        ws = writer.worksheet
+        removed_keys, last_row = writer.remove_rows(entry.first_row, entry.inserted_rows, entry.last_row)
+        writer.save()
+
+        index = DedupIndex.open(excel_path) if _dedup_index_enabled(config) else None
+        if index is not None:
             try:
-                # YYYY-MM-DD形式をYYYYMMDD形式に変換
-                date_obj = datetime.datetime.strptime(csv_date, '%Y-%m-%d')
-                date_str = date_obj.strftime('%Y%m%d')
-            except ValueError:
-                date_str = csv_date
-        else:
-            date_str = str(csv_date)
-
-        # 比較用のタプルを作成
-        row_data = (
-            date_str,
-            str(row[1] or ''),
-            str(row[2] or ''),
-            str(row[3] or ''),
-            str(row[4] or ''),
-            str(row[5] or '')
-        )
+                # インデックスが取り込み直後の状態であれば取り消した行のキーのみを削除する
+                if index.matches(signature):
+                    last_key = _row_key([ws.cell(row=last_row, column=column).value
+                                         for column in range(1, len(KEY_COLUMNS) + 1)]) if last_row >= 2 else None
+                    index.remove(removed_keys, WorkbookSignature.from_file(excel_path), last_row, last_key)
+            except (sqlite3.Error, OSError, zipfile.BadZipFile) as e:
+                print(f"重複チェック用インデックスを更新できません: {str(e)}")
+            finally:
+                index.close()
+    finally:
+        writer.close()
+
+    journal.complete()
+    return len(removed_keys)
+
+
+def rollback_excel_file(excel_path: str) -> None:
+    """Excelファイルを最後に保存する前の状態に戻す
+
+    保存時に残した1世代前のファイルと名前を入れ替えるのみのため、ファイルの大きさによらずすぐに終わる
+
+    Args:
+        excel_path: Excelファイルのパス
 
-        if row_data not in existing_data:
-            unique_data.append(row)
-
-    # 新規データを行ごとにセルに書き込み、必要に応じて型変換を実施
-    for i, row in enumerate(unique_data):
-        for j, value in enumerate(row):
-            cell = ws.cell(row=last_row + 1 + i, column=j + 1)
-            typed_cell = cast(Any, cell)
-
-            if j == 0:  # 日付列を日付型に変換
-                try:
-                    date_value = datetime.datetime.strptime(value, '%Y-%m-%d')
-                    typed_cell.value = date_value
-                    typed_cell.number_format = 'yyyy/mm/dd'
-                except ValueError:
-                    typed_cell.value = value
-            elif j == 1:  # 患者ID列
-                try:
-                    typed_cell.value = int(value.replace(',', ''))
-                    typed_cell.number_format = '0'
-                except ValueError:
-                    typed_cell.value = value
+    Raises:
+        ValueError: 中断した取り込みがある場合
+        FileNotFoundError: 1世代前のファイルがない場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    backup_worker.wait(excel_path)
+    if ImportJournal(excel_path).pending() is not None:
+        raise ValueError("中断した取り込みがあるため元に戻せません。再開または取り消しを行ってください")
+
+    workbook_cache.clear()
+    try:
+        rollback_file(excel_path)
+    except PermissionError as e:
+        raise ExcelFileLockedError(LOCKED_ON_SAVE_MESSAGE) from e
+
+
+def _remove_rows(ws: Worksheet, first_row: int, inserted_rows: list[int],
+                 last_row: int) -> tuple[list[RowKey], int]:
+    """挿入した行を除いて後続の行（A～I列）を詰め、削除した行のキーと新しい最終行を返す"""
+    inserted = set(inserted_rows)
+    removed_keys = []
+    target = first_row
+    for row in range(first_row, last_row + 1):
+        if row in inserted:
+            removed_keys.append(_row_key([ws.cell(row=row, column=column).value
+                                          for column in range(1, len(KEY_COLUMNS) + 1)]))
+            continue
+        if target != row:
+            for column in range(1, SORT_COLUMN_COUNT + 1):
+                source = ws.cell(row=row, column=column)
+                cell = cast(Cell, ws.cell(row=target, column=column))
+                cell.value = source.value
+                cell._style = copy(source._style)
+        target += 1
+
+    for row in range(target, last_row + 1):
+        for column in range(1, SORT_COLUMN_COUNT + 1):
+            cell = cast(Cell, ws.cell(row=row, column=column))
+            cell.value = None
+            cell._style = StyleArray()
+    return removed_keys, target - 1
+
+
+class _OpenpyxlWriter:
+    """openpyxlでブック全体を読み込み、セルに書き込んで保存する"""
+
+    def __init__(self, excel_path: str, cache: Optional[WorkbookCache] = None) -> None:
+        self.excel_path: str = excel_path
+        self.cache: Optional[WorkbookCache] = cache
+        self.new_rows: list[int] = []
+        self.first_row: Optional[int] = None
+        self.saved: bool = False
+        # 行の追記・挿入・削除でブックを変更したかどうか（保存前のブックはキャッシュに戻さない）
+        self.modified: bool = False
+        # 前回保存した後に変更されていなければ、読み込み済みのブックを再利用する
+        workbook = cache.take(excel_path) if cache is not None else None
+        if workbook is None:
+            try:
+                workbook = load_workbook(filename=excel_path, keep_vba=True)
+            except PermissionError as e:
+                raise ExcelFileLockedError(LOCKED_ON_OPEN_MESSAGE) from e
+        self.workbook = workbook
+
+    @property
+    def worksheet(self) -> Worksheet:
+        return cast(Worksheet, self.workbook.active)
+
+    def prepare(self, start_row: int) -> None:
+        pass
+
+    def write_rows(self, rows: list[tuple[Any, ...]], start_row: int) -> None:
+        self.modified = True
+        _write_rows(self.worksheet, rows, start_row)
+        self.new_rows.extend(range(start_row, start_row + len(rows)))
+        self.first_row = self.first_row or start_row
+
+    def insert_sorted_rows(self, rows: list[tuple[Any, ...]], keys: list[RowKey],
+                           last_row: int) -> Optional[RowKey]:
+        """並べ替え済みの行を既存データの並びに合わせて挿入し、最終行のキーを返す
+
+        最終行から順に新規データの先頭より後に並ぶ既存の行を探し、
+        その行以降のみを新規データとあわせて並べ直す（既存データは並べ替え済みとする）
+        """
+        self.modified = True
+        ws = self.worksheet
+        first_key = _sort_key(keys[0])
+        moved: list[tuple[RowKey, list[tuple[Any, StyleArray]]]] = []
+        row = last_row
+        while row >= 2:
+            cells = [ws.cell(row=row, column=column) for column in range(1, SORT_COLUMN_COUNT + 1)]
+            key = _row_key([cast(Any, cell).value for cell in cells[:len(KEY_COLUMNS)]])
+            if _sort_key(key) <= first_key:
+                break
+            moved.append((key, [(cast(Any, cell).value, copy(cell._style)) for cell in cells]))
+            row -= 1
+        moved.reverse()
+        self.first_row = row + 1
+
+        # 同じキーの場合は既存の行を先にする（Excelでのソートと同じ安定な並び）
+        merged = heapq.merge(
+            ((key, cells) for key, cells in moved),
+            ((key, values) for key, values in zip(keys, rows)),
+            key=lambda item: _sort_key(item[0]),
+        )
+        last_key = None
+        for row, (key, item) in enumerate(merged, start=row + 1):
+            if isinstance(item, list):
+                for column, (value, style) in enumerate(item, 1):
+                    cell = ws.cell(row=row, column=column)
+                    cell.value = value
+                    cell._style = style
             else:
-                typed_cell.value = value if value is not None else ""
+                for column in range(1, SORT_COLUMN_COUNT + 1):
+                    cell = ws.cell(row=row, column=column)
+                    cell.value = None
+                    cell._style = StyleArray()
+                _write_rows(ws, [item], row)
+                self.new_rows.append(row)
+            last_key = key
+        return last_key
+
+    def remove_rows(self, first_row: int, inserted_rows: list[int],
+                    last_row: int) -> tuple[list[RowKey], int]:
+        """追記・挿入した行を削除して後続の行を詰める（_remove_rowsを参照）"""
+        self.modified = True
+        return _remove_rows(self.worksheet, first_row, inserted_rows, last_row)
+
+    def format_rows(self) -> None:
+        # 書き込んだ行が連続する範囲ごとに書式を設定する
+        for _, group in itertools.groupby(enumerate(self.new_rows), lambda item: item[1] - item[0]):
+            rows = [row for _, row in group]
+            apply_cell_formats(self.worksheet, rows[0], rows[-1])
+
+    def save(self) -> None:
+        try:
+            with atomic_write(self.excel_path) as temp_path:
+                self.workbook.save(temp_path)
+        except PermissionError as e:
+            raise ExcelFileLockedError(LOCKED_ON_SAVE_MESSAGE) from e
+        self.saved = True
+
+    def close(self) -> None:
+        # ファイルと同じ内容のブック（保存済み・未変更）のみ次の取り込みのために保持する
+        if self.cache is not None and (self.saved or not self.modified):
+            self.cache.put(self.excel_path, self.workbook)
+        else:
+            # keep_vbaで開いたマクロ部分は保存しない場合も閉じておく
+            close_workbook(self.workbook)
+
+
+class _PatchWriter:
+    """zip内のワークシートのXMLに行を直接追記する（xlsm_patcher）"""
+
+    def __init__(self, excel_path: str) -> None:
+        self.patcher: XlsmPatcher = XlsmPatcher(excel_path)
+        self.new_rows: list[int] = []
+        self.first_row: Optional[int] = None
+
+    @property
+    def worksheet(self) -> Worksheet:
+        raise WorkbookPatchError("ワークシートのXMLを読み込めません")
+
+    def prepare(self, start_row: int) -> None:
+        self.patcher.prepare(start_row)
+
+    def write_rows(self, rows: list[tuple[Any, ...]], start_row: int) -> None:
+        for row in rows:
+            # 書式はapply_cell_formatsと同じ配置を書き込み時に設定する
+            cells: list[PatchCell] = [
+                (value, _number_format(column - 1, value), COLUMN_ALIGNMENTS.get(column))
+                for column, value in enumerate(row, 1)
+            ]
+            self.patcher.write_row(cells)
+        self.new_rows.extend(range(start_row, start_row + len(rows)))
+        self.first_row = self.first_row or start_row
+
+    def insert_sorted_rows(self, rows: list[tuple[Any, ...]], keys: list[RowKey],
+                           last_row: int) -> Optional[RowKey]:
+        # すべて既存データの後に並ぶ場合のみ（_appends_in_orderで確認済み）
+        self.write_rows(rows, last_row + 1)
+        return keys[-1]
+
+    def format_rows(self) -> None:
+        pass
+
+    def save(self) -> None:
+        try:
+            self.patcher.save()
+        except PermissionError as e:
+            raise ExcelFileLockedError(LOCKED_ON_SAVE_MESSAGE) from e
+
+    def close(self) -> None:
+        pass
+
+
+def _open_writer(excel_path: str, engine: str,
+                 cache: Optional[WorkbookCache] = None) -> _OpenpyxlWriter | _PatchWriter:
+    """書き込み方法（'openpyxl'・'patch'）に応じてExcelファイルを開く
+
+    zipを直接書き換えられないファイルの場合はopenpyxlで開く
+    """
+    if engine == 'patch':
+        try:
+            return _PatchWriter(excel_path)
+        except PermissionError as e:
+            raise ExcelFileLockedError(LOCKED_ON_OPEN_MESSAGE) from e
+        except (KeyError, ValueError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+            print(f"Excelファイルを直接書き換えられないため、openpyxlで書き込みます: {str(e)}")
+    return _OpenpyxlWriter(excel_path, cache)
+
+
+def _load_existing_keys(writer: Optional[_OpenpyxlWriter | _PatchWriter], excel_path: str,
+                        index: Optional[DedupIndex]) -> _ExistingRows:
+    """重複チェック用の既存データのキーと最終行を取得
+
+    インデックスがExcelファイルの現在の内容に対応していればワークシートを読まずに取得する。
+    それ以外はzip内のワークシートのXMLからA～F列のみを読み込む。
+    XMLを読み込めない場合のみブックを開く（writerがNoneの場合は読み込み後に閉じる）
+    """
+    if index is not None:
+        try:
+            last_row = index.last_row
+            if last_row is not None and index.matches(WorkbookSignature.from_file(excel_path)):
+                return _ExistingRows(_keys_frame(index.load_keys()), last_row, True, index.last_key)
+        except (sqlite3.Error, OSError, zipfile.BadZipFile) as e:
+            print(f"重複チェック用インデックスを読み込めません: {str(e)}")
+        print("重複チェック用インデックスをワークシートから作成します")
+
+    try:
+        sheet_keys = read_key_columns(excel_path)
+        frame = sheet_keys.frame
+        last_key = frame.row(-1) if not frame.is_empty() else None
+        return _ExistingRows(frame, sheet_keys.last_row, False, last_key)
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile, ElementTree.ParseError) as e:
+        print(f"ワークシートのXMLを読み込めないため、セルごとに読み込みます: {str(e)}")
+
+    reader = writer or _OpenpyxlWriter(excel_path)
+    try:
+        ws = reader.worksheet
+        last_row = get_last_row(ws)
+        return _ExistingRows(_keys_frame(_read_existing_keys(ws, last_row)), last_row, False)
+    finally:
+        if writer is None:
+            reader.close()
+
+
+def _keys_frame(keys: Iterable[RowKey]) -> pl.DataFrame:
+    """キーのタプルを重複チェック用のDataFrameに変換"""
+    return pl.DataFrame(list(keys), schema=KEY_SCHEMA, orient='row')
 
-    apply_cell_formats(ws, last_row + 1)
 
+def _update_index(index: DedupIndex, excel_path: str, keys: Iterable[RowKey],
+                  last_row: int, incremental: bool, last_key: Optional[RowKey] = None) -> None:
+    """保存後のExcelファイルに合わせてインデックスを更新（失敗時は次回作り直す）"""
     try:
-        wb.save(excel_path)
-        wb.close()
+        signature = WorkbookSignature.from_file(excel_path)
+        if incremental:
+            index.append(keys, signature, last_row, last_key)
+        else:
+            index.rebuild(keys, signature, last_row, last_key)
+    except (sqlite3.Error, OSError, zipfile.BadZipFile) as e:
+        print(f"重複チェック用インデックスを更新できませんでした: {str(e)}")
+
+
+def _read_existing_keys(ws: Worksheet, last_row: int) -> set[RowKey]:
+    """既存データのセットを構築して重複チェック用のキーを作成（A～F列の値で識別）"""
+    existing_data = set()
+    for row in range(2, last_row + 1):
+        # A列からF列までの値を取得（日付はYYYYMMDD形式の文字列として保持）
+        values = []
+        for column in range(1, len(KEY_COLUMNS) + 1):
+            cell = ws.cell(row=row, column=column)
+            values.append(cast(Any, cell).value if cell else None)
+        existing_data.add(_row_key(values))
+    return existing_data
+
+
+def _row_key(values: list[Any]) -> RowKey:
+    """A～F列のセルの値から重複チェック用のキーを作成（日付はYYYYMMDD形式）"""
+    date_value = values[0]
+    if isinstance(date_value, datetime.datetime):
+        date_str = date_value.strftime('%Y%m%d')
+    else:
+        date_str = str(date_value or '')
+    return (date_str, *(str(value or '') for value in values[1:]))
+
+
+def _sort_key(key: RowKey) -> tuple[tuple[int, Any], ...]:
+    """キーから預り日・診療科・患者IDの昇順ソートのキーを作成
+
+    数値（日付を含む）、文字列、空白の順とする。文字列は大文字と小文字を区別せずコードポイント順に比較する。
+    Excelのソートはふりがな（読み）の順に並べるため、診療科などの漢字を含む値は並びが異なる場合がある（既知の相違）。
+    Excelと同じ並びが必要な場合は、sorted_insertを使用せずにExcelでソートする
+    """
+    values = []
+    for position in SORT_KEY_POSITIONS:
+        text = key[position]
+        if position == 1:
+            text = text.replace(',', '')
+        if text == '':
+            values.append((2, ''))
+        elif (DATE_KEY if position == 0 else INTEGER_KEY).fullmatch(text):
+            values.append((0, int(text)))
+        else:
+            values.append((1, text.lower()))
+    return tuple(values)
+
+
+def _dedup_index_enabled(config: ConfigManager) -> bool:
+    """重複チェック用インデックスを使用するかを判定
+
+    取り込み後にExcelでソートして保存する場合はワークシートのチェックサムが毎回変わり、
+    インデックスを次の取り込みで使えないため作成しない
+    """
+    return config.get_dedup_index_enabled() and not (COM_AVAILABLE and config.get_com_sort_enabled())
+
+
+def _workbook_cache_enabled(config: ConfigManager) -> bool:
+    """保存したブックを次の取り込みで再利用するかを判定
+
+    取り込み後にExcelでソートして保存する場合はファイルが保存時から変わり、
+    ブックを次の取り込みで再利用できないため保持しない
+    """
+    return config.get_workbook_cache_enabled() and not (COM_AVAILABLE and config.get_com_sort_enabled())
+
+
+def _sorted_insert_enabled(config: ConfigManager) -> bool:
+    """新規データを並べ替えて挿入するかを判定
+
+    取り込み後にExcelでソートする場合は並びがExcelの並び順で決まるため、並べ替えずに末尾へ追記する
+    """
+    return config.get_sorted_insert_enabled() and not (COM_AVAILABLE and config.get_com_sort_enabled())
+
+
+def _appends_in_order(existing: _ExistingRows, first_key: RowKey) -> bool:
+    """並べ替えた新規データがすべて既存データの最終行の後に並ぶかを判定"""
+    if existing.last_row <= 1:
         return True
-    except PermissionError:
-        QMessageBox.critical(None,
-                             "エラー",
-                             "Excelファイルが別のプロセスで開かれているため、保存できません。\nファイルを閉じてから再度実行してください。"
-                             )
-        if 'wb' in locals():
-            wb.close()
-        return False
+    return existing.last_key is not None and _sort_key(existing.last_key) <= _sort_key(first_key)
+
+
+def _row_keys(df: pl.DataFrame) -> pl.DataFrame:
+    """取り込むデータのA～F列を既存データと同じキー形式の文字列に変換
+
+    預り日はYYYY-MM-DD形式であればYYYYMMDD形式とし、それ以外はそのまま（空の場合は'None'）とする。
+    その他の列は空の場合を空文字列とする
+    """
+    text = [pl.col(name).cast(pl.String) for name in df.columns[:len(KEY_COLUMNS)]]
+    date = text[0]
+    date_key = (
+        pl.when(date.is_null())
+        .then(pl.lit('None'))
+        .otherwise(date.str.strptime(pl.Date, '%Y-%m-%d', strict=False)
+                   .dt.strftime('%Y%m%d')
+                   .fill_null(date))
+    )
+    return df.select(
+        date_key.alias(KEY_COLUMNS[0]),
+        *(column.fill_null('').alias(name) for column, name in zip(text[1:], KEY_COLUMNS[1:])),
+    )
+
+
+def _filter_new_rows(df: pl.DataFrame,
+                     existing_data: pl.DataFrame) -> tuple[list[tuple[Any, ...]], list[RowKey]]:
+    """既存データに存在しないデータのみを抽出し、抽出した行のキーとあわせて返す
+
+    行ごとにキーを作成して比較せず、キーの列を既存データとanti joinして一括で抽出する
+    """
+    new_keys = (
+        _row_keys(df)
+        .with_row_index(ROW_INDEX_COLUMN)
+        .join(existing_data, on=KEY_COLUMNS, how='anti')
+        .sort(ROW_INDEX_COLUMN)
+    )
+    rows = new_keys.get_column(ROW_INDEX_COLUMN)
+
+    unique_data = _typed_rows(df.select(pl.all().gather(rows)))
+    unique_keys = new_keys.drop(ROW_INDEX_COLUMN).rows()
+    return unique_data, unique_keys
+
+
+def _typed_rows(df: pl.DataFrame) -> list[tuple[Any, ...]]:
+    """書き込む行を列ごとにまとめて型変換（預り日は日付、患者IDは整数、それ以外は文字列）
+
+    polarsで変換できない値のみ、従来と同じく1つずつ変換を試みる（変換できない場合は文字列のまま）
+    """
+    raw = df.select(pl.all().cast(pl.String))
+    date_column, id_column = raw.columns[:2]
+    typed = raw.select(
+        pl.when(pl.col(date_column).str.contains(DATE_PATTERN))
+        .then(pl.col(date_column).str.strptime(pl.Date, '%Y-%m-%d', strict=False))
+        .cast(pl.Datetime('us')),
+        pl.col(id_column).str.replace_all(',', '', literal=True).cast(pl.Int64, strict=False),
+        pl.all().exclude(date_column, id_column).fill_null(''),
+    )
+    rows = typed.rows()
+
+    for column in (0, 1):
+        name = raw.columns[column]
+        unconverted = typed.get_column(name).is_null() & raw.get_column(name).is_not_null()
+        for i in unconverted.arg_true():
+            values = list(rows[i])
+            values[column] = _typed_value(column, raw.item(i, column))
+            rows[i] = tuple(values)
+    return rows
+
+
+def _typed_value(column: int, value: str) -> Any:
+    """polarsで変換できなかった預り日・患者IDの値を変換（変換できない場合はそのまま）"""
+    try:
+        if column == 0:
+            return datetime.datetime.strptime(value, '%Y-%m-%d')
+        return int(value.replace(',', ''))
+    except ValueError:
+        return value
+
+
+def _number_format(column: int, value: Any) -> Optional[str]:
+    """型変換した預り日・患者IDの列に設定する表示形式（変換できなかった値はNone）"""
+    if column == 0 and isinstance(value, datetime.datetime):
+        return DATE_FORMAT
+    if column == 1 and isinstance(value, int):
+        return PATIENT_ID_FORMAT
+    return None
+
+
+def _write_rows(ws: Worksheet, unique_data: list[tuple[Any, ...]], start_row: int) -> None:
+    """型変換済みの新規データを書き込む
+
+    表示形式は列ごとに1回だけ登録し、使用範囲より後の行はセルをまとめて作成して追加する
+    """
+    styles: dict[str, StyleArray] = {}
+    for number_format in (DATE_FORMAT, PATIENT_ID_FORMAT):
+        cell = WriteOnlyCell(ws)
+        cell.number_format = number_format
+        styles[number_format] = cell._style
+
+    first_appended = ws.max_row + 1
+    if start_row > first_appended:
+        # 使用範囲との間に空行がある場合は先頭の行をセルに書き込み、ws.appendで追加する位置をその次にそろえる
+        first_appended = start_row + 1
+    for row_number, row in enumerate(unique_data[:first_appended - start_row], start_row):
+        # 値のない行が残っている範囲は既存のセル（罫線など）に書き込む
+        for column, value in enumerate(row):
+            typed_cell = cast(Cell, ws.cell(row=row_number, column=column + 1))
+            typed_cell.value = value
+            number_format = _number_format(column, value)
+            if number_format is not None:
+                typed_cell.number_format = number_format
+
+    for row in unique_data[first_appended - start_row:]:
+        cells = []
+        for column, value in enumerate(row):
+            cell = WriteOnlyCell(ws, value=value)
+            number_format = _number_format(column, value)
+            if number_format is not None:
+                cell._style = copy(styles[number_format])
+            cells.append(cell)
+        ws.append(cells)
 
 
 def clear_all_filters(worksheet: Any, workbook: Any) -> None:
@@ -294,9 +967,14 @@ def open_and_sort_excel(excel_path: str) -> None:
     excel_path_obj = Path(excel_path)
 
     if not excel_path_obj.exists():
-        QMessageBox.critical(None, "エラー", f"Excelファイルが見つかりません: {excel_path}")
+        show_error(f"Excelファイルが見つかりません: {excel_path}")
+        return
+
+    if not COM_AVAILABLE or win32com is None or pyautogui is None:
+        print("Excelを操作できない環境のため、ソートと共有をスキップしました")
         return
 
+    config = ConfigManager()
     excel_path_str = str(excel_path_obj.resolve())
     excel = None
     workbook = None
@@ -310,7 +988,7 @@ def open_and_sort_excel(excel_path: str) -> None:
         workbook = excel.Workbooks.Open(excel_path_str)
 
         if workbook is None:
-            QMessageBox.critical(None, "エラー", "Excelファイルを開くことができませんでした。")
+            show_error("Excelファイルを開くことができませんでした。")
             return
 
         excel.WindowState = -4137  # xlMaximized
@@ -318,18 +996,21 @@ def open_and_sort_excel(excel_path: str) -> None:
 
         worksheet = workbook.ActiveSheet
 
+        # Excelの起動と並行して実行していたバックアップが終わってから変更する
+        backup_worker.wait(excel_path)
+
         # フィルタがかかっていればクリア
         clear_all_filters(worksheet, workbook)
 
-        # データをソート
-        sort_excel_data(worksheet)
+        # データをソート（並べ替えて書き込み済みの場合は省略できる）
+        if config.get_com_sort_enabled():
+            sort_excel_data(worksheet)
 
         # 最終行にカーソルを移動
         last_row = worksheet.Cells(worksheet.Rows.Count, "A").End(-4162).Row
         worksheet.Cells(last_row, 1).Select()
 
         # 設定に従って共有ボタンをクリック
-        config = ConfigManager()
         wait_time = config.get_share_button_wait_time()
         time.sleep(wait_time)
         share_x, share_y = config.get_share_button_position()
@@ -338,7 +1019,7 @@ def open_and_sort_excel(excel_path: str) -> None:
     except Exception as e:
         error_msg = f"Excelファイルの処理中にエラーが発生しました: {str(e)}"
         print(error_msg)
-        QMessageBox.critical(None, "エラー", error_msg)
+        show_error(error_msg)
     finally:
         # Excelは開いたままにするがエラー処理は行う
         pyautogui.hotkey('win', 'down')  # ウィンドウを最小化
@@ -1,13 +1,26 @@
 import shutil
 import datetime
+from collections import Counter
 from pathlib import Path
+from typing import Optional
 
+from services.backup_store import STORE_DIRNAME, BackupStore, Snapshot, fsync_file, open_backup_store
+from services.retention_manifest import RetentionEntry, RetentionManifest, scan_files
 from utils.config_manager import ConfigManager
 
+BACKUP_FILE_PREFIX = "医療文書担当一覧_"
+CSV_PATTERNS = ("*.csv",)
+BACKUP_PATTERNS = (f"{BACKUP_FILE_PREFIX}*.xlsm",)
+# 復元したファイルは保持期間による削除の対象（BACKUP_PATTERNS）に含めない
+RESTORED_FILE_PREFIX = "復元_"
+
 
 def backup_excel_file(excel_path: str) -> None:
     """Excelファイルのバックアップを作成
 
+    `[Backup] mode = snapshot`の場合はzip内の部品ごとに重複を除いて保存し（変更された部品のみを書き込む）、
+    copyの場合はファイル全体を日時付きのファイル名でコピーする
+
     Args:
         excel_path: バックアップ対象のExcelファイルパス
     """
@@ -17,13 +30,26 @@ def backup_excel_file(excel_path: str) -> None:
     if not backup_dir.exists():
         backup_dir.mkdir(parents=True)
 
-    # 現在の日時を取得してファイル名を生成
-    timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M')
-    backup_filename = f"医療文書担当一覧_{timestamp}.xlsm"
-    backup_path = backup_dir / backup_filename
-
     try:
+        if config.get_backup_mode() == 'snapshot':
+            store = open_backup_store(backup_dir)
+            snapshot = store.snapshot(excel_path)
+            # 共有する部品は最初に保存したスナップショットのサイズとして数える
+            open_backup_manifest(backup_dir).add(
+                store.snapshot_path(snapshot.snapshot_id),
+                datetime.datetime.fromisoformat(snapshot.created).timestamp(), snapshot.stored_bytes)
+            print(f"バックアップを作成しました: {snapshot.snapshot_id}"
+                  f"（新たに保存したサイズ: {snapshot.stored_bytes:,}バイト）")
+            return
+
+        # 現在の日時を取得してファイル名を生成
+        timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M')
+        backup_filename = f"{BACKUP_FILE_PREFIX}{timestamp}.xlsm"
+        backup_path = backup_dir / backup_filename
+
         shutil.copy2(excel_path, backup_path)
+        fsync_file(backup_path)
+        open_backup_manifest(backup_dir).add(backup_path)
         print(f"バックアップを作成しました: {backup_path}")
     except Exception as e:
         print(f"バックアップ作成中にエラーが発生しました: {str(e)}")
@@ -38,18 +64,18 @@ def cleanup_old_csv_files(processed_dir: Path) -> None:
     """
     config = ConfigManager()
     retention_days = config.get_backup_retention_days()
-    current_time = datetime.datetime.now()
-    for file in processed_dir.glob("*.csv"):
-        file_time = datetime.datetime.fromtimestamp(file.stat().st_mtime)
-        if (current_time - file_time).days >= retention_days:
-            try:
-                file.unlink()
-            except Exception as e:
-                print(f"ファイル削除中にエラーが発生しました: {file} - {str(e)}")
+    manifest = open_csv_manifest(processed_dir)
+    if manifest.needs_reconcile(config.get_retention_reconcile_hours() * 3600):
+        manifest.reconcile()
+    older_than = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    manifest.expire(older_than.timestamp())
 
 
 def cleanup_old_backup_files() -> None:
-    """指定した日数より前のバックアップファイルを削除"""
+    """指定した日数より前のバックアップファイルを削除
+
+    `[Backup] max_disk_mb`を設定した場合は、合計サイズが上限以下になるまで古いバックアップから削除する
+    """
     config = ConfigManager()
     backup_dir = Path(config.get_backup_path())
     retention_days = config.get_backup_retention_days()
@@ -57,15 +83,113 @@ def cleanup_old_backup_files() -> None:
     if not backup_dir.exists():
         return
 
-    current_time = datetime.datetime.now()
-    for file in backup_dir.glob("医療文書担当一覧_*.xlsm"):
-        file_time = datetime.datetime.fromtimestamp(file.stat().st_mtime)
-        if (current_time - file_time).days >= retention_days:
-            try:
-                file.unlink()
-                print(f"古いバックアップを削除しました: {file}")
-            except Exception as e:
-                print(f"バックアップ削除中にエラーが発生しました: {file} - {str(e)}")
+    manifest = open_backup_manifest(backup_dir)
+    if manifest.needs_reconcile(config.get_retention_reconcile_hours() * 3600):
+        manifest.reconcile()
+    older_than = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+    expired = manifest.expire(older_than.timestamp())
+
+    store = open_backup_store(backup_dir)
+    max_mb = config.get_backup_max_disk_mb()
+    if max_mb > 0:
+        expired += _expire_over_budget(manifest, store, backup_dir, max_mb * 1024 * 1024)
+    for entry in expired:
+        print(f"古いバックアップを削除しました: {entry.name}")
+
+    # 削除したスナップショットのみが参照していた部品を削除
+    if any(entry.name.startswith(f"{STORE_DIRNAME}/") for entry in expired):
+        store.collect_garbage()
+
+
+def _expire_over_budget(manifest: RetentionManifest, store: BackupStore, backup_dir: Path,
+                        max_bytes: int) -> list[RetentionEntry]:
+    """バックアップの実際の合計サイズが上限を超える分を古い順に削除（最新のバックアップは残す）
+
+    スナップショットは共有する部品があるため、削除によって参照されなくなるオブジェクトのサイズのみを減らす
+
+    Args:
+        manifest: バックアップフォルダの保持期間の索引
+        store: スナップショットの保存先
+        backup_dir: バックアップフォルダ
+        max_bytes: 合計サイズの上限
+
+    Returns:
+        削除したバックアップ
+    """
+    snapshots = {store.snapshot_path(snapshot.snapshot_id).relative_to(backup_dir).as_posix(): snapshot
+                 for snapshot in store.list_snapshots()}
+    object_sizes = store.object_sizes()
+    references = Counter(digest for snapshot in snapshots.values()
+                         for digest in {part.digest for part in snapshot.parts})
+    entries = manifest.entries()
+    total = (sum(object_sizes.get(digest, 0) for digest in references)
+             + sum(entry.size for entry in entries if entry.name not in snapshots))
+
+    removed = []
+    for entry in entries[:-1]:
+        if total <= max_bytes:
+            break
+        if not manifest.remove(entry):
+            continue
+        snapshot = snapshots.get(entry.name)
+        if snapshot is None:
+            total -= entry.size
+        else:
+            for digest in {part.digest for part in snapshot.parts}:
+                references[digest] -= 1
+                if references[digest] == 0:
+                    total -= object_sizes.get(digest, 0)
+        removed.append(entry)
+    return removed
+
+
+def open_csv_manifest(processed_dir: Path) -> RetentionManifest:
+    """処理済みCSVフォルダの保持期間の索引を取得"""
+    return RetentionManifest(processed_dir, lambda: scan_files(processed_dir, CSV_PATTERNS))
+
+
+def open_backup_manifest(backup_dir: Path) -> RetentionManifest:
+    """バックアップフォルダの保持期間の索引を取得（コピーしたファイルとスナップショットを管理する）"""
+    def scan() -> dict[str, RetentionEntry]:
+        entries = scan_files(backup_dir, BACKUP_PATTERNS)
+        store = open_backup_store(backup_dir)
+        for snapshot in store.list_snapshots():
+            name = store.snapshot_path(snapshot.snapshot_id).relative_to(backup_dir).as_posix()
+            created = datetime.datetime.fromisoformat(snapshot.created).timestamp()
+            entries[name] = RetentionEntry(name, created, snapshot.stored_bytes)
+        return entries
+
+    return RetentionManifest(backup_dir, scan)
+
+
+def list_backups() -> list[Snapshot]:
+    """保存しているバックアップ（スナップショット）を作成日時の古い順に取得"""
+    config = ConfigManager()
+    return open_backup_store(Path(config.get_backup_path())).list_snapshots()
+
+
+def restore_backup(snapshot_id: str, dest_path: Optional[str] = None) -> Path:
+    """バックアップ（スナップショット）からExcelファイルを復元
+
+    Args:
+        snapshot_id: 復元するスナップショットの識別子
+        dest_path: 復元先のファイルパス（省略時はバックアップフォルダに「復元_」で始まる日時付きのファイル名で作成）
+
+    Returns:
+        復元したファイルのパス
+
+    Raises:
+        ValueError: スナップショットが見つからない場合や内容が壊れている場合
+    """
+    config = ConfigManager()
+    backup_dir = Path(config.get_backup_path())
+    if dest_path is None:
+        dest = backup_dir / f"{RESTORED_FILE_PREFIX}{BACKUP_FILE_PREFIX}{snapshot_id}.xlsm"
+    else:
+        dest = Path(dest_path)
+    restored = open_backup_store(backup_dir).restore(snapshot_id, str(dest))
+    print(f"バックアップを復元しました: {restored}")
+    return restored
 
 
 def ensure_directories_exist() -> None:
@@ -0,0 +1,139 @@
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from services.csv_processor import is_papyrus_csv_name
+
+
+class FolderWatcher:
+    """ダウンロードフォルダを監視し、書き込みが完了したCSVファイルを取り込み処理に渡す
+
+    一定間隔でフォルダを確認し、サイズと更新時刻が一定時間変化しなくなったファイルを完了とみなす。
+    続けて出力されたファイルはまとめて1回の取り込みで処理する。
+    取り込みは単一のワーカースレッドで順に実行する
+    """
+
+    def __init__(self, directory: str, handler: Callable[[list[str]], None],
+                 stable_seconds: float = 2.0, debounce_seconds: float = 3.0,
+                 poll_interval: float = 1.0) -> None:
+        self.directory: str = directory
+        self.handler: Callable[[list[str]], None] = handler
+        self.stable_seconds: float = stable_seconds
+        self.debounce_seconds: float = debounce_seconds
+        self.poll_interval: float = poll_interval
+
+        self._tracked: dict[str, tuple[int, int, float]] = {}
+        self._delivered: dict[str, tuple[int, int]] = {}
+        self._batch: list[str] = []
+        self._last_ready: float = 0.0
+        self._queue: queue.Queue[Optional[list[str]]] = queue.Queue()
+        self._stop_event = threading.Event()
+        self._watch_thread: Optional[threading.Thread] = None
+        self._worker_thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """監視スレッドと取り込みワーカースレッドを開始"""
+        if self._watch_thread is not None:
+            return
+
+        self._stop_event.clear()
+        # 監視開始時点で存在するファイルは対象外とする
+        for name, (size, mtime) in self._scan().items():
+            self._delivered[name] = (size, mtime)
+
+        self._watch_thread = threading.Thread(target=self._watch_loop,
+                                              name="FolderWatcher", daemon=True)
+        self._worker_thread = threading.Thread(target=self._worker_loop,
+                                               name="FolderWatcherWorker", daemon=True)
+        self._watch_thread.start()
+        self._worker_thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """監視を停止し、キュー済みの取り込みが終わるまで待機"""
+        if self._watch_thread is None:
+            return
+
+        self._stop_event.set()
+        self._watch_thread.join(timeout)
+        self._queue.put(None)
+        if self._worker_thread is not None:
+            self._worker_thread.join(timeout)
+        self._watch_thread = None
+        self._worker_thread = None
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        """命名規則に合うCSVファイルのサイズと更新時刻を取得"""
+        files = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if is_papyrus_csv_name(entry.name) and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError as e:
+            print(f"フォルダの確認中にエラーが発生しました: {self.directory} - {str(e)}")
+        return files
+
+    def _watch_loop(self) -> None:
+        try:
+            while not self._stop_event.wait(self.poll_interval):
+                self._update(self._scan(), time.monotonic())
+        except Exception as e:
+            print(f"フォルダの監視中にエラーが発生しました: {str(e)}")
+        finally:
+            if self._batch:
+                self._queue.put(self._batch)
+                self._batch = []
+
+    def _update(self, files: dict[str, tuple[int, int]], now: float) -> None:
+        """ファイルの変化を反映し、完了したファイルをまとめて取り込みキューに追加"""
+        # 追跡中のファイルは毎回確認しているため、含まれないものは削除・移動済み
+        for name in list(self._tracked):
+            if name not in files:
+                del self._tracked[name]
+
+        for name, (size, mtime) in files.items():
+            if self._delivered.get(name) == (size, mtime):
+                continue
+            tracked = self._tracked.get(name)
+            if tracked is None or tracked[:2] != (size, mtime):
+                self._tracked[name] = (size, mtime, now)
+
+        for name, (size, mtime, changed_at) in list(self._tracked.items()):
+            if size > 0 and now - changed_at >= self.stable_seconds:
+                del self._tracked[name]
+                self._delivered[name] = (size, mtime)
+                self._batch.append(os.path.join(self.directory, name))
+                self._last_ready = now
+
+        if self._batch and not self._tracked and now - self._last_ready >= self.debounce_seconds:
+            self._queue.put(self._batch)
+            self._batch = []
+
+    def _worker_loop(self) -> None:
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+
+            # 取り込み中に溜まったファイルも1回の取り込みにまとめる
+            stop = False
+            while True:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                batch.extend(more)
+
+            try:
+                self.handler(batch)
+            except Exception as e:
+                print(f"CSVファイルの自動取り込み中にエラーが発生しました: {str(e)}")
+
+            if stop:
+                return
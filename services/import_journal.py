@@ -0,0 +1,198 @@
+import datetime
+import itertools
+import json
+import os
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from services.backup_worker import backup_worker
+from services.csv_processor import process_completed_csv
+from services.dedup_index import WorkbookSignature
+from services.file_manager import backup_excel_file
+
+JOURNAL_SUFFIX = '.journal.jsonl'
+
+# 取り込みの段階（記録する順）
+STAGE_BEGIN = 'begin'
+STAGE_SAVE = 'save'
+STAGE_MOVE = 'move'
+STAGE_BACKUP = 'backup'
+
+
+@dataclass
+class JournalEntry:
+    """完了していない取り込みの記録
+
+    Attributes:
+        import_id: 取り込みの識別子
+        csv_paths: 取り込んだCSVファイルのパス
+        completed: 完了した段階（begin・save・move・backup）
+        first_row: 保存時に書き換えた最初の行（並べ替えて挿入した場合は移動した既存の行を含む）
+        inserted_rows: 追記・挿入した行の行番号（昇順）
+        last_row: 保存後の最終行
+        signature: 保存直後のExcelファイルの状態
+    """
+    import_id: str
+    csv_paths: list[str]
+    completed: list[str] = field(default_factory=list)
+    first_row: Optional[int] = None
+    inserted_rows: list[int] = field(default_factory=list)
+    last_row: Optional[int] = None
+    signature: Optional[WorkbookSignature] = None
+
+    @property
+    def saved(self) -> bool:
+        return STAGE_SAVE in self.completed
+
+
+def journal_path_for(excel_path: str) -> Path:
+    """Excelファイルと同じフォルダに置くジャーナルファイルのパスを取得"""
+    path = Path(excel_path)
+    return path.with_name(path.stem + JOURNAL_SUFFIX)
+
+
+class ImportJournal:
+    """取り込みの段階ごとの完了と追記した行を記録するジャーナル（JSON Lines）
+
+    記録は1行ずつ追記してディスクに書き込み、取り込みが完了したら空にする。
+    中断した場合は次回の取り込みで完了した段階の続きから再開し、保存後であれば追記した行を取り消せる
+    """
+
+    def __init__(self, excel_path: str) -> None:
+        self.excel_path: str = excel_path
+        self.path: Path = journal_path_for(excel_path)
+        self.import_id: Optional[str] = None
+
+    def begin(self, csv_paths: Iterable[str]) -> str:
+        """取り込みの開始を記録"""
+        self.import_id = uuid.uuid4().hex
+        self._write({
+            'stage': STAGE_BEGIN,
+            'csv_paths': [str(path) for path in csv_paths],
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        })
+        return self.import_id
+
+    def record_saved(self, first_row: int, inserted_rows: Iterable[int], last_row: int) -> None:
+        """Excelファイルの保存と追記・挿入した行を記録（連続する行は範囲にまとめる）"""
+        try:
+            signature = WorkbookSignature.from_file(self.excel_path)
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"取り込みのジャーナルに記録できません: {str(e)}")
+            return
+        ranges = []
+        for _, group in itertools.groupby(enumerate(sorted(inserted_rows)), lambda item: item[1] - item[0]):
+            rows = [row for _, row in group]
+            ranges.append([rows[0], rows[-1]])
+        self._write({
+            'stage': STAGE_SAVE,
+            'first_row': first_row,
+            'rows': ranges,
+            'last_row': last_row,
+            'signature': {'size': signature.size, 'mtime_ns': signature.mtime_ns,
+                          'checksum': signature.checksum},
+        })
+
+    def record(self, stage: str) -> None:
+        """段階（move・backup）の完了を記録"""
+        self._write({'stage': stage})
+
+    def complete_backup(self) -> None:
+        """バックアップの完了を記録して取り込みを完了する（バックアップのワーカースレッドから呼び出す）"""
+        self.record(STAGE_BACKUP)
+        self.complete()
+
+    def complete(self) -> None:
+        """取り込みの完了後にジャーナルを空にする"""
+        self.import_id = None
+        try:
+            if self.path.exists():
+                with open(self.path, 'w', encoding='utf-8') as f:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except OSError as e:
+            print(f"取り込みのジャーナルを空にできません: {str(e)}")
+
+    def pending(self) -> Optional[JournalEntry]:
+        """完了していない最後の取り込みを取得（書き込み途中の行は無視する）"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+
+        entry = None
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('stage') == STAGE_BEGIN:
+                entry = JournalEntry(record['id'], record.get('csv_paths', []), [STAGE_BEGIN])
+            elif entry is not None and record.get('id') == entry.import_id:
+                _apply_record(entry, record)
+        if entry is not None:
+            self.import_id = entry.import_id
+        return entry
+
+    def _write(self, record: dict[str, Any]) -> None:
+        record = {'id': self.import_id, **record}
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            # 記録できない場合も取り込みは続ける（中断時は最初からやり直す）
+            print(f"取り込みのジャーナルに記録できません: {str(e)}")
+
+
+def _apply_record(entry: JournalEntry, record: dict[str, Any]) -> None:
+    stage = record.get('stage')
+    if not isinstance(stage, str):
+        # 段階のない記録は完了した段階に含めない
+        return
+    if stage == STAGE_SAVE:
+        entry.first_row = record['first_row']
+        entry.inserted_rows = [row for start, end in record['rows'] for row in range(start, end + 1)]
+        entry.last_row = record['last_row']
+        entry.signature = WorkbookSignature(**record['signature'])
+    if stage not in entry.completed:
+        entry.completed.append(stage)
+
+
+def resume_pending_import(journal: ImportJournal) -> Optional[JournalEntry]:
+    """中断した取り込みを完了した段階の続きから再開
+
+    保存後に中断した場合はExcelファイルを読み込まずにCSVファイルの移動とバックアップのみを行う。
+    保存前に中断した場合は書き込まれていないため記録を破棄する。
+    前回の取り込みのバックアップがワーカースレッドで実行中の場合は、終わるまで待ってから記録を確認する
+
+    Args:
+        journal: 転記先のExcelファイルのジャーナル
+
+    Returns:
+        再開した取り込み。再開するものがない場合はNone
+    """
+    backup_worker.wait(journal.excel_path)
+    entry = journal.pending()
+    if entry is None:
+        return None
+    if not entry.saved:
+        print("保存前に中断した取り込みの記録を破棄します")
+        journal.complete()
+        return None
+
+    print(f"中断した取り込みを再開します: {', '.join(entry.csv_paths)}")
+    if STAGE_MOVE not in entry.completed:
+        for csv_path in entry.csv_paths:
+            process_completed_csv(csv_path)
+        journal.record(STAGE_MOVE)
+    if STAGE_BACKUP not in entry.completed:
+        backup_excel_file(journal.excel_path)
+        journal.record(STAGE_BACKUP)
+    journal.complete()
+    return entry
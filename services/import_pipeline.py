@@ -0,0 +1,331 @@
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+import polars as pl
+
+from services.backup_worker import backup_worker
+from services.csv_processor import (
+    combine_processed_frames,
+    find_latest_csv,
+    iter_processed_csv_batches,
+    load_processed_csv,
+    load_processed_csvs,
+    process_completed_csv
+)
+from services.excel_processor import (
+    COM_AVAILABLE,
+    append_batches_to_workbook,
+    open_and_sort_excel,
+    rollback_excel_file,
+    undo_pending_import
+)
+from services.file_manager import backup_excel_file, cleanup_old_csv_files, ensure_directories_exist
+from services.import_journal import STAGE_MOVE, ImportJournal, resume_pending_import
+from utils.config_manager import ConfigManager
+
+
+@dataclass
+class StageResult:
+    """処理段階ごとの実行結果
+
+    Attributes:
+        name: 処理段階の名前
+        seconds: 所要時間（秒）
+        rows: 処理した行数（行を扱わない段階はNone）
+        skipped: 実行しなかった場合はTrue
+    """
+    name: str
+    seconds: float = 0.0
+    rows: Optional[int] = None
+    skipped: bool = False
+
+
+@dataclass
+class ImportStats:
+    """取り込み処理の実行結果
+
+    Attributes:
+        csv_path: 取り込んだCSVファイルのパス
+        excel_path: 転記先のExcelファイルのパス
+        dry_run: 書き込みを行わない確認のみの実行かどうか
+        streamed: 分割読み込みで処理したかどうか
+        resumed: 中断した取り込みの続きを行ったかどうか
+        stages: 処理段階ごとの実行結果（実行順）
+    """
+    csv_path: Optional[str] = None
+    excel_path: Optional[str] = None
+    dry_run: bool = False
+    streamed: bool = False
+    resumed: bool = False
+    stages: list[StageResult] = field(default_factory=list)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageResult]:
+        """処理段階の所要時間を計測して記録"""
+        result = StageResult(name)
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            result.seconds += time.perf_counter() - started
+            self.stages.append(result)
+
+    def skip(self, name: str) -> None:
+        self.stages.append(StageResult(name, skipped=True))
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages)
+
+    def to_dict(self) -> dict[str, Any]:
+        data = asdict(self)
+        data['total_seconds'] = self.total_seconds
+        return data
+
+
+def run_import(csv_path: Optional[str] = None, excel_path: Optional[str] = None,
+               dry_run: bool = False, sort: bool = True, wait_for_backup: bool = True) -> ImportStats:
+    """CSVファイルの検索からバックアップまでを実行
+
+    検索・読み込み・重複排除・書き込み・CSVファイルの移動・バックアップの順に実行し、
+    処理段階ごとの所要時間と行数を記録する。Excelでのソートと共有はCOMが使える環境でのみ行う。
+    前回の取り込みが保存後に中断していた場合は、その続き（移動・バックアップ）のみを行う。
+    メッセージは表示せずに例外で失敗を通知するため、GUIからもコマンドラインからも使用する
+
+    Args:
+        csv_path: 取り込むCSVファイル（省略時はダウンロードフォルダの最新ファイル）
+        excel_path: 転記先のExcelファイル（省略時は設定ファイルの値）
+        dry_run: Trueの場合は重複確認までを行い、ファイルの変更は行わない
+        sort: Falseの場合はExcelでのソートと共有を行わない
+        wait_for_backup: Falseの場合はバックアップの完了を待たずに戻る（失敗はワーカースレッドから通知する）
+
+    Returns:
+        処理段階ごとの実行結果
+
+    Raises:
+        FileNotFoundError: CSVファイルまたはExcelファイルが見つからない場合
+        ValueError: CSVファイルを読み込めなかった場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    config = ConfigManager()
+    excel_path = excel_path or config.get_excel_path()
+    stats = ImportStats(excel_path=excel_path, dry_run=dry_run)
+    journal = ImportJournal(excel_path)
+    if _resume_stage(stats, config, journal, dry_run, sort):
+        return stats
+
+    with stats.stage('find'):
+        if csv_path is None:
+            csv_path = find_latest_csv(config.get_downloads_path())
+            if not csv_path:
+                raise FileNotFoundError("ダウンロードフォルダにCSVファイルが見つかりません。")
+        elif not os.path.exists(csv_path):
+            raise FileNotFoundError(f"CSVファイルが見つかりません: {csv_path}")
+    stats.csv_path = csv_path
+
+    with stats.stage('load') as load_stage:
+        stats.streamed = _should_stream(csv_path, config)
+        if stats.streamed:
+            # 大きなファイルは書き込みと並行して分割して読み込む
+            batches = iter_processed_csv_batches(csv_path)
+        else:
+            df = load_processed_csv(csv_path)
+            if df is None:
+                raise ValueError(f"CSVファイルの読み込みに失敗しました: {csv_path}")
+            batches = iter([df])
+
+    _append_stages(stats, journal, [csv_path], batches, load_stage, sort, wait_for_backup)
+    return stats
+
+
+def run_batch_import(csv_paths: list[str], excel_path: Optional[str] = None,
+                     dry_run: bool = False, sort: bool = True,
+                     wait_for_backup: bool = True) -> ImportStats:
+    """指定した複数のCSVファイルを読み込み、1回の保存で取り込む
+
+    読み込めなかったファイルは除いて取り込み、移動もしない。
+    それ以外の処理段階はrun_importと同じ
+
+    Args:
+        csv_paths: 取り込むCSVファイルのパス
+        excel_path: 転記先のExcelファイル（省略時は設定ファイルの値）
+        dry_run: Trueの場合は重複確認までを行い、ファイルの変更は行わない
+        sort: Falseの場合はExcelでのソートと共有を行わない
+        wait_for_backup: Falseの場合はバックアップの完了を待たずに戻る（失敗はワーカースレッドから通知する）
+
+    Returns:
+        処理段階ごとの実行結果
+
+    Raises:
+        FileNotFoundError: Excelファイルが見つからない場合
+        ValueError: すべてのCSVファイルを読み込めなかった場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    config = ConfigManager()
+    excel_path = excel_path or config.get_excel_path()
+    stats = ImportStats(excel_path=excel_path, dry_run=dry_run)
+    journal = ImportJournal(excel_path)
+    if _resume_stage(stats, config, journal, dry_run, sort):
+        return stats
+
+    with stats.stage('load') as load_stage:
+        frames = []
+        loaded_csvs = []
+        for csv_path, df in load_processed_csvs(csv_paths):
+            if df is None:
+                print(f"CSVファイルの読み込みに失敗しました: {csv_path}")
+                continue
+            frames.append(df)
+            loaded_csvs.append(csv_path)
+        if not frames:
+            raise ValueError("CSVファイルの読み込みに失敗しました。")
+        batches = iter([combine_processed_frames(frames)])
+    stats.csv_path = ', '.join(loaded_csvs)
+
+    _append_stages(stats, journal, loaded_csvs, batches, load_stage, sort, wait_for_backup)
+    return stats
+
+
+def undo_import(excel_path: Optional[str] = None) -> int:
+    """保存後に中断した取り込みで追記した行を取り消す
+
+    Args:
+        excel_path: 転記先のExcelファイル（省略時は設定ファイルの値）
+
+    Returns:
+        取り消した行数
+
+    Raises:
+        ValueError: 取り消せる取り込みがない場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    excel_path = excel_path or ConfigManager().get_excel_path()
+    return undo_pending_import(excel_path)
+
+
+def rollback_workbook(excel_path: Optional[str] = None) -> None:
+    """Excelファイルを最後に保存する前の状態に戻す
+
+    Args:
+        excel_path: 転記先のExcelファイル（省略時は設定ファイルの値）
+
+    Raises:
+        ValueError: 中断した取り込みがある場合
+        FileNotFoundError: 1世代前のファイルがない場合
+        ExcelFileLockedError: Excelファイルが他のプロセスで開かれている場合
+    """
+    excel_path = excel_path or ConfigManager().get_excel_path()
+    rollback_excel_file(excel_path)
+
+
+def _resume_stage(stats: ImportStats, config: ConfigManager, journal: ImportJournal,
+                  dry_run: bool, sort: bool) -> bool:
+    """取り込み前の準備を行い、前回保存後に中断した取り込みがあればその続きを実行
+
+    Returns:
+        中断した取り込みの続きを行った場合はTrue（新しいCSVファイルは取り込まない）
+    """
+    if dry_run:
+        return False
+    ensure_directories_exist()
+    cleanup_old_csv_files(Path(config.get_processed_path()))
+
+    started = time.perf_counter()
+    entry = resume_pending_import(journal)
+    if entry is None:
+        return False
+    stats.stages.append(StageResult('resume', time.perf_counter() - started))
+    stats.csv_path = ', '.join(entry.csv_paths)
+    stats.resumed = True
+    _sort_stage(stats, journal.excel_path, sort)
+    return True
+
+
+def _append_stages(stats: ImportStats, journal: ImportJournal, csv_paths: list[str],
+                   batches: Iterator[pl.DataFrame], load_stage: StageResult, sort: bool,
+                   wait_for_backup: bool) -> None:
+    """読み込んだ行の追記からCSVファイルの移動・バックアップ・ソートまでを実行"""
+    excel_path = journal.excel_path
+    dry_run = stats.dry_run
+    if not dry_run:
+        journal.begin(csv_paths)
+    result = append_batches_to_workbook(excel_path, batches, dry_run=dry_run,
+                                        journal=None if dry_run else journal)
+    load_stage.seconds += result.timings.get('read', 0.0)
+    load_stage.rows = result.incoming_rows
+
+    stats.stages.append(StageResult('open', result.timings.get('open', 0.0), result.existing_rows))
+    stats.stages.append(StageResult('dedup', result.timings.get('dedup', 0.0), result.appended_rows))
+    for name in ('write', 'format', 'save', 'index'):
+        if dry_run:
+            stats.skip(name)
+        else:
+            rows = result.appended_rows if name == 'write' else None
+            stats.stages.append(StageResult(name, result.timings.get(name, 0.0), rows))
+
+    if dry_run:
+        for name in ('move', 'backup', 'sort'):
+            stats.skip(name)
+        return
+
+    with stats.stage('move'):
+        for csv_path in csv_paths:
+            process_completed_csv(csv_path)
+        journal.record(STAGE_MOVE)
+
+    # バックアップはワーカースレッドで実行し、Excelの起動と並行させる（ソート前に完了を待つ）
+    backup = backup_worker.submit(backup_excel_file, excel_path, excel_path=excel_path,
+                                  on_success=journal.complete_backup)
+    _sort_stage(stats, excel_path, sort)
+
+    if not wait_for_backup:
+        return
+    backup.wait()
+    stats.stages.append(StageResult('backup', backup.seconds))
+    if backup.error is not None:
+        raise backup.error
+
+
+def _sort_stage(stats: ImportStats, excel_path: str, sort: bool) -> None:
+    """COMが使える環境ではExcelでのソートと共有を実行"""
+    if sort and COM_AVAILABLE:
+        with stats.stage('sort'):
+            open_and_sort_excel(excel_path)
+    else:
+        stats.skip('sort')
+
+
+def _should_stream(csv_path: str, config: ConfigManager) -> bool:
+    """CSVファイルが分割読み込みの対象となる大きさかどうかを判定"""
+    try:
+        size = os.path.getsize(csv_path)
+    except OSError:
+        return False
+    return size >= config.get_streaming_threshold_mb() * 1024 * 1024
+
+
+def format_stats(stats: ImportStats) -> str:
+    """実行結果を処理段階ごとの表形式の文字列に変換"""
+    lines = [
+        f"CSV: {stats.csv_path}",
+        f"Excel: {stats.excel_path}",
+    ]
+    if stats.dry_run:
+        lines.append("確認のみ（ファイルは変更していません）")
+    if stats.streamed:
+        lines.append("分割読み込みで処理しました")
+    if stats.resumed:
+        lines.append("中断した取り込みの続きを行いました")
+
+    for stage in stats.stages:
+        if stage.skipped:
+            lines.append(f"  {stage.name:<8} スキップ")
+            continue
+        rows = f"{stage.rows:>10,}行" if stage.rows is not None else ""
+        lines.append(f"  {stage.name:<8} {stage.seconds:>9.3f}秒 {rows}")
+    lines.append(f"  {'total':<8} {stats.total_seconds:>9.3f}秒")
+    return "\n".join(lines)
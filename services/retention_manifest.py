@@ -0,0 +1,195 @@
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+MANIFEST_NAME = '.retention.jsonl'
+
+
+@dataclass
+class RetentionEntry:
+    """保持期間の管理対象のファイル
+
+    Attributes:
+        name: フォルダからの相対パス
+        created: 作成日時（UNIX時刻）
+        size: サイズ（バイト）
+    """
+    name: str
+    created: float
+    size: int
+
+
+def scan_files(directory: Path, patterns: Iterable[str]) -> dict[str, RetentionEntry]:
+    """パターンに一致するファイルを一覧にする（更新日時を作成日時とみなす）"""
+    entries = {}
+    for pattern in patterns:
+        for path in directory.glob(pattern):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            name = path.relative_to(directory).as_posix()
+            entries[name] = RetentionEntry(name, stat.st_mtime, stat.st_size)
+    return entries
+
+
+class RetentionManifest:
+    """フォルダに書き込んだファイルの作成日時とサイズを記録する追記専用の索引（JSON Lines）
+
+    保持期間・容量の上限を超えたファイルは索引のみから求めるため、フォルダの一覧の取得やファイルごとのstatを行わない。
+    アプリ以外で追加・削除されたファイルは、一定時間ごとの`reconcile`でフォルダを確認して反映する
+    """
+
+    def __init__(self, directory: Path, scan: Callable[[], dict[str, RetentionEntry]]) -> None:
+        self.directory: Path = Path(directory)
+        self.path: Path = self.directory / MANIFEST_NAME
+        self.scan: Callable[[], dict[str, RetentionEntry]] = scan
+        self._entries: dict[str, RetentionEntry] = {}
+        self._reconciled: Optional[float] = None
+        self._records: int = 0
+        self._load()
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def entries(self) -> list[RetentionEntry]:
+        """管理対象のファイルを作成日時の古い順に取得"""
+        return sorted(self._entries.values(), key=lambda entry: entry.created)
+
+    def add(self, path: Path, created: Optional[float] = None, size: Optional[int] = None) -> None:
+        """書き込んだファイルを記録
+
+        Args:
+            path: 書き込んだファイル（フォルダ内のパス）
+            created: 作成日時（省略時はファイルの更新日時）
+            size: サイズ（省略時はファイルのサイズ）
+        """
+        path = Path(path)
+        name = path.relative_to(self.directory).as_posix()
+        if created is None or size is None:
+            stat = path.stat()
+            created = stat.st_mtime if created is None else created
+            size = stat.st_size if size is None else size
+        entry = RetentionEntry(name, created, size)
+        self._entries[name] = entry
+        self._append({'op': 'add', 'name': name, 'created': entry.created, 'size': entry.size})
+
+    def needs_reconcile(self, interval_seconds: float) -> bool:
+        """前回フォルダを確認してから一定時間経ったか（確認したことがない場合もTrue）"""
+        return self._reconciled is None or time.time() - self._reconciled >= interval_seconds
+
+    def reconcile(self) -> tuple[int, int]:
+        """フォルダを確認して索引を実際のファイルに合わせ、索引を書き直す
+
+        Returns:
+            追加・削除した項目の数
+        """
+        actual = self.scan()
+        added = len(actual.keys() - self._entries.keys())
+        removed = len(self._entries.keys() - actual.keys())
+        self._entries = actual
+        self._reconciled = time.time()
+        self._rewrite()
+        return added, removed
+
+    def expire(self, older_than: float, max_bytes: Optional[int] = None) -> list[RetentionEntry]:
+        """保持期間を過ぎたファイルと、合計サイズが上限を超える分の古いファイルを削除
+
+        作成日時の古い順に確認し、保持期間内かつ上限以下になった時点で終了する
+
+        Args:
+            older_than: この日時（UNIX時刻）より前に作成したファイルを削除する
+            max_bytes: 合計サイズの上限（Noneの場合は制限しない）
+
+        Returns:
+            削除したファイル
+        """
+        total = self.total_size
+        expired = []
+        for entry in self.entries():
+            over_budget = max_bytes is not None and total > max_bytes
+            if entry.created >= older_than and not over_budget:
+                break
+            if self.remove(entry):
+                total -= entry.size
+                expired.append(entry)
+
+        # 削除の記録が増えたら索引を書き直す
+        if self._records > 2 * len(self._entries) + 100:
+            self._rewrite()
+        return expired
+
+    def remove(self, entry: RetentionEntry) -> bool:
+        """ファイルを削除して索引から除く
+
+        Args:
+            entry: 削除するファイル
+
+        Returns:
+            削除した（既に存在しない場合を含む）場合はTrue
+        """
+        try:
+            (self.directory / entry.name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"ファイル削除中にエラーが発生しました: {entry.name} - {str(e)}")
+            return False
+        del self._entries[entry.name]
+        self._append({'op': 'remove', 'name': entry.name})
+        return True
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+
+        for line in lines:
+            try:
+                record = json.loads(line)
+                op = record['op']
+                if op == 'add':
+                    self._entries[record['name']] = RetentionEntry(
+                        record['name'], record['created'], record['size'])
+                elif op == 'remove':
+                    self._entries.pop(record['name'], None)
+                elif op == 'reconcile':
+                    self._reconciled = record['time']
+            except (ValueError, KeyError, TypeError):
+                # 書き込み途中の行は無視する
+                continue
+            self._records += 1
+
+    def _append(self, record: dict) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._records += 1
+        except OSError as e:
+            print(f"保持期間の索引に記録できません: {str(e)}")
+
+    def _rewrite(self) -> None:
+        """現在の項目のみで索引を書き直す（一時ファイルから置き換える）"""
+        records = [{'op': 'add', 'name': entry.name, 'created': entry.created, 'size': entry.size}
+                   for entry in self.entries()]
+        if self._reconciled is not None:
+            records.append({'op': 'reconcile', 'time': self._reconciled})
+        temp_path = self.path.with_name(self.path.name + '.tmp')
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self._records = len(records)
+        except OSError as e:
+            print(f"保持期間の索引を書き直せません: {str(e)}")
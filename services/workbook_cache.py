@@ -0,0 +1,131 @@
+import os
+import threading
+import zipfile
+from dataclasses import dataclass
+from typing import Optional
+
+from openpyxl.workbook.workbook import Workbook
+
+from services.dedup_index import WorkbookSignature
+
+# 読み込んだブックのセル1つあたりのおおよそのメモリ使用量（バイト）
+CELL_BYTES = 400
+
+
+@dataclass
+class _CachedWorkbook:
+    path: str
+    signature: WorkbookSignature
+    workbook: Workbook
+
+
+class WorkbookCache:
+    """保存したExcelブックを同じセッション内の次の取り込みで再利用するキャッシュ
+
+    保持するブックは1つのみ。パス・ファイルサイズ・更新時刻・ワークシートのチェックサムが
+    保存時と一致する場合のみ再利用し、一定時間使われなければ解放する
+    """
+
+    def __init__(self) -> None:
+        self.idle_seconds: float = 300.0
+        self.max_bytes: int = 512 * 1024 * 1024
+        self._entry: Optional[_CachedWorkbook] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    def configure(self, idle_seconds: float, max_memory_mb: int) -> None:
+        """解放までの待機秒数と保持するブックの最大メモリ使用量（MB）を設定"""
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_memory_mb * 1024 * 1024
+
+    def take(self, excel_path: str) -> Optional[Workbook]:
+        """保存時から変更されていないブックを取り出す（取り出したブックはキャッシュから除く）
+
+        Args:
+            excel_path: Excelファイルのパス
+
+        Returns:
+            再利用できるブック。ない場合や保存後に変更された場合はNone
+        """
+        with self._lock:
+            entry = self._entry
+            self._entry = None
+            self._cancel_timer()
+        if entry is None:
+            return None
+
+        try:
+            if (entry.path == os.path.abspath(excel_path)
+                    and entry.signature == WorkbookSignature.from_file(excel_path)):
+                return entry.workbook
+        except (OSError, zipfile.BadZipFile):
+            pass
+        close_workbook(entry.workbook)
+        return None
+
+    def put(self, excel_path: str, workbook: Workbook) -> bool:
+        """保存直後のブックを保持する（大きすぎる場合は保持せずに閉じる）
+
+        Args:
+            excel_path: 保存したExcelファイルのパス
+            workbook: 保存したブック
+
+        Returns:
+            保持した場合はTrue
+        """
+        try:
+            if estimate_workbook_bytes(workbook) > self.max_bytes:
+                raise MemoryError
+            signature = WorkbookSignature.from_file(excel_path)
+        except (OSError, zipfile.BadZipFile, MemoryError):
+            close_workbook(workbook)
+            return False
+
+        entry = _CachedWorkbook(os.path.abspath(excel_path), signature, workbook)
+        with self._lock:
+            previous, self._entry = self._entry, entry
+            self._cancel_timer()
+            self._timer = threading.Timer(self.idle_seconds, self._expire, args=(entry,))
+            self._timer.daemon = True
+            self._timer.start()
+        if previous is not None:
+            close_workbook(previous.workbook)
+        return True
+
+    def clear(self) -> None:
+        """保持しているブックを解放"""
+        with self._lock:
+            entry, self._entry = self._entry, None
+            self._cancel_timer()
+        if entry is not None:
+            close_workbook(entry.workbook)
+
+    def _expire(self, entry: _CachedWorkbook) -> None:
+        # 待機中に取り出された・入れ替わった場合は何もしない
+        with self._lock:
+            if self._entry is not entry:
+                return
+            self._entry = None
+            self._timer = None
+        close_workbook(entry.workbook)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def estimate_workbook_bytes(workbook: Workbook) -> int:
+    """ブックのおおよそのメモリ使用量（使用範囲のセル数から推定）"""
+    return sum(ws.max_row * ws.max_column for ws in workbook.worksheets) * CELL_BYTES
+
+
+def close_workbook(workbook: Workbook) -> None:
+    """ブックとkeep_vbaで読み込んだマクロ部分を閉じる"""
+    workbook.close()
+    if workbook.vba_archive is not None:
+        workbook.vba_archive.close()
+
+
+# 取り込みで共有するキャッシュ
+workbook_cache = WorkbookCache()
@@ -0,0 +1,286 @@
+import datetime
+import posixpath
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import IO, Iterator, Optional
+from xml.etree import ElementTree
+
+import polars as pl
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+from services.csv_schema import PAPYRUS_SCHEMA
+from services.dedup_index import RowKey
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+VALUE_TAG = f'{MAIN_NS}v'
+TEXT_TAG = f'{MAIN_NS}t'
+RUN_TAG = f'{MAIN_NS}r'
+INLINE_STRING_TAG = f'{MAIN_NS}is'
+FORMULA_TAG = f'{MAIN_NS}f'
+
+WORKSHEET_START = re.compile(rb'<((?:[\w.-]+:)?worksheet)\b[^>]*>')
+SHEET_DATA_START = re.compile(rb'<((?:[\w.-]+:)?)sheetData\b[^>]*?(/?)>')
+READ_CHUNK_SIZE = 1024 * 1024
+DIGITS = '0123456789'
+
+# Excelに転記するA～F列（CSVの取り込み列と同じ順）
+KEY_COLUMNS = PAPYRUS_SCHEMA.names
+KEY_COLUMN_NUMBERS = {chr(ord('A') + i): i + 1 for i in range(len(KEY_COLUMNS))}
+KEY_SCHEMA = {name: pl.String for name in KEY_COLUMNS}
+
+
+@dataclass
+class SheetKeys:
+    """ワークシートから読み込んだ既存データ
+
+    Attributes:
+        frame: 2行目以降のA～F列（重複チェック用のキー形式の文字列）
+        last_row: 最後のデータ行番号（見出し行を含む。空のシートは0）
+    """
+    frame: pl.DataFrame
+    last_row: int
+
+    def key_set(self) -> set[RowKey]:
+        return set(self.frame.iter_rows())
+
+
+def read_key_columns(excel_path: str) -> SheetKeys:
+    """Excelファイルのアクティブシートから既存データのA～F列を読み込む
+
+    openpyxlでブック全体を読み込まず、zip内のワークシートのXMLを順に解析する。
+    共有文字列と日付のシリアル値を解決し、get_last_rowと同様に値のある最後の行までを対象とする
+
+    Args:
+        excel_path: Excelファイルのパス
+
+    Returns:
+        A～F列をキー形式の文字列にしたDataFrameと最終行
+    """
+    with zipfile.ZipFile(excel_path) as zf:
+        sheet_path, epoch = active_sheet(zf)
+        shared_strings = _read_shared_strings(zf)
+        date_styles = _read_date_styles(zf)
+
+        columns: list[list[str]] = [[] for _ in KEY_COLUMNS]
+        last_row = 0
+        with zf.open(sheet_path) as stream:
+            for row_number, values in _iter_rows(stream, shared_strings, date_styles, epoch):
+                if values is None:
+                    continue
+                if row_number > 1:  # 1行目は見出し行
+                    # 途中の空行は空のキーとして扱う
+                    blank_rows = row_number - max(last_row, 1) - 1
+                    for column, value in zip(columns, values):
+                        column.extend([''] * blank_rows)
+                        column.append(value)
+                last_row = row_number
+
+    frame = pl.DataFrame({name: column for name, column in zip(KEY_COLUMNS, columns)},
+                         schema=KEY_SCHEMA)
+    return SheetKeys(frame, last_row)
+
+
+def active_sheet(zf: zipfile.ZipFile) -> tuple[str, datetime.datetime]:
+    """アクティブシートのzip内のパスと日付の基準日を取得"""
+    workbook = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target', '') for rel in rels.iter(f'{PKG_REL_NS}Relationship')}
+
+    view = workbook.find(f'{MAIN_NS}bookViews/{MAIN_NS}workbookView')
+    active_tab = int(view.get('activeTab', 0)) if view is not None else 0
+    sheets = workbook.findall(f'{MAIN_NS}sheets/{MAIN_NS}sheet')
+    sheet = sheets[active_tab] if active_tab < len(sheets) else sheets[0]
+
+    target = targets[sheet.get(f'{REL_NS}id')]
+    if target.startswith('/'):
+        sheet_path = target.lstrip('/')
+    else:
+        sheet_path = posixpath.normpath(posixpath.join('xl', target))
+
+    properties = workbook.find(f'{MAIN_NS}workbookPr')
+    date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+    return sheet_path, CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+
+
+def _read_shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    """共有文字列を読み込む（ふりがな（rPh）は除く）"""
+    try:
+        stream = zf.open('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+
+    strings = []
+    with stream:
+        for _, elem in ElementTree.iterparse(stream):
+            if elem.tag == f'{MAIN_NS}si':
+                strings.append(_string_item_text(elem))
+                elem.clear()
+    return strings
+
+
+def _string_item_text(elem: ElementTree.Element) -> str:
+    """文字列要素（si・is）のテキストを取得。書式付きの場合は各部分を連結"""
+    parts = []
+    for child in elem:
+        if child.tag == TEXT_TAG:
+            parts.append(child.text or '')
+        elif child.tag == RUN_TAG:
+            text = child.find(TEXT_TAG)
+            if text is not None:
+                parts.append(text.text or '')
+    return ''.join(parts)
+
+
+def _read_date_styles(zf: zipfile.ZipFile) -> set[int]:
+    """日付の表示形式が設定されたセルスタイルの番号を取得"""
+    try:
+        styles = ElementTree.fromstring(zf.read('xl/styles.xml'))
+    except KeyError:
+        return set()
+
+    formats = dict(BUILTIN_FORMATS)
+    num_fmts = styles.find(f'{MAIN_NS}numFmts')
+    if num_fmts is not None:
+        for num_fmt in num_fmts:
+            formats[int(num_fmt.get('numFmtId', 0))] = num_fmt.get('formatCode', '')
+
+    date_styles = set()
+    cell_xfs = styles.find(f'{MAIN_NS}cellXfs')
+    if cell_xfs is not None:
+        for i, xf in enumerate(cell_xfs):
+            if is_date_format(formats.get(int(xf.get('numFmtId', 0)), '')):
+                date_styles.add(i)
+    return date_styles
+
+
+def _iter_rows(stream: IO[bytes], shared_strings: list[str], date_styles: set[int],
+               epoch: datetime.datetime) -> Iterator[tuple[int, Optional[list[str]]]]:
+    """ワークシートの行番号とA～F列のキー形式の値を順に返す。値のない行はNone"""
+    converter = _CellConverter(shared_strings, date_styles, epoch)
+    row_number = 0
+    for row in _iter_row_elements(stream):
+        row_number = int(row.get('r') or row_number + 1)
+        keys = [''] * len(KEY_COLUMNS)
+        has_value = False
+        column = 0
+        for cell in row:
+            column = _column_index(cell.get('r'), column + 1)
+            value = converter.key(cell, column == 1)
+            if value is None:
+                continue
+            has_value = True
+            if column <= len(KEY_COLUMNS):
+                keys[column - 1] = value
+        yield row_number, keys if has_value else None
+
+
+def _iter_row_elements(stream: IO[bytes]) -> Iterator[ElementTree.Element]:
+    """ワークシートのrow要素を順に返す
+
+    行の終わりで区切った一定サイズの断片ごとにまとめて解析し、
+    要素ごとのイベント処理を行わずにメモリ使用量を断片の大きさに抑える
+    """
+    buffer = stream.read(READ_CHUNK_SIZE)
+    root = WORKSHEET_START.search(buffer)
+    sheet_data = SHEET_DATA_START.search(buffer)
+    if root is None or sheet_data is None:
+        raise ValueError("ワークシートのXMLにsheetDataが見つかりません")
+    if sheet_data.group(2):
+        return  # 空のシート（<sheetData/>）
+
+    # 断片をルート要素で囲み、名前空間の宣言を引き継いで解析する
+    root_start = buffer[:root.end()]
+    root_end = b'</' + root.group(1) + b'>'
+    row_end = b'</' + sheet_data.group(1) + b'row>'
+
+    pending = buffer[sheet_data.end():]
+    while True:
+        cut = pending.rfind(row_end)
+        if cut >= 0:
+            cut += len(row_end)
+            yield from ElementTree.fromstring(root_start + pending[:cut] + root_end)
+            pending = pending[cut:]
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        pending += chunk
+
+
+def _column_index(reference: Optional[str], default: int) -> int:
+    """セル参照（例: AB12）から列番号（1始まり）を取得"""
+    if not reference:
+        return default
+    letters = reference.rstrip(DIGITS)
+    index = KEY_COLUMN_NUMBERS.get(letters)
+    if index is not None:
+        return index
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char.upper()) - 64
+    return index
+
+
+class _CellConverter:
+    """セルの値を_read_existing_keysと同じキー形式の文字列に変換
+
+    値のないセルはNone。日付は預り日（A列）のみYYYYMMDD形式とし、変換結果を再利用する
+    """
+
+    def __init__(self, shared_strings: list[str], date_styles: set[int],
+                 epoch: datetime.datetime) -> None:
+        self.shared_strings: list[str] = shared_strings
+        self.date_styles: set[int] = date_styles
+        self.epoch: datetime.datetime = epoch
+        self._dates: dict[tuple[str, bool], str] = {}
+
+    def key(self, cell: ElementTree.Element, date_column: bool) -> Optional[str]:
+        formula = cell.find(FORMULA_TAG)
+        if formula is not None:
+            # openpyxlと同様に数式は計算結果ではなく数式の文字列とする
+            if formula.get('t', 'normal') != 'normal' or not formula.text:
+                raise ValueError("共有数式・配列数式を含むセルは読み込めません")
+            return '=' + formula.text
+
+        data_type = cell.get('t')
+        if data_type == 'inlineStr':
+            inline = cell.find(INLINE_STRING_TAG)
+            return _string_item_text(inline) if inline is not None else None
+
+        value_elem = cell.find(VALUE_TAG)
+        if value_elem is None or value_elem.text is None:
+            return None
+        text = value_elem.text
+
+        if data_type == 's':
+            return self.shared_strings[int(text)]
+        if data_type is None or data_type == 'n':
+            if int(cell.get('s') or 0) in self.date_styles:
+                return self._date_key(text, date_column, numeric=True)
+            number = float(text) if any(c in text for c in '.eE') else int(text)
+            return str(number or '')
+        if data_type == 'b':
+            return 'True' if text == '1' else ''
+        if data_type == 'd':
+            return self._date_key(text, date_column, numeric=False)
+        return text  # str（数式の文字列）・e（エラー値）
+
+    def _date_key(self, text: str, date_column: bool, numeric: bool) -> str:
+        cache_key = (text, date_column)
+        key = self._dates.get(cache_key)
+        if key is None:
+            if numeric:
+                number = float(text) if any(c in text for c in '.eE') else int(text)
+                value = from_excel(number, self.epoch)
+            else:
+                value = datetime.datetime.fromisoformat(text)
+            if date_column and isinstance(value, datetime.datetime):
+                key = value.strftime('%Y%m%d')
+            else:
+                key = str(value or '')
+            self._dates[cache_key] = key
+        return key
@@ -0,0 +1,408 @@
+import datetime
+import re
+import shutil
+import struct
+import zipfile
+from typing import IO, Any, Optional, Sequence
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape, quoteattr
+
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.compat import safe_string
+from openpyxl.styles import Alignment
+from openpyxl.styles.numbers import BUILTIN_FORMATS_REVERSE
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.datetime import to_excel
+from openpyxl.utils.exceptions import IllegalCharacterError
+
+from services.atomic_save import atomic_write
+from services.workbook_reader import MAIN_NS, READ_CHUNK_SIZE, SHEET_DATA_START, active_sheet
+
+STYLES_PATH = 'xl/styles.xml'
+SHARED_STRINGS_PATH = 'xl/sharedStrings.xml'
+
+ROW_START = re.compile(rb'<(?:[\w.-]+:)?row\b[^>]*?\sr="(\d+)"')
+SHEET_DATA_END = re.compile(rb'</(?:[\w.-]+:)?sheetData>')
+DIMENSION = re.compile(rb'(<(?:[\w.-]+:)?dimension\b[^>]*?\sref=")([^"]*)(")')
+SST_START = re.compile(rb'<((?:[\w.-]+:)?)sst\b[^>]*>')
+SST_END = re.compile(rb'</(?:[\w.-]+:)?sst>')
+STRING_ITEM = re.compile(rb'<(?:[\w.-]+:)?si[\s>/]')
+STYLE_SHEET_START = re.compile(r'<((?:[\w.-]+:)?)styleSheet\b[^>]*>')
+CELL_REFERENCE = re.compile(r'([A-Z]+)(\d+)')
+
+# 終了タグが断片の境界で分かれないように、書き出さずに残すバイト数
+TAIL_SIZE = 256
+# zipのローカルヘッダー（固定長部分）のサイズと先頭のシグネチャ
+LOCAL_HEADER_SIZE = 30
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+FIRST_CUSTOM_FORMAT_ID = 164
+
+# 追記するセル（値、表示形式、配置）
+PatchCell = tuple[Any, Optional[str], Optional[Alignment]]
+
+
+class WorkbookPatchError(ValueError):
+    """zip内のXMLを直接書き換えて追記できないExcelファイルの場合のエラー"""
+
+
+class XlsmPatcher:
+    """Excelファイル（.xlsm）のzipを直接書き換えてアクティブシートに行を追記
+
+    openpyxlでブック全体を読み込み・保存せず、アクティブシートのXMLの末尾に行を追加し、
+    寸法（dimension）・共有文字列・スタイルのみを更新する。
+    それ以外の部品（vbaProject.binを含む）は内容を変更せずにコピーする
+    """
+
+    def __init__(self, excel_path: str) -> None:
+        self.excel_path: str = excel_path
+        with zipfile.ZipFile(excel_path) as zf:
+            self.sheet_path, self.epoch = active_sheet(zf)
+            names = set(zf.namelist())
+            if STYLES_PATH not in names:
+                raise WorkbookPatchError("スタイル（styles.xml）がありません")
+            self._styles = zf.read(STYLES_PATH).decode('utf-8')
+            self._string_count = self._count_shared_strings(zf) if SHARED_STRINGS_PATH in names else None
+
+        styles = ElementTree.fromstring(self._styles)
+        self._formats: dict[str, int] = dict(BUILTIN_FORMATS_REVERSE)
+        num_fmts = styles.find(f'{MAIN_NS}numFmts')
+        self._custom_format_ids: list[int] = []
+        for num_fmt in num_fmts if num_fmts is not None else []:
+            format_id = int(num_fmt.get('numFmtId', 0))
+            self._formats[num_fmt.get('formatCode', '')] = format_id
+            self._custom_format_ids.append(format_id)
+        cell_xfs = styles.find(f'{MAIN_NS}cellXfs')
+        if cell_xfs is None:
+            raise WorkbookPatchError("セルのスタイル（cellXfs）がありません")
+        self._xf_count = len(cell_xfs)
+        self._style_ids: dict[tuple[int, tuple[tuple[str, str], ...]], int] = {}
+        for i, xf in enumerate(cell_xfs):
+            key = _plain_xf_key(xf)
+            if key is not None:
+                self._style_ids.setdefault(key, i)
+
+        self._new_formats: list[tuple[int, str]] = []
+        self._new_xfs: list[tuple[int, tuple[tuple[str, str], ...]]] = []
+        self._strings: dict[str, int] = {}
+        self._string_refs = 0
+        self._rows: list[bytes] = []
+        self._prefix = ''
+        self._dimension: Optional[str] = None
+        self.start_row: Optional[int] = None
+        self.end_row: Optional[int] = None
+
+    def prepare(self, start_row: int) -> None:
+        """追記を始める行を設定し、その行以降に既存の行がないことを確認
+
+        Raises:
+            WorkbookPatchError: 追記先に行（書式のみの行を含む）がある場合・XMLを解釈できない場合
+        """
+        last_row = 0
+        with zipfile.ZipFile(self.excel_path) as zf, zf.open(self.sheet_path) as stream:
+            head = stream.read(READ_CHUNK_SIZE)
+            sheet_data = SHEET_DATA_START.search(head)
+            if sheet_data is None:
+                raise WorkbookPatchError("ワークシートのXMLにsheetDataが見つかりません")
+            self._prefix = sheet_data.group(1).decode('utf-8')
+            dimension = DIMENSION.search(head)
+            self._dimension = dimension.group(2).decode('utf-8') if dimension else None
+
+            pending = head[sheet_data.end():]
+            while True:
+                cut = pending.rfind(b'>') + 1
+                for match in ROW_START.finditer(pending, 0, cut):
+                    last_row = int(match.group(1))
+                pending = pending[cut:]
+                chunk = stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                pending += chunk
+
+        if last_row >= start_row:
+            raise WorkbookPatchError(f"{start_row}行目以降に既存の行（{last_row}行目）があります")
+        self.start_row = start_row
+        self.end_row = start_row - 1
+
+    def write_row(self, cells: Sequence[PatchCell]) -> None:
+        """次の行にA列から順にセルを追加"""
+        if self.end_row is None:
+            raise RuntimeError("prepareを呼び出してから行を追加してください")
+        row_number = self.end_row + 1
+        prefix = self._prefix
+        parts = [f'<{prefix}row r="{row_number}">']
+        for column, (value, number_format, alignment) in enumerate(cells, 1):
+            style_id = self._style_id(number_format, alignment)
+            attributes = f'r="{get_column_letter(column)}{row_number}"'
+            if style_id:
+                attributes += f' s="{style_id}"'
+            parts.append(self._cell_xml(prefix, attributes, value))
+        parts.append(f'</{prefix}row>')
+        self._rows.append(''.join(parts).encode('utf-8'))
+        self.end_row = row_number
+
+    def save(self) -> None:
+        """変更した部品のみを書き換えたzipを一時ファイルに作成し、元のファイルと置き換える"""
+        with atomic_write(self.excel_path) as temp_path:
+            with zipfile.ZipFile(self.excel_path) as src, zipfile.ZipFile(temp_path, 'w') as dst:
+                for info in src.infolist():
+                    if info.filename == self.sheet_path:
+                        self._write_sheet(src, dst, info)
+                    elif info.filename == SHARED_STRINGS_PATH and self._strings:
+                        self._write_shared_strings(src, dst, info)
+                    elif info.filename == STYLES_PATH and self._new_xfs:
+                        dst.writestr(_copy_info(info), self._patched_styles())
+                    else:
+                        _copy_raw(src, dst, info)
+
+    def _cell_xml(self, prefix: str, attributes: str, value: Any) -> str:
+        """セルの値をopenpyxlと同じ形式のc要素に変換"""
+        if value is None or value == '':
+            return f'<{prefix}c {attributes}/>'
+        if isinstance(value, bool):
+            return f'<{prefix}c {attributes} t="b"><{prefix}v>{int(value)}</{prefix}v></{prefix}c>'
+        if isinstance(value, (datetime.datetime, datetime.date)):
+            value = to_excel(value, self.epoch)
+        if isinstance(value, (int, float)):
+            return f'<{prefix}c {attributes} t="n"><{prefix}v>{safe_string(value)}</{prefix}v></{prefix}c>'
+
+        text = str(value)
+        if ILLEGAL_CHARACTERS_RE.search(text):
+            raise IllegalCharacterError(f"{text} cannot be used in worksheets.")
+        if text.startswith('=') and len(text) > 1:
+            return f'<{prefix}c {attributes}><{prefix}f>{escape(text[1:])}</{prefix}f><{prefix}v></{prefix}v></{prefix}c>'
+        if self._string_count is None:
+            return (f'<{prefix}c {attributes} t="inlineStr"><{prefix}is>'
+                    f'{_text_xml(prefix, text)}</{prefix}is></{prefix}c>')
+        index = self._strings.get(text)
+        if index is None:
+            index = self._string_count + len(self._strings)
+            self._strings[text] = index
+        self._string_refs += 1
+        return f'<{prefix}c {attributes} t="s"><{prefix}v>{index}</{prefix}v></{prefix}c>'
+
+    def _style_id(self, number_format: Optional[str], alignment: Optional[Alignment]) -> int:
+        """表示形式と配置に対応するセルのスタイル番号を取得。ない場合は追加する"""
+        format_id = self._format_id(number_format or 'General')
+        alignment_items = tuple(sorted(alignment.to_tree().attrib.items())) if alignment else ()
+        key = (format_id, alignment_items)
+        style_id = self._style_ids.get(key)
+        if style_id is None:
+            style_id = self._xf_count + len(self._new_xfs)
+            self._new_xfs.append(key)
+            self._style_ids[key] = style_id
+        return style_id
+
+    def _format_id(self, number_format: str) -> int:
+        format_id = self._formats.get(number_format)
+        if format_id is None:
+            format_id = max([FIRST_CUSTOM_FORMAT_ID - 1, *self._custom_format_ids]) + 1
+            self._custom_format_ids.append(format_id)
+            self._formats[number_format] = format_id
+            self._new_formats.append((format_id, number_format))
+        return format_id
+
+    def _write_sheet(self, src: zipfile.ZipFile, dst: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+        """ワークシートのXMLのsheetDataの末尾に追加した行を挿入し、寸法を更新"""
+        rows = b''.join(self._rows)
+        with src.open(info) as stream, dst.open(_copy_info(info), 'w') as target:
+            head = stream.read(READ_CHUNK_SIZE)
+            if self._dimension is not None and self.end_row is not None:
+                dimension = _extend_dimension(self._dimension, self.end_row).encode('utf-8')
+                head = DIMENSION.sub(lambda m: m.group(1) + dimension + m.group(3), head, count=1)
+
+            sheet_data = SHEET_DATA_START.search(head)
+            if sheet_data is None:
+                raise WorkbookPatchError("ワークシートのXMLにsheetDataが見つかりません")
+            if sheet_data.group(2):
+                # 空のシート（<sheetData/>）は開始・終了タグに分けて行を入れる
+                prefix = sheet_data.group(1)
+                target.write(head[:sheet_data.start()])
+                target.write(b'<' + prefix + b'sheetData>' + rows + b'</' + prefix + b'sheetData>')
+                target.write(head[sheet_data.end():])
+                shutil.copyfileobj(stream, target, READ_CHUNK_SIZE)
+                return
+            _insert_before(stream, target, head, SHEET_DATA_END, rows)
+
+    def _write_shared_strings(self, src: zipfile.ZipFile, dst: zipfile.ZipFile,
+                              info: zipfile.ZipInfo) -> None:
+        """共有文字列の末尾に追加した文字列を挿入し、件数を更新"""
+        with src.open(info) as stream, dst.open(_copy_info(info), 'w') as target:
+            head = stream.read(READ_CHUNK_SIZE)
+            start = SST_START.search(head)
+            if start is None:
+                raise WorkbookPatchError("共有文字列のXMLにsstが見つかりません")
+            prefix = start.group(1).decode('utf-8')
+            tag = start.group(0).decode('utf-8')
+            tag = _add_to_attribute(tag, 'count', self._string_refs)
+            tag = _add_to_attribute(tag, 'uniqueCount', len(self._strings))
+            head = head[:start.start()] + tag.encode('utf-8') + head[start.end():]
+
+            items = ''.join(f'<{prefix}si>{_text_xml(prefix, text)}</{prefix}si>' for text in self._strings)
+            _insert_before(stream, target, head, SST_END, items.encode('utf-8'))
+
+    def _patched_styles(self) -> str:
+        """追加した表示形式・セルのスタイルをstyles.xmlに挿入"""
+        styles = self._styles
+        start = STYLE_SHEET_START.search(styles)
+        if start is None:
+            raise WorkbookPatchError("スタイルのXMLにstyleSheetが見つかりません")
+        prefix = start.group(1)
+
+        if self._new_formats:
+            formats = [f'<{prefix}numFmt numFmtId="{format_id}" formatCode={quoteattr(code)}/>'
+                       for format_id, code in self._new_formats]
+            styles = _append_children(styles, prefix, 'numFmts', formats,
+                                      len(self._custom_format_ids), start.end())
+        xfs = []
+        for format_id, alignment_items in self._new_xfs:
+            xf = f'<{prefix}xf numFmtId="{format_id}" fontId="0" fillId="0" borderId="0" xfId="0"'
+            if format_id:
+                xf += ' applyNumberFormat="1"'
+            if alignment_items:
+                attributes = ' '.join(f'{name}={quoteattr(value)}' for name, value in alignment_items)
+                xf += f' applyAlignment="1"><{prefix}alignment {attributes}/></{prefix}xf>'
+            else:
+                xf += '/>'
+            xfs.append(xf)
+        return _append_children(styles, prefix, 'cellXfs', xfs, self._xf_count + len(xfs), None)
+
+    @staticmethod
+    def _count_shared_strings(zf: zipfile.ZipFile) -> int:
+        """既存の共有文字列の件数を取得（uniqueCountがない場合は要素を数える）"""
+        with zf.open(SHARED_STRINGS_PATH) as stream:
+            head = stream.read(READ_CHUNK_SIZE)
+            start = SST_START.search(head)
+            if start is None:
+                raise WorkbookPatchError("共有文字列のXMLにsstが見つかりません")
+            unique_count = re.search(rb'\suniqueCount="(\d+)"', start.group(0))
+            if unique_count:
+                return int(unique_count.group(1))
+
+            count = 0
+            pending = head[start.end():]
+            while True:
+                cut = pending.rfind(b'>') + 1
+                count += len(STRING_ITEM.findall(pending, 0, cut))
+                pending = pending[cut:]
+                chunk = stream.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return count
+                pending += chunk
+
+
+def _plain_xf_key(xf: ElementTree.Element) -> Optional[tuple[int, tuple[tuple[str, str], ...]]]:
+    """フォント・塗りつぶし・罫線が既定のセルのスタイルを表示形式と配置で識別するキー"""
+    if any(xf.get(name, '0') != '0' for name in ('fontId', 'fillId', 'borderId', 'xfId', 'quotePrefix')):
+        return None
+    if xf.find(f'{MAIN_NS}protection') is not None:
+        return None
+    alignment = xf.find(f'{MAIN_NS}alignment')
+    alignment_items = tuple(sorted(alignment.attrib.items())) if alignment is not None else ()
+    return int(xf.get('numFmtId', 0)), alignment_items
+
+
+def _text_xml(prefix: str, text: str) -> str:
+    """文字列のt要素（前後の空白は保持）"""
+    preserve = ' xml:space="preserve"' if text != text.strip() else ''
+    return f'<{prefix}t{preserve}>{escape(text)}</{prefix}t>'
+
+
+def _extend_dimension(reference: str, end_row: int) -> str:
+    """寸法（例: A1:F100）の最終行を追記した行まで広げる。列はF列以上とする"""
+    cells = reference.split(':')
+    first = CELL_REFERENCE.fullmatch(cells[0])
+    last = CELL_REFERENCE.fullmatch(cells[-1])
+    if first is None or last is None:
+        return reference
+    column = max(last.group(1), 'F', key=lambda letters: (len(letters), letters))
+    return f"{cells[0]}:{column}{max(int(last.group(2)), end_row)}"
+
+
+def _add_to_attribute(tag: str, name: str, increment: int) -> str:
+    """開始タグの数値の属性に加算（属性がない場合はそのまま）"""
+    return re.sub(rf'(\s{name}=")(\d+)(")',
+                  lambda m: f'{m.group(1)}{int(m.group(2)) + increment}{m.group(3)}', tag, count=1)
+
+
+def _append_children(xml: str, prefix: str, tag: str, children: list[str], count: int,
+                     insert_at: Optional[int]) -> str:
+    """親要素の末尾に子要素を追加してcount属性を更新。親要素がない場合はinsert_atに作成"""
+    start = re.search(rf'<{re.escape(prefix)}{tag}\b([^>]*?)(/?)>', xml)
+    content = ''.join(children)
+    if start is None:
+        if insert_at is None:
+            raise WorkbookPatchError(f"スタイルのXMLに{tag}が見つかりません")
+        return f'{xml[:insert_at]}<{prefix}{tag} count="{count}">{content}</{prefix}{tag}>{xml[insert_at:]}'
+
+    attributes = re.sub(r'\scount="\d+"', '', start.group(1))
+    open_tag = f'<{prefix}{tag}{attributes} count="{count}">'
+    if start.group(2):
+        return f'{xml[:start.start()]}{open_tag}{content}</{prefix}{tag}>{xml[start.end():]}'
+    end = xml.index(f'</{prefix}{tag}>', start.end())
+    return f'{xml[:start.start()]}{open_tag}{xml[start.end():end]}{content}{xml[end:]}'
+
+
+def _insert_before(stream: IO[bytes], target: IO[bytes], head: bytes, end_tag: re.Pattern[bytes],
+                   content: bytes) -> None:
+    """XMLを順に書き出し、終了タグの直前に内容を挿入"""
+    pending = head
+    while True:
+        end = end_tag.search(pending)
+        if end is not None:
+            target.write(pending[:end.start()])
+            target.write(content)
+            target.write(pending[end.start():])
+            shutil.copyfileobj(stream, target, READ_CHUNK_SIZE)
+            return
+        keep = len(pending) - TAIL_SIZE
+        if keep > 0:
+            target.write(pending[:keep])
+            pending = pending[keep:]
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            raise WorkbookPatchError("XMLの終了タグが見つかりません")
+        pending += chunk
+
+
+def _copy_raw(src: zipfile.ZipFile, dst: zipfile.ZipFile, info: zipfile.ZipInfo) -> None:
+    """変更しない部品を展開・再圧縮せずに、圧縮済みのデータのままコピーする"""
+    source, target = src.fp, dst.fp
+    if source is None or target is None:
+        raise WorkbookPatchError("zipファイルが閉じられています")
+
+    # ローカルヘッダーのファイル名・拡張フィールドの長さからデータの開始位置を求める
+    source.seek(info.header_offset)
+    header = source.read(LOCAL_HEADER_SIZE)
+    if len(header) != LOCAL_HEADER_SIZE or header[:4] != LOCAL_HEADER_SIGNATURE:
+        raise WorkbookPatchError(f"zipのエントリを読み込めません: {info.filename}")
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    source.seek(info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length)
+
+    copied = _copy_info(info)
+    copied.CRC = info.CRC
+    copied.compress_size = info.compress_size
+    # サイズとCRCはローカルヘッダーに書くため、データ記述子は使用しない
+    copied.flag_bits = info.flag_bits & ~0x08
+    copied.header_offset = target.tell()
+    target.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = source.read(min(READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise WorkbookPatchError(f"zipのエントリが途中で終わっています: {info.filename}")
+        target.write(chunk)
+        remaining -= len(chunk)
+    dst.filelist.append(copied)
+    dst.NameToInfo[copied.filename] = copied
+    dst.start_dir = target.tell()
+
+
+def _copy_info(info: zipfile.ZipInfo) -> zipfile.ZipInfo:
+    """元のzipのエントリと同じ名前・日時・圧縮方式のエントリ情報を作成"""
+    copied = zipfile.ZipInfo(info.filename, info.date_time)
+    copied.compress_type = info.compress_type
+    copied.external_attr = info.external_attr
+    copied.create_system = info.create_system
+    copied.comment = info.comment
+    copied.file_size = info.file_size
+    return copied
@@ -0,0 +1,64 @@
+import zipfile
+from pathlib import Path
+
+import openpyxl
+import polars as pl
+import pytest
+
+from services.workbook_cache import workbook_cache
+from services.workbook_reader import KEY_COLUMNS
+
+VBA_PROJECT = b'\xd0\xcf\x11\xe0' + bytes(range(256)) * 4
+
+
+def create_test_workbook(path, rows):
+    """ヘッダーと指定した行を持つテスト用のExcelファイルを作成"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(["預り日", "患者ID", "患者名", "文書名", "診療科", "医師名"])
+    for row in rows:
+        ws.append(list(row))
+    wb.save(path)
+    return str(path)
+
+
+def read_test_workbook(path):
+    """テスト用のExcelファイルのデータ行を取得"""
+    wb = openpyxl.load_workbook(path)
+    rows = [row for row in wb.active.iter_rows(min_row=2, values_only=True)]
+    wb.close()
+    return rows
+
+
+def add_vba_project(path):
+    """マクロ（vbaProject.bin）を含むExcelファイルにする"""
+    with zipfile.ZipFile(path, 'a') as zf:
+        zf.writestr('xl/vbaProject.bin', VBA_PROJECT)
+    return path
+
+
+def write_papyrus_csv(path, encoding='shift-jis', doc_name='診断 書*'):
+    """Papyrus出力形式（先頭3行の前置き＋ヘッダー）のテスト用CSVを作成"""
+    lines = [
+        'Papyrus書類受付リスト',
+        '出力日時,2025/01/01',
+        '',
+        '職員ID,受付番号,区分,預り日,患者ID,患者名,文書名,診療科,備考,医師名,状態',
+        f'001,1,受付,20250101,1001,山田太郎,{doc_name},内科,備考,田中 医師,済',
+        f'001,2,受付,20250102,1002,鈴木花子,{doc_name},外科,備考,佐藤 医師,済',
+    ]
+    Path(path).write_bytes(('\r\n'.join(lines) + '\r\n').encode(encoding))
+    return str(path)
+
+
+def make_df(rows):
+    """取り込む行（A～F列の文字列）のデータフレームを作成"""
+    return pl.DataFrame(rows, schema=KEY_COLUMNS, orient='row')
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """テストの間で保存したブックを再利用しないように、前後でキャッシュを空にする"""
+    workbook_cache.clear()
+    yield
+    workbook_cache.clear()
@@ -0,0 +1,95 @@
+import datetime
+from unittest.mock import patch
+
+import polars as pl
+import pytest
+
+from services.atomic_save import atomic_write, rollback_file, rollback_path_for
+from services.excel_processor import append_batches_to_workbook, rollback_excel_file
+from services.import_journal import ImportJournal
+from services.workbook_reader import KEY_COLUMNS
+from tests.conftest import create_test_workbook, read_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+]
+
+INCOMING = pl.DataFrame(
+    [('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')],
+    schema=KEY_COLUMNS, orient='row')
+
+
+class TestAtomicWrite:
+    def test_keep_previous_generation(self, tmp_path):
+        """置き換える前のファイルを1世代前として残し、名前の入れ替えで戻すテスト"""
+        target = tmp_path / 'a.txt'
+        target.write_text('old')
+
+        with atomic_write(str(target)) as temp_path:
+            with open(temp_path, 'w') as f:
+                f.write('new')
+
+        assert target.read_text() == 'new'
+        assert rollback_path_for(str(target)) == tmp_path / 'a.prev.txt'
+        assert (tmp_path / 'a.prev.txt').read_text() == 'old'
+
+        rollback_file(str(target))
+
+        assert target.read_text() == 'old'
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['a.txt']
+        with pytest.raises(FileNotFoundError):
+            rollback_file(str(target))
+
+    def test_failure_keeps_original(self, tmp_path):
+        """書き込み中に失敗した場合は元のファイルを変更せず、一時ファイルを残さないテスト"""
+        target = tmp_path / 'a.txt'
+        target.write_text('old')
+
+        with pytest.raises(RuntimeError):
+            with atomic_write(str(target)) as temp_path:
+                with open(temp_path, 'w') as f:
+                    f.write('途中')
+                raise RuntimeError("書き込みに失敗しました")
+
+        assert target.read_text() == 'old'
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['a.txt']
+
+    def test_copy_when_link_unsupported(self, tmp_path):
+        """ハードリンクを使えない場合はコピーで1世代前を残すテスト"""
+        target = tmp_path / 'a.txt'
+        target.write_text('old')
+
+        with patch('services.atomic_save.os.link', side_effect=OSError):
+            with atomic_write(str(target)) as temp_path:
+                with open(temp_path, 'w') as f:
+                    f.write('new')
+
+        assert (tmp_path / 'a.prev.txt').read_text() == 'old'
+
+
+class TestRollbackExcelFile:
+    @pytest.mark.parametrize('engine', ['openpyxl', 'patch'])
+    def test_rollback_after_import(self, tmp_path, engine):
+        """取り込みで保存したExcelファイルを保存前の状態に戻すテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        append_batches_to_workbook(excel_path, [INCOMING], engine=engine)
+        assert len(read_test_workbook(excel_path)) == 2
+
+        rollback_excel_file(excel_path)
+
+        assert [row for row in read_test_workbook(excel_path) if any(row)] == EXISTING_ROWS
+        # 戻した後の取り込みでは重複チェック用インデックスを作り直す
+        result = append_batches_to_workbook(excel_path, [INCOMING], engine=engine)
+        assert result.appended_rows == 1
+
+    def test_pending_import(self, tmp_path):
+        """中断した取り込みがある場合は元に戻さないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        journal = ImportJournal(excel_path)
+        journal.begin(['0001_20250101120000.csv'])
+        append_batches_to_workbook(excel_path, [INCOMING], journal=journal)
+
+        with pytest.raises(ValueError):
+            rollback_excel_file(excel_path)
+
+        assert len(read_test_workbook(excel_path)) == 2
@@ -0,0 +1,190 @@
+import datetime
+import json
+import os
+import time
+import zipfile
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from services.backup_store import BackupStore
+from services.excel_processor import append_batches_to_workbook
+from services.file_manager import backup_excel_file, cleanup_old_backup_files, list_backups, restore_backup
+from tests.conftest import VBA_PROJECT, add_vba_project, create_test_workbook, make_df, read_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+]
+INCOMING = [('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')]
+
+
+def make_old(store, snapshot_id, days):
+    """スナップショットの作成日時を指定した日数前にする"""
+    path = store.snapshot_path(snapshot_id)
+    data = json.loads(path.read_text(encoding='utf-8'))
+    created = datetime.datetime.fromisoformat(data['created']) - datetime.timedelta(days=days)
+    data['created'] = created.isoformat(timespec='seconds')
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+
+def read_parts(path):
+    with zipfile.ZipFile(path) as zf:
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+def count_objects(store):
+    return len(list(store.objects_dir.glob('*/*')))
+
+
+def replace_part(path, name, data):
+    """zip内の部品を置き換える"""
+    parts = read_parts(path)
+    parts[name] = data
+    with zipfile.ZipFile(path, 'w') as zf:
+        for part_name, content in parts.items():
+            zf.writestr(part_name, content)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    return add_vba_project(create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS))
+
+
+class TestBackupStore:
+    def test_snapshot_and_restore(self, tmp_path, workbook):
+        """スナップショットから元と同じ部品のExcelファイルを復元するテスト"""
+        store = BackupStore(tmp_path / 'store')
+
+        snapshot = store.snapshot(workbook)
+        restored = store.restore(snapshot.snapshot_id, str(tmp_path / 'restored.xlsm'))
+
+        assert read_parts(restored) == read_parts(workbook)
+        assert read_parts(restored)['xl/vbaProject.bin'] == VBA_PROJECT
+        assert read_test_workbook(restored) == read_test_workbook(workbook)
+        assert [s.snapshot_id for s in store.list_snapshots()] == [snapshot.snapshot_id]
+        assert not list(tmp_path.glob('*.tmp'))
+
+    def test_unchanged_parts_stored_once(self, tmp_path, workbook):
+        """変更されていない部品は読み込まずに前回のオブジェクトを参照するテスト"""
+        store = BackupStore(tmp_path / 'store')
+        first = store.snapshot(workbook)
+        objects = count_objects(store)
+
+        append_batches_to_workbook(workbook, [make_df(INCOMING)], engine='patch')
+        with patch('services.backup_store.zipfile.ZipFile.read', autospec=True,
+                   side_effect=zipfile.ZipFile.read) as mock_read:
+            second = store.snapshot(workbook)
+
+        read_names = sorted(call.args[1].filename for call in mock_read.call_args_list)
+        assert read_names == ['xl/styles.xml', 'xl/worksheets/sheet1.xml']
+        assert count_objects(store) == objects + 2
+        assert 0 < second.stored_bytes < first.stored_bytes
+        restored = store.restore(second.snapshot_id, str(tmp_path / 'restored.xlsm'))
+        assert [row[1] for row in read_test_workbook(restored)] == [1001, 1002]
+
+    def test_prune(self, tmp_path, workbook):
+        """古いスナップショットと参照されなくなった部品のみを削除するテスト"""
+        store = BackupStore(tmp_path / 'store')
+        old = store.snapshot(workbook)
+        make_old(store, old.snapshot_id, days=30)
+        append_batches_to_workbook(workbook, [make_df(INCOMING)], engine='patch')
+        new = store.snapshot(workbook)
+
+        assert store.prune(datetime.datetime.now() - datetime.timedelta(days=14)) == 1
+
+        assert [s.snapshot_id for s in store.list_snapshots()] == [new.snapshot_id]
+        assert count_objects(store) == len({part.digest for part in new.parts})
+        restored = store.restore(new.snapshot_id, str(tmp_path / 'restored.xlsm'))
+        assert read_parts(restored) == read_parts(workbook)
+
+    def test_corrupted_object(self, tmp_path, workbook):
+        """部品の内容が壊れている場合は復元しないテスト"""
+        store = BackupStore(tmp_path / 'store')
+        snapshot = store.snapshot(workbook)
+        sheet = next(part for part in snapshot.parts if part.name == 'xl/worksheets/sheet1.xml')
+        store._object_path(sheet.digest).write_bytes(b'broken')
+
+        with pytest.raises(ValueError):
+            store.restore(snapshot.snapshot_id, str(tmp_path / 'restored.xlsm'))
+
+        assert not (tmp_path / 'restored.xlsm').exists()
+
+    def test_unknown_snapshot(self, tmp_path):
+        """存在しないスナップショットを指定した場合のテスト"""
+        with pytest.raises(ValueError):
+            BackupStore(tmp_path / 'store').restore('20250101000000000000', str(tmp_path / 'a.xlsm'))
+
+
+@pytest.fixture
+def backup_config(tmp_path):
+    config = MagicMock()
+    config.get_backup_path.return_value = str(tmp_path / 'backup')
+    config.get_backup_retention_days.return_value = 14
+    config.get_backup_mode.return_value = 'snapshot'
+    config.get_backup_max_disk_mb.return_value = 0
+    config.get_retention_reconcile_hours.return_value = 24
+    with patch('services.file_manager.ConfigManager', return_value=config):
+        yield config
+
+
+class TestSnapshotBackup:
+    def test_backup_list_restore(self, tmp_path, workbook, backup_config):
+        """スナップショットでバックアップし、一覧の取得と復元を行うテスト"""
+        backup_excel_file(workbook)
+
+        snapshots = list_backups()
+        assert len(snapshots) == 1
+        assert snapshots[0].source == workbook
+        restored = restore_backup(snapshots[0].snapshot_id)
+        assert restored == tmp_path / 'backup' / f"復元_医療文書担当一覧_{snapshots[0].snapshot_id}.xlsm"
+        assert read_parts(restored) == read_parts(workbook)
+
+        # 復元したファイルは保持期間を過ぎてもバックアップとして削除しない
+        old = time.time() - 15 * 24 * 60 * 60
+        os.utime(restored, (old, old))
+        cleanup_old_backup_files()
+        assert restored.exists()
+
+    def test_cleanup_prunes_snapshots(self, tmp_path, workbook, backup_config):
+        """保持期間を過ぎたスナップショットを削除するテスト"""
+        backup_excel_file(workbook)
+        store = BackupStore(tmp_path / 'backup' / 'store')
+        make_old(store, store.list_snapshots()[0].snapshot_id, days=15)
+        backup_excel_file(workbook)
+
+        cleanup_old_backup_files()
+
+        assert len(list_backups()) == 1
+        assert count_objects(store) == len(list_backups()[0].parts)
+
+    def test_disk_budget_with_shared_parts(self, tmp_path, workbook, backup_config):
+        """共有する部品を含めた実際のサイズが上限以下になるまで古いスナップショットを削除するテスト"""
+        backup_config.get_backup_max_disk_mb.return_value = 1
+        store = BackupStore(tmp_path / 'backup' / 'store')
+        # 圧縮できない600KBのマクロを2回ずつ共有する
+        for vba in (os.urandom(600 * 1024), os.urandom(600 * 1024)):
+            replace_part(workbook, 'xl/vbaProject.bin', vba)
+            backup_excel_file(workbook)
+            backup_excel_file(workbook)
+        snapshot_ids = [snapshot.snapshot_id for snapshot in list_backups()]
+
+        cleanup_old_backup_files()
+
+        # 1つ目のスナップショットを削除しても共有するマクロは残るため、2つ目まで削除する
+        assert [snapshot.snapshot_id for snapshot in list_backups()] == snapshot_ids[2:]
+        assert sum(store.object_sizes().values()) <= 1024 * 1024
+        referenced = {part.digest for snapshot in list_backups() for part in snapshot.parts}
+        assert set(store.object_sizes()) == referenced
+
+    def test_disk_budget_keeps_latest(self, tmp_path, workbook, backup_config):
+        """最新のスナップショットが上限を超える場合も最新のスナップショットは残すテスト"""
+        backup_config.get_backup_max_disk_mb.return_value = 1
+        replace_part(workbook, 'xl/vbaProject.bin', os.urandom(2 * 1024 * 1024))
+        for _ in range(3):
+            backup_excel_file(workbook)
+
+        cleanup_old_backup_files()
+
+        assert len(list_backups()) == 1
+        store = BackupStore(tmp_path / 'backup' / 'store')
+        assert count_objects(store) == len(list_backups()[0].parts)
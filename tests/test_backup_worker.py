@@ -0,0 +1,80 @@
+import datetime
+import threading
+import time
+
+import polars as pl
+
+from services.backup_worker import BackupWorker, backup_worker
+from services.excel_processor import append_batches_to_workbook
+from services.workbook_reader import KEY_COLUMNS
+from tests.conftest import create_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+]
+
+
+class TestBackupWorker:
+    def test_runs_in_order_off_thread(self):
+        """キューに追加した順にワーカースレッドで実行し、flushで完了を待つテスト"""
+        worker = BackupWorker()
+        calls = []
+
+        for name in ('a', 'b', 'c'):
+            worker.submit(lambda name=name: calls.append((name, threading.current_thread().name)))
+
+        assert worker.flush(timeout=5)
+        assert calls == [('a', 'BackupWorker'), ('b', 'BackupWorker'), ('c', 'BackupWorker')]
+
+    def test_wait_for_excel_path(self, tmp_path):
+        """指定したファイルの処理のみを待つテスト"""
+        worker = BackupWorker()
+        release = threading.Event()
+        worker.submit(release.wait, excel_path=str(tmp_path / 'a.xlsm'))
+
+        assert worker.wait(str(tmp_path / 'b.xlsm'), timeout=0)
+        assert not worker.wait(str(tmp_path / 'a.xlsm'), timeout=0.05)
+        assert not worker.flush(timeout=0.05)
+
+        release.set()
+        assert worker.wait(str(tmp_path / 'a.xlsm'), timeout=5)
+
+    def test_failure_reported(self):
+        """失敗した場合は成功時の処理を呼ばずにリスナーへ例外を通知するテスト"""
+        worker = BackupWorker()
+        notified = []
+        succeeded = []
+        worker.set_listener(notified.append)
+
+        def fail():
+            raise OSError("ディスクがいっぱいです")
+
+        job = worker.submit(fail, on_success=lambda: succeeded.append(True))
+        ok = worker.submit(lambda: None, on_success=lambda: succeeded.append(True))
+        worker.flush(timeout=5)
+
+        assert isinstance(job.error, OSError)
+        assert not job.ok
+        assert ok.ok
+        assert succeeded == [True]
+        assert notified == [job, ok]
+
+    def test_write_waits_for_backup(self, tmp_path):
+        """バックアップが終わるまでExcelファイルを変更しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        with open(excel_path, 'rb') as f:
+            before = f.read()
+        copied = []
+
+        def slow_backup(path):
+            time.sleep(0.2)
+            with open(path, 'rb') as f:
+                copied.append(f.read())
+
+        job = backup_worker.submit(slow_backup, excel_path, excel_path=excel_path)
+        append_batches_to_workbook(excel_path, [pl.DataFrame(
+            [('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')],
+            schema=KEY_COLUMNS, orient='row')], engine='patch')
+
+        assert job.done.is_set()
+        assert copied == [before]
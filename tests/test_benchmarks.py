@@ -0,0 +1,56 @@
+import json
+
+import openpyxl
+
+from benchmarks.generators import generate_records, write_excel_workbook, write_papyrus_csv
+from benchmarks.run_benchmarks import run_benchmarks
+from services.csv_processor import detect_encoding, read_csv_with_encoding
+
+
+class TestGenerators:
+    def test_generate_records_duplicate_ratio(self):
+        """指定した割合で重複行を生成し、同じシードでは同じ内容になるテスト"""
+        records = generate_records(1000, duplicate_ratio=0.3, seed=5)
+
+        assert len(records) == 1000
+        assert 600 <= len(set(records)) <= 800
+        assert records == generate_records(1000, duplicate_ratio=0.3, seed=5)
+        assert len(set(generate_records(1000, seed=5))) == 1000
+
+    def test_write_papyrus_csv(self, tmp_path):
+        """前置き3行とヘッダーを持つShift-JISのCSVファイルを作成するテスト"""
+        records = generate_records(20, seed=1)
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv', records)
+
+        assert detect_encoding(csv_path) == 'shift-jis'
+        df = read_csv_with_encoding(csv_path)
+        assert df is not None
+        assert df.shape == (20, 11)
+        assert df['預り日'][0] == records[0][0].strftime('%Y%m%d')
+
+    def test_write_excel_workbook(self, tmp_path):
+        """見出し行と既存データを持つExcelファイルを作成するテスト"""
+        records = generate_records(30, seed=1)
+        excel_path = write_excel_workbook(tmp_path / 'test.xlsm', records)
+
+        wb = openpyxl.load_workbook(excel_path, keep_vba=True)
+        ws = wb.active
+        assert ws.max_row == 31
+        assert ws.cell(row=2, column=2).value == records[0][1]
+        wb.close()
+
+
+class TestRunBenchmarks:
+    def test_run_benchmarks_writes_results(self, tmp_path):
+        """各処理の計測結果をJSONファイルに出力するテスト"""
+        output = tmp_path / 'results.json'
+
+        run_benchmarks([50], str(output), repeat=1, work_dir=str(tmp_path / 'work'))
+
+        report = json.loads(output.read_text(encoding='utf-8'))
+        functions = {result['function'] for result in report['results']}
+        assert {'read_csv_with_encoding', 'process_csv_data', 'write_data_to_excel',
+                'get_last_row', 'apply_cell_formats'} <= functions
+        assert all(result['rows'] == 50 for result in report['results'])
+        assert all(result['min_seconds'] >= 0 for result in report['results'])
+        assert report['parameters']['sizes'] == [50]
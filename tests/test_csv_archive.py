@@ -0,0 +1,126 @@
+import datetime
+from unittest.mock import MagicMock, patch
+
+import polars as pl
+
+from services.backup_worker import backup_worker
+from services.csv_archive import archive_frames, compact_archive, scan_archive
+from services.csv_processor import archive_processed_csv, process_completed_csv
+from services.csv_schema import PAPYRUS_SCHEMA
+from tests.conftest import write_papyrus_csv
+
+
+def make_df(rows):
+    df = pl.DataFrame(rows, schema=PAPYRUS_SCHEMA.names, orient='row')
+    return df.with_columns(pl.col("患者ID").cast(pl.Int64))
+
+
+ROWS = [
+    (datetime.date(2025, 1, 5), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+    (datetime.date(2025, 2, 3), 1002, '鈴木花子', '意見書', '外科', '佐藤医師'),
+]
+
+
+class TestCsvArchive:
+    def test_partition_by_month(self, tmp_path):
+        """預り日の年月ごとのフォルダに保存し、範囲外の年月を読み込まないテスト"""
+        assert archive_frames(tmp_path, [make_df(ROWS)], '0001_20250203120000.csv') == 2
+
+        assert sorted(path.relative_to(tmp_path).as_posix() for path in tmp_path.rglob('*.parquet')) == [
+            'month=2025-01/part-0001_20250203120000.parquet',
+            'month=2025-02/part-0001_20250203120000.parquet',
+        ]
+        lf = scan_archive(tmp_path, start=datetime.date(2025, 2, 1))
+        assert 'month=2025-01' not in lf.explain()
+        df = lf.collect()
+        assert df["患者ID"].to_list() == [1002]
+        assert df["取込元"].to_list() == ['0001_20250203120000.csv']
+        assert scan_archive(tmp_path, end=datetime.date(2025, 1, 31)).collect()["患者ID"].to_list() == [1001]
+
+    def test_unconverted_dates(self, tmp_path):
+        """預り日を日付に変換できなかった行はunknownのフォルダに保存するテスト"""
+        df = pl.DataFrame([('20250105', '1001', '山田太郎', '診断書', '内科', '田中医師'),
+                           ('不明', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')],
+                          schema=PAPYRUS_SCHEMA.names, orient='row')
+
+        archive_frames(tmp_path, [df], 'a.csv')
+
+        df = scan_archive(tmp_path).collect().sort("患者ID")
+        assert df["month"].to_list() == ['2025-01', 'unknown']
+        assert df["預り日"].to_list() == [datetime.date(2025, 1, 5), None]
+        assert df["患者ID"].to_list() == [1001, 1002]
+        assert scan_archive(tmp_path, start=datetime.date(2025, 1, 1)).collect().height == 1
+
+    def test_compact(self, tmp_path):
+        """ファイル数が上限を超えた年月を1つにまとめ、同じCSVの重複した行を除くテスト"""
+        for name in ('a.csv', 'b.csv', 'c.csv'):
+            archive_frames(tmp_path, [make_df(ROWS[:1])], name)
+        # 同じCSVファイルを再度保存した場合は置き換える
+        archive_frames(tmp_path, [make_df(ROWS[:1])], 'a.csv')
+        assert len(list((tmp_path / 'month=2025-01').glob('*.parquet'))) == 3
+
+        assert compact_archive(tmp_path, max_parts=3) == 0
+        archive_frames(tmp_path, [make_df(ROWS[:1])], 'd.csv')
+        assert compact_archive(tmp_path, max_parts=3) == 1
+
+        files = list((tmp_path / 'month=2025-01').glob('*.parquet'))
+        assert len(files) == 1
+        assert files[0].name.startswith('data-')
+        assert sorted(scan_archive(tmp_path).collect()["取込元"].to_list()) == ['a.csv', 'b.csv', 'c.csv', 'd.csv']
+
+        # まとめた後に同じCSVファイルを再度保存した場合も、次にまとめる際に重複を除く
+        archive_frames(tmp_path, [make_df(ROWS[:1])], 'a.csv')
+        assert compact_archive(tmp_path, max_parts=1) == 1
+        assert sorted(scan_archive(tmp_path).collect()["取込元"].to_list()) == ['a.csv', 'b.csv', 'c.csv', 'd.csv']
+
+    def test_compact_keeps_duplicates_within_csv(self, tmp_path):
+        """同じCSVファイル内で重複する行はまとめる際も残すテスト"""
+        archive_frames(tmp_path, [make_df([ROWS[0], ROWS[0]])], 'a.csv')
+        archive_frames(tmp_path, [make_df(ROWS[:1])], 'b.csv')
+
+        assert compact_archive(tmp_path, max_parts=1) == 1
+        assert sorted(scan_archive(tmp_path).collect()["取込元"].to_list()) == ['a.csv', 'a.csv', 'b.csv']
+
+        # 再度保存した場合は新しい分のみを残し、CSVファイル内の重複は残す
+        archive_frames(tmp_path, [make_df([ROWS[0], ROWS[0], ROWS[0]])], 'a.csv')
+        assert compact_archive(tmp_path, max_parts=1) == 1
+        assert sorted(scan_archive(tmp_path).collect()["取込元"].to_list()) == ['a.csv'] * 3 + ['b.csv']
+
+    def test_empty_archive(self, tmp_path):
+        """アーカイブがない場合は空のLazyFrameを返すテスト"""
+        df = scan_archive(tmp_path / 'archive').collect()
+
+        assert df.is_empty()
+        assert df.columns[:2] == ["預り日", "患者ID"]
+
+
+class TestArchiveProcessedCsv:
+    @patch('services.csv_processor.ConfigManager')
+    def test_archive_after_move(self, mock_config_manager, tmp_path):
+        """処理済みCSVを移動した後、ワーカースレッドで加工済みの行をアーカイブに保存するテスト"""
+        mock_config = MagicMock()
+        mock_config.get_processed_path.return_value = str(tmp_path / 'processed')
+        mock_config.get_archive_enabled.return_value = True
+        mock_config.get_archive_path.return_value = str(tmp_path / 'archive')
+        mock_config.get_archive_max_parts.return_value = 8
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = []
+        mock_config_manager.return_value = mock_config
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+
+        process_completed_csv(csv_path)
+        backup_worker.flush()
+
+        df = scan_archive(tmp_path / 'archive').collect().sort("患者ID")
+        assert df["文書名"].to_list() == ['診断書', '診断書']
+        assert df["医師名"].to_list() == ['田中医師', '佐藤医師']
+        assert df["預り日"].to_list() == [datetime.date(2025, 1, 1), datetime.date(2025, 1, 2)]
+
+    def test_invalid_csv(self, tmp_path, capsys):
+        """読み込めないCSVファイルは取り込みを中断せずメッセージを出力するテスト"""
+        csv_path = tmp_path / 'broken.csv'
+        csv_path.write_bytes(b'\xff\xfe\x00')
+
+        assert archive_processed_csv(str(csv_path), str(tmp_path / 'archive'), 8) == 0
+
+        assert "アーカイブに保存できません" in capsys.readouterr().out
@@ -1,11 +1,14 @@
 import sys
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import ANY, patch, MagicMock
 from pathlib import Path
 
 from PyQt6.QtWidgets import QApplication, QMessageBox
 
-from services.csv_excel_transfer import transfer_csv_to_excel
+from services.backup_worker import backup_worker
+from services.csv_excel_transfer import RESUMED_MESSAGE, transfer_csv_to_excel, transfer_all_csv_to_excel
+from services.excel_processor import AppendResult, ExcelFileLockedError
+from services.import_pipeline import ImportStats
 from utils.config_manager import ConfigManager
 
 
@@ -19,20 +22,17 @@ def app():
 
 
 class TestCsvExcelTransfer:
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
-    @patch('services.csv_excel_transfer.read_csv_with_encoding')
-    @patch('services.csv_excel_transfer.convert_date_format')
-    @patch('services.csv_excel_transfer.process_csv_data')
-    @patch('services.csv_excel_transfer.write_data_to_excel')
-    @patch('services.csv_excel_transfer.backup_excel_file')
-    @patch('services.csv_excel_transfer.process_completed_csv')
-    @patch('services.csv_excel_transfer.open_and_sort_excel')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
+    @patch('services.import_pipeline.load_processed_csv')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.backup_excel_file')
+    @patch('services.import_pipeline.process_completed_csv')
+    @patch('services.import_pipeline.open_and_sort_excel')
     def test_transfer_csv_to_excel_success(self, mock_open_sort, mock_process_csv,
-                                           mock_backup, mock_write, mock_process_data,
-                                           mock_convert_date, mock_read_csv, mock_find_csv,
+                                           mock_backup, mock_write, mock_load_csv, mock_find_csv,
                                            mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
         """CSVからExcelへの正常な転送処理のテスト"""
         # ConfigManagerのモック設定
@@ -44,30 +44,28 @@ class TestCsvExcelTransfer:
 
         # 各関数のモック戻り値設定
         mock_find_csv.return_value = "C:/Downloads/test.csv"
-        mock_read_csv.return_value = "mock_dataframe"
-        mock_convert_date.return_value = "mock_dataframe_with_date"
-        mock_process_data.return_value = "mock_processed_dataframe"
-        mock_write.return_value = True  # 書き込み成功
+        mock_load_csv.return_value = "mock_dataframe_with_date"
+        mock_write.return_value = AppendResult()  # 書き込み成功
 
         # 関数実行
         transfer_csv_to_excel()
+        backup_worker.flush()  # バックアップはワーカースレッドで実行される
 
         # 各関数が正しく呼ばれたことを確認
         mock_ensure_dirs.assert_called_once()
         mock_cleanup.assert_called_once_with(Path("C:/Processed"))
         mock_find_csv.assert_called_once_with("C:/Downloads")
-        mock_read_csv.assert_called_once_with("C:/Downloads/test.csv")
-        mock_process_data.assert_called_once_with("mock_dataframe")
-        mock_convert_date.assert_called_once_with("mock_processed_dataframe")
-        mock_write.assert_called_once_with("C:/Excel/test.xlsm", "mock_dataframe_with_date")
+        mock_load_csv.assert_called_once_with("C:/Downloads/test.csv")
+        mock_write.assert_called_once_with("C:/Excel/test.xlsm", ANY, dry_run=False, journal=ANY)
+        assert list(mock_write.call_args[0][1]) == ["mock_dataframe_with_date"]
         mock_backup.assert_called_once_with("C:/Excel/test.xlsm")
         mock_process_csv.assert_called_once_with("C:/Downloads/test.csv")
         mock_open_sort.assert_called_once_with("C:/Excel/test.xlsm")
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
     @patch('services.csv_excel_transfer.QMessageBox.warning')
     def test_transfer_csv_to_excel_no_csv(self, mock_warning, mock_find_csv,
                                           mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
@@ -91,17 +89,16 @@ class TestCsvExcelTransfer:
         assert args[1] == "警告"
         assert "CSVファイルが見つかりません" in args[2]
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
-    @patch('services.csv_excel_transfer.read_csv_with_encoding')
-    @patch('services.csv_excel_transfer.convert_date_format')
-    @patch('services.csv_excel_transfer.process_csv_data')
-    @patch('services.csv_excel_transfer.write_data_to_excel')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
+    @patch('services.import_pipeline.load_processed_csv')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.process_completed_csv')
     @patch('services.csv_excel_transfer.QMessageBox.critical')
-    def test_transfer_csv_to_excel_write_error(self, mock_critical, mock_write, mock_process_data,
-                                               mock_convert_date, mock_read_csv, mock_find_csv,
+    def test_transfer_csv_to_excel_write_error(self, mock_critical, mock_process_csv, mock_write,
+                                               mock_load_csv, mock_find_csv,
                                                mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
         """Excel書き込みエラーのテスト"""
         # ConfigManagerのモック設定
@@ -113,21 +110,21 @@ class TestCsvExcelTransfer:
 
         # 各関数のモック戻り値設定
         mock_find_csv.return_value = "C:/Downloads/test.csv"
-        mock_read_csv.return_value = "mock_dataframe"
-        mock_convert_date.return_value = "mock_dataframe_with_date"
-        mock_process_data.return_value = "mock_processed_dataframe"
-        mock_write.return_value = False  # 書き込み失敗
+        mock_load_csv.return_value = "mock_dataframe_with_date"
+        mock_write.side_effect = ExcelFileLockedError("Excelファイルが開かれています")  # 書き込み失敗
 
         # 関数実行
         transfer_csv_to_excel()
 
-        # バックアップや後続処理が呼ばれないことを確認
-        assert not mock_critical.called
+        # エラーメッセージが表示され、後続処理が呼ばれないことを確認
+        mock_critical.assert_called_once()
+        assert mock_critical.call_args[0][2] == "Excelファイルが開かれています"
+        mock_process_csv.assert_not_called()
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
     @patch('services.csv_excel_transfer.QMessageBox.critical')
     def test_transfer_csv_to_excel_exception(self, mock_critical, mock_find_csv,
                                              mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
@@ -150,3 +147,123 @@ class TestCsvExcelTransfer:
         args = mock_critical.call_args[0]
         assert args[1] == "エラー"
         assert "テストエラー" in args[2]
+
+    @patch('services.csv_excel_transfer.ConfigManager')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.csv_excel_transfer.find_pending_csvs')
+    @patch('services.import_pipeline.load_processed_csvs')
+    @patch('services.import_pipeline.combine_processed_frames')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.backup_excel_file')
+    @patch('services.import_pipeline.process_completed_csv')
+    @patch('services.import_pipeline.open_and_sort_excel')
+    def test_transfer_all_csv_to_excel_success(self, mock_open_sort, mock_process_csv,
+                                               mock_backup, mock_write, mock_combine,
+                                               mock_load_csvs, mock_find_pending,
+                                               mock_cleanup, mock_ensure_dirs, mock_config_manager,
+                                               mock_transfer_config_manager, app):
+        """未処理CSVの一括転送処理のテスト（読込失敗分は移動しない）"""
+        mock_config = MagicMock()
+        mock_config.get_downloads_path.return_value = "C:/Downloads"
+        mock_config.get_excel_path.return_value = "C:/Excel/test.xlsm"
+        mock_config.get_processed_path.return_value = "C:/Processed"
+        mock_config_manager.return_value = mock_config
+        mock_transfer_config_manager.return_value = mock_config
+
+        mock_find_pending.return_value = ["C:/Downloads/a.csv", "C:/Downloads/b.csv", "C:/Downloads/c.csv"]
+        mock_load_csvs.return_value = [
+            ("C:/Downloads/a.csv", "df_a"),
+            ("C:/Downloads/b.csv", None),
+            ("C:/Downloads/c.csv", "df_c"),
+        ]
+        mock_combine.return_value = "combined_df"
+        mock_write.return_value = AppendResult()
+
+        transfer_all_csv_to_excel()
+        backup_worker.flush()  # バックアップはワーカースレッドで実行される
+
+        mock_find_pending.assert_called_once_with("C:/Downloads")
+        mock_load_csvs.assert_called_once_with(mock_find_pending.return_value)
+        mock_combine.assert_called_once_with(["df_a", "df_c"])
+        mock_write.assert_called_once_with("C:/Excel/test.xlsm", ANY, dry_run=False, journal=ANY)
+        assert list(mock_write.call_args[0][1]) == ["combined_df"]
+        assert mock_process_csv.call_args_list == [
+            (("C:/Downloads/a.csv",),),
+            (("C:/Downloads/c.csv",),),
+        ]
+        mock_backup.assert_called_once_with("C:/Excel/test.xlsm")
+        mock_open_sort.assert_called_once_with("C:/Excel/test.xlsm")
+
+    @patch('services.csv_excel_transfer.ConfigManager')
+    @patch('services.csv_excel_transfer.find_pending_csvs')
+    @patch('services.csv_excel_transfer.QMessageBox.warning')
+    def test_transfer_all_csv_to_excel_no_csv(self, mock_warning, mock_find_pending,
+                                              mock_config_manager, app):
+        """未処理CSVファイルが見つからない場合のテスト"""
+        mock_config_manager.return_value = MagicMock()
+        mock_find_pending.return_value = []
+
+        transfer_all_csv_to_excel()
+
+        mock_warning.assert_called_once()
+        assert "CSVファイルが見つかりません" in mock_warning.call_args[0][2]
+
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
+    @patch('services.import_pipeline._should_stream')
+    @patch('services.import_pipeline.load_processed_csv')
+    @patch('services.import_pipeline.iter_processed_csv_batches')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.backup_excel_file')
+    @patch('services.import_pipeline.process_completed_csv')
+    @patch('services.import_pipeline.open_and_sort_excel')
+    def test_transfer_csv_to_excel_streaming(self, mock_open_sort, mock_process_csv, mock_backup,
+                                             mock_write_batches, mock_iter_batches, mock_load_csv,
+                                             mock_should_stream, mock_find_csv, mock_cleanup,
+                                             mock_ensure_dirs, mock_config_manager, app):
+        """大きなCSVファイルを分割読み込みで転送するテスト"""
+        mock_config = MagicMock()
+        mock_config.get_excel_path.return_value = "C:/Excel/test.xlsm"
+        mock_config.get_processed_path.return_value = "C:/Processed"
+        mock_config.get_streaming_threshold_mb.return_value = 100
+        mock_config_manager.return_value = mock_config
+
+        mock_find_csv.return_value = "C:/Downloads/test.csv"
+        mock_should_stream.return_value = True
+        mock_iter_batches.return_value = "batch_iterator"
+        mock_write_batches.return_value = AppendResult()
+
+        transfer_csv_to_excel()
+        backup_worker.flush()  # バックアップはワーカースレッドで実行される
+
+        mock_load_csv.assert_not_called()
+        mock_iter_batches.assert_called_once_with("C:/Downloads/test.csv")
+        mock_write_batches.assert_called_once_with("C:/Excel/test.xlsm", "batch_iterator",
+                                                   dry_run=False, journal=ANY)
+        mock_process_csv.assert_called_once_with("C:/Downloads/test.csv")
+        mock_backup.assert_called_once_with("C:/Excel/test.xlsm")
+
+    @patch('services.csv_excel_transfer.run_import')
+    @patch('services.csv_excel_transfer.QMessageBox.information')
+    def test_transfer_csv_to_excel_resumed(self, mock_information, mock_run_import, app):
+        """中断した取り込みの続きのみを行った場合は再実行を促すメッセージを表示するテスト"""
+        mock_run_import.return_value = ImportStats(csv_path="C:/Downloads/old.csv", resumed=True)
+
+        transfer_csv_to_excel()
+
+        mock_run_import.assert_called_once_with(wait_for_backup=False)
+        mock_information.assert_called_once_with(None, "取り込み再開", RESUMED_MESSAGE)
+
+    @patch('services.csv_excel_transfer.run_import')
+    @patch('services.csv_excel_transfer.QMessageBox.information')
+    def test_transfer_csv_to_excel_not_resumed(self, mock_information, mock_run_import, app):
+        """通常の取り込みではメッセージを表示しないテスト"""
+        mock_run_import.return_value = ImportStats(csv_path="C:/Downloads/test.csv")
+
+        transfer_csv_to_excel()
+
+        mock_information.assert_not_called()
@@ -1,13 +1,37 @@
+import datetime
+import os
 import sys
+import subprocess
+import tempfile
 import pytest
-from unittest.mock import patch, MagicMock
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import ANY, patch, MagicMock
 from pathlib import Path
 
 import polars as pl
 from PyQt6.QtWidgets import QApplication, QMessageBox
 
+from services.backup_worker import backup_worker
 from services.csv_excel_transfer import transfer_csv_to_excel
-from services.csv_processor import process_csv_data
+from services.excel_processor import AppendResult, ExcelFileLockedError
+from services.csv_processor import (
+    process_csv_data,
+    compile_exclusion_filter,
+    read_csv_with_encoding,
+    convert_date_format,
+    load_processed_csv,
+    iter_processed_csv_batches,
+    find_latest_csv,
+    find_pending_csvs,
+    clear_csv_index,
+    load_processed_csvs,
+    combine_processed_frames,
+    sniff_encoding,
+    detect_encoding,
+    get_fallback_parse_count,
+    clear_encoding_cache
+)
+from tests.conftest import write_papyrus_csv
 from utils.config_manager import ConfigManager
 
 
@@ -21,20 +45,17 @@ def app():
 
 
 class TestCsvExcelTransfer:
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
-    @patch('services.csv_excel_transfer.read_csv_with_encoding')
-    @patch('services.csv_excel_transfer.convert_date_format')
-    @patch('services.csv_excel_transfer.process_csv_data')
-    @patch('services.csv_excel_transfer.write_data_to_excel')
-    @patch('services.csv_excel_transfer.backup_excel_file')
-    @patch('services.csv_excel_transfer.process_completed_csv')
-    @patch('services.csv_excel_transfer.open_and_sort_excel')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
+    @patch('services.import_pipeline.load_processed_csv')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.backup_excel_file')
+    @patch('services.import_pipeline.process_completed_csv')
+    @patch('services.import_pipeline.open_and_sort_excel')
     def test_transfer_csv_to_excel_success(self, mock_open_sort, mock_process_csv,
-                                           mock_backup, mock_write, mock_process_data,
-                                           mock_convert_date, mock_read_csv, mock_find_csv,
+                                           mock_backup, mock_write, mock_load_csv, mock_find_csv,
                                            mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
         """CSVからExcelへの正常な転送処理のテスト"""
         # ConfigManagerのモック設定
@@ -46,30 +67,28 @@ class TestCsvExcelTransfer:
 
         # 各関数のモック戻り値設定
         mock_find_csv.return_value = "C:/Downloads/test.csv"
-        mock_read_csv.return_value = "mock_dataframe"
-        mock_convert_date.return_value = "mock_dataframe_with_date"
-        mock_process_data.return_value = "mock_processed_dataframe"
-        mock_write.return_value = True  # 書き込み成功
+        mock_load_csv.return_value = "mock_dataframe_with_date"
+        mock_write.return_value = AppendResult()  # 書き込み成功
 
         # 関数実行
         transfer_csv_to_excel()
+        backup_worker.flush()  # バックアップはワーカースレッドで実行される
 
         # 各関数が正しく呼ばれたことを確認
         mock_ensure_dirs.assert_called_once()
         mock_cleanup.assert_called_once_with(Path("C:/Processed"))
         mock_find_csv.assert_called_once_with("C:/Downloads")
-        mock_read_csv.assert_called_once_with("C:/Downloads/test.csv")
-        mock_process_data.assert_called_once_with("mock_dataframe")
-        mock_convert_date.assert_called_once_with("mock_processed_dataframe")
-        mock_write.assert_called_once_with("C:/Excel/test.xlsm", "mock_dataframe_with_date")
+        mock_load_csv.assert_called_once_with("C:/Downloads/test.csv")
+        mock_write.assert_called_once_with("C:/Excel/test.xlsm", ANY, dry_run=False, journal=ANY)
+        assert list(mock_write.call_args[0][1]) == ["mock_dataframe_with_date"]
         mock_backup.assert_called_once_with("C:/Excel/test.xlsm")
         mock_process_csv.assert_called_once_with("C:/Downloads/test.csv")
         mock_open_sort.assert_called_once_with("C:/Excel/test.xlsm")
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
     @patch('services.csv_excel_transfer.QMessageBox.warning')
     def test_transfer_csv_to_excel_no_csv(self, mock_warning, mock_find_csv,
                                           mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
@@ -93,17 +112,16 @@ class TestCsvExcelTransfer:
         assert args[1] == "警告"
         assert "CSVファイルが見つかりません" in args[2]
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
-    @patch('services.csv_excel_transfer.read_csv_with_encoding')
-    @patch('services.csv_excel_transfer.convert_date_format')
-    @patch('services.csv_excel_transfer.process_csv_data')
-    @patch('services.csv_excel_transfer.write_data_to_excel')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
+    @patch('services.import_pipeline.load_processed_csv')
+    @patch('services.import_pipeline.append_batches_to_workbook')
+    @patch('services.import_pipeline.process_completed_csv')
     @patch('services.csv_excel_transfer.QMessageBox.critical')
-    def test_transfer_csv_to_excel_write_error(self, mock_critical, mock_write, mock_process_data,
-                                               mock_convert_date, mock_read_csv, mock_find_csv,
+    def test_transfer_csv_to_excel_write_error(self, mock_critical, mock_process_csv, mock_write,
+                                               mock_load_csv, mock_find_csv,
                                                mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
         """Excel書き込みエラーのテスト"""
         # ConfigManagerのモック設定
@@ -115,21 +133,21 @@ class TestCsvExcelTransfer:
 
         # 各関数のモック戻り値設定
         mock_find_csv.return_value = "C:/Downloads/test.csv"
-        mock_read_csv.return_value = "mock_dataframe"
-        mock_convert_date.return_value = "mock_dataframe_with_date"
-        mock_process_data.return_value = "mock_processed_dataframe"
-        mock_write.return_value = False  # 書き込み失敗
+        mock_load_csv.return_value = "mock_dataframe_with_date"
+        mock_write.side_effect = ExcelFileLockedError("Excelファイルが開かれています")  # 書き込み失敗
 
         # 関数実行
         transfer_csv_to_excel()
 
-        # バックアップや後続処理が呼ばれないことを確認
-        assert not mock_critical.called
+        # エラーメッセージが表示され、後続処理が呼ばれないことを確認
+        mock_critical.assert_called_once()
+        assert mock_critical.call_args[0][2] == "Excelファイルが開かれています"
+        mock_process_csv.assert_not_called()
 
-    @patch('services.csv_excel_transfer.ConfigManager')
-    @patch('services.csv_excel_transfer.ensure_directories_exist')
-    @patch('services.csv_excel_transfer.cleanup_old_csv_files')
-    @patch('services.csv_excel_transfer.find_latest_csv')
+    @patch('services.import_pipeline.ConfigManager')
+    @patch('services.import_pipeline.ensure_directories_exist')
+    @patch('services.import_pipeline.cleanup_old_csv_files')
+    @patch('services.import_pipeline.find_latest_csv')
     @patch('services.csv_excel_transfer.QMessageBox.critical')
     def test_transfer_csv_to_excel_exception(self, mock_critical, mock_find_csv,
                                              mock_cleanup, mock_ensure_dirs, mock_config_manager, app):
@@ -190,9 +208,9 @@ class TestCsvProcessor:
         
         # 結果確認（除外されていないこと）
         assert len(result_df) == 4  # 全ての行が残る
-        # 処理後は文書名がcol_6_文書名（インデックス3）、医師名がcol_9_医師名（インデックス5）
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        # 処理後は文書名がインデックス3、医師名がインデックス5
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         # スペースとアスタリスクが除去されることを確認
         doc_values = result_df[result_df.columns[doc_col_idx]].to_list()
         doctor_values = result_df[result_df.columns[doctor_col_idx]].to_list()
@@ -219,8 +237,8 @@ class TestCsvProcessor:
         
         # 結果確認（除外文書の行が削除されていること）
         assert len(result_df) == 3
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         assert "除外文書" not in result_df[result_df.columns[doc_col_idx]].to_list()
         assert "除外医師" in result_df[result_df.columns[doctor_col_idx]].to_list()  # 医師は残る
     
@@ -241,8 +259,8 @@ class TestCsvProcessor:
         
         # 結果確認（除外医師の行が削除されていること）
         assert len(result_df) == 3
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         assert "除外文書" in result_df[result_df.columns[doc_col_idx]].to_list()  # 文書は残る
         assert "除外医師" not in result_df[result_df.columns[doctor_col_idx]].to_list()
     
@@ -263,8 +281,8 @@ class TestCsvProcessor:
         
         # 結果確認（両方の除外条件に該当する行が削除されていること）
         assert len(result_df) == 2
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         assert "除外文書" not in result_df[result_df.columns[doc_col_idx]].to_list()
         assert "除外医師" not in result_df[result_df.columns[doctor_col_idx]].to_list()
     
@@ -285,8 +303,8 @@ class TestCsvProcessor:
         
         # 結果確認（部分一致で除外されていること）
         assert len(result_df) == 3  # "検査結果A"（スペース・*除去後）と"田中医師"の行が除外される
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         doc_list = result_df[result_df.columns[doc_col_idx]].to_list()
         doctor_list = result_df[result_df.columns[doctor_col_idx]].to_list()
         
@@ -312,11 +330,327 @@ class TestCsvProcessor:
         
         # 結果確認（複数の除外条件に該当する行が全て削除されていること）
         assert len(result_df) == 1  # 「処方箋C」と「佐藤医師」の組み合わせも除外される
-        doc_col_idx = 3  # col_6_文書名（元G列）
-        doctor_col_idx = 5  # col_9_医師名（元J列）
+        doc_col_idx = 3  # 文書名（元G列）
+        doctor_col_idx = 5  # 医師名（元J列）
         doc_list = result_df[result_df.columns[doc_col_idx]].to_list()
         doctor_list = result_df[result_df.columns[doctor_col_idx]].to_list()
         
         # 除外条件に該当しない行のみ残っていることを確認
         assert "除外文書" in doc_list
         assert "鈴木医師" in doctor_list
+
+
+    @patch('services.csv_processor.ConfigManager')
+    def test_process_csv_data_many_exclusions(self, mock_config_manager):
+        """大量の除外条件でも1つの条件式で除外されるテスト"""
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = [f"文書{i}" for i in range(500)] + ["診断"]
+        mock_config.get_exclude_doctors.return_value = [f"医師{i}" for i in range(500)] + ["田中"]
+        mock_config_manager.return_value = mock_config
+
+        result_df = process_csv_data(self.create_test_dataframe())
+
+        assert len(result_df) == 2
+        assert result_df[result_df.columns[3]].to_list() == ["処方箋C", "除外文書"]
+
+    def test_compile_exclusion_filter_cached(self):
+        """同じ除外リストでは条件式が再利用されるテスト"""
+        compile_exclusion_filter.cache_clear()
+
+        first = compile_exclusion_filter("doc", ("a", "b"), "doctor", ("c",))
+        second = compile_exclusion_filter("doc", ("a", "b"), "doctor", ("c",))
+
+        assert first is second
+        assert compile_exclusion_filter.cache_info().hits == 1
+        assert compile_exclusion_filter("doc", (), "doctor", ()) is None
+
+    def test_compile_exclusion_filter_null_rows_dropped(self):
+        """文書名が空の行は従来どおり除外されるテスト"""
+        df = pl.DataFrame({"doc": ["検査", None, "処方箋"], "doctor": ["田中", "佐藤", "鈴木"]})
+
+        result_df = df.filter(compile_exclusion_filter("doc", ("検査",), "doctor", ()))
+
+        assert result_df["doc"].to_list() == ["処方箋"]
+
+class TestEncodingDetection:
+    """エンコーディング判定のテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def reset_cache(self):
+        clear_encoding_cache()
+        yield
+        clear_encoding_cache()
+
+    def test_sniff_encoding_utf8_bom(self):
+        """BOM付きUTF-8の判定テスト"""
+        assert sniff_encoding('\ufeff患者ID'.encode('utf-8')) == 'utf-8-sig'
+
+    def test_sniff_encoding_utf8(self):
+        """UTF-8の判定テスト（末尾で途切れた文字を許容）"""
+        sample = '文書名,医師名'.encode('utf-8')
+        assert sniff_encoding(sample) == 'utf-8'
+        assert sniff_encoding(sample[:-1]) == 'utf-8'
+
+    def test_sniff_encoding_shift_jis_and_cp932(self):
+        """Shift-JISとCP932拡張文字の判定テスト"""
+        assert sniff_encoding('文書名,医師名'.encode('shift-jis')) == 'shift-jis'
+        assert sniff_encoding('診断書①,髙橋'.encode('cp932')) == 'cp932'
+
+    def test_sniff_encoding_ascii(self):
+        """ASCIIのみの場合はShift-JISを優先するテスト"""
+        assert sniff_encoding(b'a,b,c') == 'shift-jis'
+
+    @pytest.mark.parametrize('encoding', ['shift-jis', 'cp932', 'utf-8', 'utf-8-sig'])
+    def test_read_csv_with_encoding_single_parse(self, tmp_path, encoding):
+        """判定したエンコーディングで1回だけ読み込むテスト"""
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv', encoding)
+
+        with patch('services.csv_processor.pl.scan_csv', wraps=pl.scan_csv) as mock_read:
+            df = read_csv_with_encoding(csv_path)
+
+        assert df is not None
+        assert df.shape == (2, 11)
+        assert df['患者ID'].to_list() == [1001, 1002]
+        assert mock_read.call_count == 1
+        assert get_fallback_parse_count() == 0
+
+    def test_read_csv_with_encoding_fallback_counted(self, tmp_path):
+        """判定が外れた場合に再読込回数が記録されるテスト"""
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv', 'shift-jis')
+
+        with patch('services.csv_processor.detect_encoding', return_value='utf-8'):
+            df = read_csv_with_encoding(csv_path)
+
+        assert df is not None
+        assert get_fallback_parse_count() == 1
+
+    def test_detect_encoding_cached(self, tmp_path):
+        """同一ファイルの判定結果がキャッシュされるテスト"""
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv', 'shift-jis')
+
+        with patch('services.csv_processor.sniff_encoding', wraps=sniff_encoding) as mock_sniff:
+            assert detect_encoding(csv_path) == 'shift-jis'
+            assert detect_encoding(csv_path) == 'shift-jis'
+
+        assert mock_sniff.call_count == 1
+
+
+class TestLoadProcessedCsv:
+    """読み込みから日付変換までを1つのクエリプランで行う処理のテストクラス"""
+
+    @patch('services.csv_processor.ConfigManager')
+    def test_load_processed_csv_matches_eager_steps(self, mock_config_manager, tmp_path):
+        """個別の処理を順に実行した結果と一致するテスト"""
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = ["佐藤"]
+        mock_config_manager.return_value = mock_config
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv')
+
+        result_df = load_processed_csv(csv_path)
+
+        df = read_csv_with_encoding(csv_path)
+        assert df is not None
+        expected_df = convert_date_format(process_csv_data(df))
+        assert result_df is not None
+        assert result_df.equals(expected_df)
+        assert result_df.columns == expected_df.columns
+        assert result_df.schema[result_df.columns[0]] == pl.Date
+        assert result_df[result_df.columns[3]].to_list() == ["診断書"]
+
+    @patch('services.csv_processor.ConfigManager')
+    def test_load_processed_csv_invalid_date(self, mock_config_manager, tmp_path):
+        """日付変換に失敗しても文字列のまま処理を継続するテスト"""
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = []
+        mock_config_manager.return_value = mock_config
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv')
+        Path(csv_path).write_bytes(Path(csv_path).read_bytes().replace(b'20250102', b'2025/1/2'))
+
+        result_df = load_processed_csv(csv_path)
+
+        assert result_df is not None
+        assert result_df[result_df.columns[0]].to_list() == ["20250101", "2025/1/2"]
+
+
+class TestBatchImport:
+    """未処理CSVの一括読み込みのテストクラス"""
+
+    def test_find_pending_csvs(self, tmp_path):
+        """命名規則に合うCSVファイルのみを古い順に取得するテスト"""
+        newer = write_papyrus_csv(tmp_path / '0001_20250102120000.csv')
+        older = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+        write_papyrus_csv(tmp_path / 'other.csv')
+        os.utime(older, (1_000_000, 1_000_000))
+        os.utime(newer, (2_000_000, 2_000_000))
+
+        assert find_pending_csvs(str(tmp_path)) == [older, newer]
+
+    @pytest.mark.parametrize('threshold_mb, pooled', [(50, False), (0, True)])
+    @patch('services.csv_processor.ConfigManager')
+    @patch('services.csv_processor.ProcessPoolExecutor')
+    def test_load_processed_csvs(self, mock_executor, mock_config_manager, tmp_path, threshold_mb, pooled):
+        """合計サイズが閾値以上の場合のみプールで読み込み、失敗したファイルはNoneになるテスト"""
+        mock_executor.side_effect = lambda max_workers, mp_context: ThreadPoolExecutor(max_workers)
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = []
+        mock_config.get_parallel_load_threshold_mb.return_value = threshold_mb
+        mock_config_manager.return_value = mock_config
+        first = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+        broken = str(tmp_path / '0001_20250102120000.csv')
+        Path(broken).write_bytes(b'only-one-column')
+
+        results = load_processed_csvs([first, broken])
+
+        assert mock_executor.called is pooled
+        assert [path for path, _ in results] == [first, broken]
+        assert results[0][1] is not None and len(results[0][1]) == 2
+        assert results[1][1] is None
+
+    def test_worker_module_does_not_import_qt(self):
+        """プロセスプールの子プロセスが読み込むモジュールはQtを読み込まないテスト"""
+        code = "import sys, services.csv_processor; sys.exit('PyQt6' in sys.modules)"
+        result = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent.parent)
+
+        assert result.returncode == 0
+
+    def test_combine_processed_frames(self):
+        """前のファイルと重複する行のみが除去され、同じファイル内の重複は残るテスト"""
+        first = pl.DataFrame({"a": ["1", "2", "2"], "b": ["x", "y", "y"]})
+        second = pl.DataFrame({"a": ["2", "3", "3", None], "b": ["y", "z", "z", None]})
+        third = pl.DataFrame({"a": [None, "4"], "b": [None, "w"]})
+
+        result_df = combine_processed_frames([first, second, third])
+
+        assert result_df["a"].to_list() == ["1", "2", "2", "3", "3", None, "4"]
+
+
+class TestFindLatestCsv:
+    """最新CSVファイルの検索のテストクラス"""
+
+    @pytest.fixture(autouse=True)
+    def reset_index(self):
+        clear_csv_index()
+        yield
+        clear_csv_index()
+
+    def test_find_latest_csv_by_file_name(self, tmp_path):
+        """更新時刻ではなくファイル名のタイムスタンプで最新を判定するテスト"""
+        latest = tmp_path / '0001_20250102120000.csv'
+        older = tmp_path / '0002_20250101120000.csv'
+        latest.write_bytes(b'data')
+        older.write_bytes(b'data')
+        (tmp_path / '0001_2025010212000.csv').write_bytes(b'data')  # 桁数不足
+        (tmp_path / '000001_20250103120000.csv').write_bytes(b'data')  # 職員IDが長すぎる
+        (tmp_path / 'memo_20250103120000.txt').write_bytes(b'data')
+        os.utime(older, (3_000_000, 3_000_000))
+        os.utime(latest, (1_000_000, 1_000_000))
+
+        with patch('services.csv_processor.Path.stat', wraps=Path.stat, autospec=True) as mock_stat:
+            assert find_latest_csv(str(tmp_path)) == str(latest)
+
+        assert mock_stat.call_count == 0
+
+    def test_find_latest_csv_tie_break_by_mtime(self, tmp_path):
+        """タイムスタンプが同じ場合は更新時刻で判定するテスト"""
+        first = tmp_path / '0001_20250101120000.csv'
+        second = tmp_path / '0002_20250101120000.csv'
+        first.write_bytes(b'data')
+        second.write_bytes(b'data')
+        os.utime(first, (2_000_000, 2_000_000))
+        os.utime(second, (1_000_000, 1_000_000))
+
+        assert find_latest_csv(str(tmp_path)) == str(first)
+
+    def test_find_latest_csv_not_found(self, tmp_path):
+        """該当するCSVファイルがない場合のテスト"""
+        (tmp_path / 'other.csv').write_bytes(b'data')
+
+        assert find_latest_csv(str(tmp_path)) is None
+
+    def test_find_latest_csv_reuses_index(self, tmp_path):
+        """フォルダの更新時刻が変わらない間は一覧を再利用するテスト"""
+        (tmp_path / '0001_20250101120000.csv').write_bytes(b'data')
+        os.utime(tmp_path, (1_000_000, 1_000_000))
+
+        with patch('services.csv_processor.os.scandir', wraps=os.scandir) as mock_scandir:
+            find_latest_csv(str(tmp_path))
+            find_latest_csv(str(tmp_path))
+            assert mock_scandir.call_count == 1
+
+            newer = tmp_path / '0001_20250102120000.csv'
+            newer.write_bytes(b'data')
+            os.utime(tmp_path, (2_000_000, 2_000_000))
+            assert find_latest_csv(str(tmp_path)) == str(newer)
+            assert mock_scandir.call_count == 2
+
+    def test_find_latest_csv_recent_folder_not_cached(self, tmp_path):
+        """更新直後のフォルダは一覧をキャッシュしないテスト"""
+        (tmp_path / '0001_20250101120000.csv').write_bytes(b'data')
+
+        with patch('services.csv_processor.os.scandir', wraps=os.scandir) as mock_scandir:
+            find_latest_csv(str(tmp_path))
+            find_latest_csv(str(tmp_path))
+
+        assert mock_scandir.call_count == 2
+
+
+class TestIterProcessedCsvBatches:
+    """分割読み込みのテストクラス"""
+
+    @pytest.mark.parametrize('encoding', ['shift-jis', 'utf-8'])
+    @patch('services.csv_processor.ConfigManager')
+    def test_batches_match_single_read(self, mock_config_manager, tmp_path, encoding):
+        """分割読み込みの結果が一括読み込みと一致し、一時ファイルが残らないテスト"""
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = ["佐藤"]
+        mock_config_manager.return_value = mock_config
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv', encoding)
+        lines = Path(csv_path).read_bytes().split(b'\r\n')
+        Path(csv_path).write_bytes(b'\r\n'.join(lines[:4] + lines[4:6] * 5000) + b'\r\n')
+
+        temp_paths = []
+        original_mkstemp = tempfile.mkstemp
+
+        def mkstemp(*args, **kwargs):
+            fd, path = original_mkstemp(*args, **kwargs)
+            temp_paths.append(path)
+            return fd, path
+
+        with patch('services.csv_processor.tempfile.mkstemp', side_effect=mkstemp):
+            batches = list(iter_processed_csv_batches(csv_path, batch_size=1000))
+
+        assert len(batches) > 1
+        result_df = pl.concat(batches)
+        expected_df = load_processed_csv(csv_path)
+        assert expected_df is not None
+        assert result_df.equals(expected_df)
+        assert len(result_df) == 5000
+        assert len(temp_paths) == (1 if encoding == 'shift-jis' else 0)
+        assert not any(os.path.exists(path) for path in temp_paths)
+
+    def test_unreadable_file(self, tmp_path):
+        """すべてのエンコーディングで読み込めない場合のテスト"""
+        csv_path = tmp_path / 'test.csv'
+        csv_path.write_bytes(b'\x81\xff' * 10)
+
+        with pytest.raises(ValueError):
+            list(iter_processed_csv_batches(str(csv_path)))
+
+    @patch('services.csv_processor.ConfigManager')
+    def test_reads_only_imported_columns(self, mock_config_manager, tmp_path):
+        """取り込まない列は分割読み込みでも展開しないテスト"""
+        mock_config = MagicMock()
+        mock_config.get_exclude_docs.return_value = []
+        mock_config.get_exclude_doctors.return_value = []
+        mock_config_manager.return_value = mock_config
+        csv_path = write_papyrus_csv(tmp_path / 'test.csv', 'utf-8')
+
+        with patch('services.csv_processor.pl.read_csv_batched', wraps=pl.read_csv_batched) as mock_read:
+            batches = list(iter_processed_csv_batches(csv_path))
+
+        assert mock_read.call_args.kwargs['columns'] == [3, 4, 5, 6, 7, 9]
+        assert batches[0].row(0) == (datetime.date(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師')
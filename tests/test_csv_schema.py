@@ -0,0 +1,63 @@
+import polars as pl
+
+from services.csv_schema import CsvColumn, compile_csv_schema, PAPYRUS_SCHEMA
+
+
+class TestCsvSchema:
+    def test_compile_csv_schema(self):
+        """列定義から読み込み時の列名と型が作成されるテスト"""
+        schema = compile_csv_schema((
+            CsvColumn(1, "日付"),
+            CsvColumn(3, "ID", pl.Int64),
+            CsvColumn(2, "名前", normalize=True),
+        ))
+
+        assert schema.names == ["日付", "ID", "名前"]
+        assert schema.new_columns == ("_0", "日付", "名前", "ID")
+        assert schema.schema_overrides == {"ID": pl.Int64}
+        assert schema.column("名前").normalize is True
+
+    def test_select_exprs(self):
+        """列位置で列を選択し、指定列のスペースと*を除去するテスト"""
+        df = pl.DataFrame({"a": ["x"], "b": ["1 2"], "c": ["山田 *太郎　"], "d": ["3"]})
+        schema = compile_csv_schema((
+            CsvColumn(2, "名前", normalize=True),
+            CsvColumn(1, "番号"),
+        ))
+
+        result_df = df.select(schema.select_exprs())
+
+        assert result_df.columns == ["名前", "番号"]
+        assert result_df.row(0) == ("山田太郎", "1 2")
+
+    def test_select_projected_exprs(self):
+        """取り込む列のみを読み込んだ場合は読み込み後の列位置で選択するテスト"""
+        schema = compile_csv_schema((
+            CsvColumn(3, "名前", normalize=True),
+            CsvColumn(1, "番号"),
+        ))
+        df = pl.DataFrame({"番号": ["1 2"], "名前": ["山田 *太郎　"]})
+
+        result_df = df.select(schema.select_exprs(projected=True))
+
+        assert schema.source_indices == [1, 3]
+        assert schema.projected_columns == ["番号", "名前"]
+        assert result_df.columns == ["名前", "番号"]
+        assert result_df.row(0) == ("山田太郎", "1 2")
+
+    def test_papyrus_schema_projection_pushdown(self):
+        """取り込まない列が読み込み時に展開されないテスト"""
+        header = ",".join(f"列{i}" for i in range(11))
+        row = ",".join(str(i) for i in range(11))
+        data = f"前置き1\n前置き2\n前置き3\n{header}\n{row}\n".encode('utf-8')
+        lf = pl.scan_csv(data, skip_rows=3, infer_schema_length=0,
+                         new_columns=list(PAPYRUS_SCHEMA.new_columns),
+                         schema_overrides=PAPYRUS_SCHEMA.schema_overrides)
+
+        plan = lf.select(PAPYRUS_SCHEMA.select_exprs())
+
+        assert "PROJECT 6/11 COLUMNS" in plan.explain()
+        result_df = plan.collect()
+        assert result_df.columns == ["預り日", "患者ID", "患者名", "文書名", "診療科", "医師名"]
+        assert result_df.schema["患者ID"] == pl.Int64
+        assert result_df.row(0) == ("3", 4, "5", "6", "7", "9")
@@ -0,0 +1,141 @@
+import datetime
+import os
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from services.dedup_index import DedupIndex, WorkbookSignature, index_path_for, sheet_checksum
+from services.excel_processor import append_batches_to_workbook
+from tests.conftest import create_test_workbook, make_df, read_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+    (datetime.datetime(2025, 1, 2), 1002, '鈴木花子', '意見書', '外科', '佐藤医師'),
+]
+
+
+@pytest.fixture(autouse=True)
+def without_com_sort():
+    """取り込み後にExcelでソートしない環境（インデックスを使用する）"""
+    with patch('services.excel_processor.COM_AVAILABLE', False):
+        yield
+
+
+class TestDedupIndex:
+    def test_sheet_checksum_changes_with_content(self, tmp_path):
+        """ワークシートの内容が変わった場合のみチェックサムが変わるテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        checksum = sheet_checksum(excel_path)
+        assert sheet_checksum(excel_path) == checksum
+
+        wb = openpyxl.load_workbook(excel_path)
+        wb.active.cell(row=2, column=3).value = '山田次郎'
+        wb.save(excel_path)
+
+        assert sheet_checksum(excel_path) != checksum
+
+    def test_rebuild_and_append(self, tmp_path):
+        """インデックスの作成・追加・有効性の判定のテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        signature = WorkbookSignature.from_file(excel_path)
+        index = DedupIndex(index_path_for(excel_path))
+        try:
+            assert not index.matches(signature)
+
+            index.rebuild([('20250101', '1001', 'a', 'b', 'c', 'd')], signature, last_row=2,
+                          last_key=('20250101', '1001', 'a', 'b', 'c', 'd'))
+            assert index.last_key == ('20250101', '1001', 'a', 'b', 'c', 'd')
+            index.append([('20250102', '1002', 'a', 'b', 'c', 'd'),
+                          ('20250101', '1001', 'a', 'b', 'c', 'd')], signature, last_row=3)
+
+            assert index.matches(signature)
+            assert index.last_row == 3
+            assert index.last_key is None  # 追加時に最終行のキーを指定しない場合は記録しない
+            assert set(index.load_keys()) == {('20250101', '1001', 'a', 'b', 'c', 'd'),
+                                         ('20250102', '1002', 'a', 'b', 'c', 'd')}
+        finally:
+            index.close()
+
+    def test_matches_ignores_mtime_when_content_unchanged(self, tmp_path):
+        """更新時刻のみ変わった場合はインデックスを有効とみなすテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        index = DedupIndex(index_path_for(excel_path))
+        try:
+            index.rebuild([], WorkbookSignature.from_file(excel_path), last_row=3)
+            os.utime(excel_path, ns=(1, 1))
+
+            assert index.matches(WorkbookSignature.from_file(excel_path))
+        finally:
+            index.close()
+
+    def test_open_missing_workbook(self, tmp_path):
+        """Excelファイルがない場合はインデックスを作成しないテスト"""
+        assert DedupIndex.open(str(tmp_path / 'missing.xlsm')) is None
+        assert not index_path_for(str(tmp_path / 'missing.xlsm')).exists()
+
+
+class TestAppendWithIndex:
+    def test_second_import_uses_index(self, tmp_path):
+        """2回目以降の取り込みではワークシートを読まずに重複チェックするテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+
+        first = make_df([('2025-01-01', '1001', '山田太郎', '診断書', '内科', '田中医師'),
+                         ('2025-01-03', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師')])
+        result = append_batches_to_workbook(excel_path, [first])
+        assert result.appended_rows == 1
+        assert index_path_for(excel_path).exists()
+
+        second = make_df([('2025-01-03', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師'),
+                          ('2025-01-04', '1004', '伊藤美咲', '診断書', '内科', '田中医師')])
+        with patch('services.excel_processor._read_existing_keys') as mock_read_keys:
+            result = append_batches_to_workbook(excel_path, [second])
+
+        mock_read_keys.assert_not_called()
+        assert result.appended_rows == 1
+        rows = read_test_workbook(excel_path)
+        assert len(rows) == 4
+        assert rows[-1][1] == 1004
+
+    def test_hand_edit_rebuilds_index(self, tmp_path):
+        """Excelファイルが手動で編集された場合はワークシートから作り直すテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        append_batches_to_workbook(excel_path, [make_df([])])
+
+        # 手動で行を追加
+        wb = openpyxl.load_workbook(excel_path, keep_vba=True)
+        wb.active.append([datetime.datetime(2025, 1, 5), 1005, '中村健太', '診断書', '内科', '田中医師'])
+        wb.save(excel_path)
+
+        df = make_df([('2025-01-05', '1005', '中村健太', '診断書', '内科', '田中医師')])
+        result = append_batches_to_workbook(excel_path, [df])
+
+        assert result.existing_rows == 3
+        assert result.appended_rows == 0
+        assert len(read_test_workbook(excel_path)) == 3
+
+    def test_index_disabled(self, tmp_path):
+        """インデックスを無効にした場合はインデックスを作成しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+
+        with patch('services.excel_processor.ConfigManager') as mock_config_manager:
+            mock_config_manager.return_value.get_dedup_index_enabled.return_value = False
+            mock_config_manager.return_value.get_workbook_cache_enabled.return_value = False
+            append_batches_to_workbook(excel_path, [make_df([])])
+
+        assert not index_path_for(excel_path).exists()
+
+    def test_index_skipped_with_com_sort(self, tmp_path):
+        """取り込み後にExcelでソートする場合はインデックスを作成しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+
+        with patch('services.excel_processor.COM_AVAILABLE', True), \
+                patch('services.excel_processor.ConfigManager') as mock_config_manager:
+            mock_config_manager.return_value.get_dedup_index_enabled.return_value = True
+            mock_config_manager.return_value.get_com_sort_enabled.return_value = True
+            mock_config_manager.return_value.get_workbook_cache_enabled.return_value = False
+            mock_config_manager.return_value.get_excel_writer.return_value = 'openpyxl'
+            mock_config_manager.return_value.get_sorted_insert_enabled.return_value = False
+            append_batches_to_workbook(excel_path, [make_df([])])
+
+        assert not index_path_for(excel_path).exists()
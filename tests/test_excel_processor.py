@@ -2,7 +2,7 @@ import sys
 import pytest
 import datetime
 from pathlib import Path
-from unittest.mock import patch, MagicMock, Mock, call
+from unittest.mock import ANY, patch, MagicMock, Mock, call
 
 import openpyxl
 from openpyxl.styles import Alignment
@@ -10,8 +10,9 @@ from PyQt6.QtWidgets import QApplication, QMessageBox
 
 from services.excel_processor import (
     get_last_row, apply_cell_formats, sort_excel_data,
-    bring_excel_to_front, write_data_to_excel, open_and_sort_excel
+    bring_excel_to_front, write_data_to_excel, write_batches_to_excel, open_and_sort_excel
 )
+from tests.conftest import create_test_workbook, read_test_workbook
 
 
 @pytest.fixture
@@ -54,14 +55,32 @@ def mock_workbook():
 class TestExcelProcessor:
     def test_get_last_row(self, mock_worksheet):
         """get_last_row関数のテスト"""
+        rows = [[cell.value for cell in row] for row in mock_worksheet.iter_rows.return_value]
+        mock_worksheet.max_row = len(rows)
+        mock_worksheet.iter_rows.side_effect = lambda min_row, max_row, values_only: iter([rows[min_row - 1]])
+
         # 関数を実行
         last_row = get_last_row(mock_worksheet)
 
         # 非空の行数を確認（この場合は3行）
         assert last_row == 3
 
-        # モックの呼び出しを確認
-        mock_worksheet.iter_rows.assert_called_once()
+        # 最終行から空の行のみを調べたことを確認
+        assert mock_worksheet.iter_rows.call_count == 2
+
+    def test_get_last_row_trims_trailing_blank_rows(self):
+        """途中の空行を含め、値のある最後の行を取得するテスト"""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["預り日", "患者ID"])
+        ws.append(["2025-01-01", 1001])
+        ws.append([])
+        ws.append(["2025-01-03", 1003])
+        ws.cell(row=10, column=3).alignment = Alignment(horizontal='left')  # 書式のみの行
+
+        assert ws.max_row == 10
+        assert get_last_row(ws) == 4
+        assert get_last_row(openpyxl.Workbook().active) == 0
 
     def test_apply_cell_formats(self, mock_worksheet):
         """apply_cell_formats関数のテスト"""
@@ -80,6 +99,23 @@ class TestExcelProcessor:
             for col in range(1, 7):  # A列からF列まで
                 mock_worksheet.cell.assert_any_call(row=row, column=col)
 
+    def test_apply_cell_formats_shares_alignments(self):
+        """指定した範囲のみに列ごとの配置を設定し、配置のスタイルを共有するテスト"""
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        for i in range(100):
+            ws.append([i] * 6)
+
+        apply_cell_formats(ws, 2, 99)
+
+        assert ws.cell(row=1, column=1).alignment.horizontal is None
+        assert ws.cell(row=100, column=1).alignment.horizontal is None
+        row = [ws.cell(row=50, column=col).alignment for col in range(1, 7)]
+        assert [alignment.horizontal for alignment in row] == ['center', 'center', 'left', 'left', 'center', 'center']
+        assert [alignment.shrink_to_fit for alignment in row] == [None, None, True, True, None, None]
+        # 既定の配置と中央揃え・左揃えの3つのみ
+        assert len(wb._alignments) == 3
+
     @patch('services.excel_processor.win32gui.FindWindow')
     @patch('services.excel_processor.win32gui.SetForegroundWindow')
     @patch('services.excel_processor.time.sleep')
@@ -133,18 +169,21 @@ class TestExcelProcessor:
     @patch('services.excel_processor.load_workbook')
     @patch('services.excel_processor.get_last_row')
     @patch('services.excel_processor.apply_cell_formats')
-    def test_write_data_to_excel_success(self, mock_apply_formats, mock_get_last_row,
+    @patch('services.excel_processor.atomic_write')
+    def test_write_data_to_excel_success(self, mock_atomic_write, mock_apply_formats, mock_get_last_row,
                                          mock_load_workbook, mock_path, app):
         """write_data_to_excel関数の成功ケースのテスト"""
         # モックの設定
         mock_path_instance = MagicMock()
         mock_path_instance.exists.return_value = True
         mock_path.return_value = mock_path_instance
+        mock_atomic_write.return_value.__enter__.return_value = "test.xlsm.tmp"
 
         mock_workbook, mock_worksheet = MagicMock(), MagicMock()
         mock_load_workbook.return_value = mock_workbook
         mock_workbook.active = mock_worksheet
         mock_get_last_row.return_value = 3  # 既存データが3行
+        mock_worksheet.max_row = 3
 
         # 既存データのモック
         cell_values = {
@@ -153,7 +192,8 @@ class TestExcelProcessor:
             (2, 3): "診断書",  # C2: 文書名
             (2, 4): "内科",  # D2: 診療科
             (2, 5): "医師名",  # E2: 医師名
-            (2, 6): "備考"  # F2: 備考
+            (2, 6): "備考",  # F2: 備考
+            (3, 1): datetime.datetime(2023, 1, 15),  # A3: 最終行の日付
         }
 
         def mock_cell(row, column):
@@ -185,12 +225,15 @@ class TestExcelProcessor:
         mock_load_workbook.assert_called_once_with(filename="test.xlsm", keep_vba=True)
         mock_get_last_row.assert_called_once_with(mock_worksheet)
 
-        # 新規データのみが書き込まれることを確認（2行目のみ）
-        assert mock_worksheet.cell.call_count >= 6  # 少なくとも新規データの列数分
-        mock_worksheet.cell.assert_any_call(row=4, column=1)  # 新規データ行
+        # 新規データのみが型変換されて最終行の後にまとめて追加されることを確認（2行目のみ）
+        mock_worksheet.append.assert_called_once()
+        cells = mock_worksheet.append.call_args.args[0]
+        assert [cell.value for cell in cells] == [
+            datetime.datetime(2023, 2, 1), 67890, "処方箋", "外科", "別の医師", "新規備考"]
 
-        # 保存が呼ばれることを確認
-        mock_workbook.save.assert_called_once_with("test.xlsm")
+        # 一時ファイルに保存してから置き換えることを確認
+        mock_atomic_write.assert_called_once_with("test.xlsm")
+        mock_workbook.save.assert_called_once_with("test.xlsm.tmp")
         mock_workbook.close.assert_called_once()
 
     @patch('services.excel_processor.Path')
@@ -295,8 +338,242 @@ class TestExcelProcessor:
         # ウィンドウを最小化
         mock_hotkey.assert_called_once_with('win', 'down')
 
+    @patch('services.excel_processor.win32com.client.Dispatch')
+    @patch('services.excel_processor.bring_excel_to_front')
+    @patch('services.excel_processor.sort_excel_data')
+    @patch('services.excel_processor.ConfigManager')
+    @patch('services.excel_processor.time.sleep')
+    @patch('services.excel_processor.pyautogui.click')
+    @patch('services.excel_processor.pyautogui.hotkey')
+    def test_open_and_sort_excel_without_com_sort(self, mock_hotkey, mock_click, mock_sleep,
+                                                  mock_config_manager, mock_sort, mock_bring_front,
+                                                  mock_dispatch, tmp_path):
+        """Excelでのソートを無効にした場合はソートせずに共有ボタンをクリックするテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', [])
+        mock_config = mock_config_manager.return_value
+        mock_config.get_com_sort_enabled.return_value = False
+        mock_config.get_share_button_wait_time.return_value = 1
+        mock_config.get_share_button_position.return_value = (100, 200)
+
+        open_and_sort_excel(excel_path)
+
+        mock_sort.assert_not_called()
+        mock_click.assert_called_once_with(100, 200)
+
     def test_sort_excel_data(self):
         """sort_excel_data関数のテスト"""
         # こちらはwin32comに強く依存しており、モックの構築が複雑なため省略
         # 実際の環境では、この関数は他の関数からの呼び出しでテストされることになります
         pass
+
+    def test_write_batches_to_excel(self, tmp_path, app):
+        """複数のバッチを既存データと重複排除して順に書き込み、1回で保存するテスト"""
+        import polars as pl
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, "山田", "診断書", "内科", "田中医師"),
+        ])
+        df = pl.DataFrame({
+            "預り日": [datetime.date(2025, 1, 1), datetime.date(2025, 1, 2), datetime.date(2025, 1, 3)],
+            "患者ID": [1001, 1002, 1003],
+            "患者名": ["山田", "鈴木", "佐藤"],
+            "文書名": ["診断書", "紹介状", "診断書"],
+            "診療科": ["内科", "外科", "内科"],
+            "医師名": ["田中医師", "佐藤医師", "田中医師"],
+        })
+
+        with patch('services.excel_processor.load_workbook', wraps=openpyxl.load_workbook) as mock_load:
+            result = write_batches_to_excel(excel_path, iter([df[:2], df[2:]]))
+
+        assert result is True
+        assert mock_load.call_count == 1
+        assert read_test_workbook(excel_path) == [
+            (datetime.datetime(2025, 1, 1), 1001, "山田", "診断書", "内科", "田中医師"),
+            (datetime.datetime(2025, 1, 2), 1002, "鈴木", "紹介状", "外科", "佐藤医師"),
+            (datetime.datetime(2025, 1, 3), 1003, "佐藤", "診断書", "内科", "田中医師"),
+        ]
+
+    def test_write_batches_without_buffering(self, tmp_path, app):
+        """並べ替えて挿入しない場合は次のバッチを読み込む前に書き込むテスト"""
+        import polars as pl
+        from services.excel_processor import _OpenpyxlWriter
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, "山田", "診断書", "内科", "田中医師"),
+        ])
+        df = pl.DataFrame({
+            "預り日": [datetime.date(2025, 1, 3), datetime.date(2025, 1, 2)],
+            "患者ID": [1003, 1002],
+            "患者名": ["佐藤", "鈴木"],
+            "文書名": ["診断書", "紹介状"],
+            "診療科": ["内科", "外科"],
+            "医師名": ["田中医師", "佐藤医師"],
+        })
+        written = []
+
+        def batches():
+            yield df[:1]
+            written.append(list(write_rows.call_args_list))
+            yield df[1:]
+
+        with patch('services.excel_processor.ConfigManager.get_sorted_insert_enabled', return_value=False), \
+                patch.object(_OpenpyxlWriter, 'write_rows', autospec=True,
+                             side_effect=_OpenpyxlWriter.write_rows) as write_rows:
+            write_batches_to_excel(excel_path, batches())
+
+        assert [call.args[2] for call in written[0]] == [3]
+        assert [call.args[2] for call in write_rows.call_args_list] == [3, 4]
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1001, 1003, 1002]
+
+    def test_filter_new_rows(self):
+        """既存データと一致する行を除き、元の順序でキーとあわせて返すテスト"""
+        import polars as pl
+        from services.excel_processor import _filter_new_rows, _keys_frame
+        df = pl.DataFrame({
+            "預り日": ["2025-01-01", "2025-01-02", None, "2025/01/03", "2025-01-02", "2025-1-4"],
+            "患者ID": ["1001", "1002", "1003", None, "1002", "1004"],
+            "患者名": ["山田", "鈴木", "佐藤", "高橋", "鈴木", ""],
+            "文書名": ["診断書", "紹介状", "診断書", "意見書", "紹介状", "診断書"],
+            "診療科": ["内科", "外科", "内科", "眼科", "外科", "内科"],
+            "医師名": ["田中医師", "佐藤医師", "田中医師", "伊藤医師", "佐藤医師", None],
+        })
+        existing = _keys_frame([
+            ("20250101", "1001", "山田", "診断書", "内科", "田中医師"),
+            ("None", "1003", "佐藤", "診断書", "内科", "田中医師"),
+        ])
+
+        unique_data, unique_keys = _filter_new_rows(df, existing)
+
+        # 取り込むデータ内の重複は除かない。預り日・患者IDは型変換して返す
+        assert unique_data == [
+            (datetime.datetime(2025, 1, 2), 1002, "鈴木", "紹介状", "外科", "佐藤医師"),
+            ("2025/01/03", None, "高橋", "意見書", "眼科", "伊藤医師"),
+            (datetime.datetime(2025, 1, 2), 1002, "鈴木", "紹介状", "外科", "佐藤医師"),
+            (datetime.datetime(2025, 1, 4), 1004, "", "診断書", "内科", ""),
+        ]
+        assert unique_keys == [
+            ("20250102", "1002", "鈴木", "紹介状", "外科", "佐藤医師"),
+            ("2025/01/03", "", "高橋", "意見書", "眼科", "伊藤医師"),
+            ("20250102", "1002", "鈴木", "紹介状", "外科", "佐藤医師"),
+            ("20250104", "1004", "", "診断書", "内科", ""),
+        ]
+
+    def test_typed_rows(self):
+        """預り日・患者IDを列ごとに型変換し、変換できない値は1つずつ変換を試みるテスト"""
+        import polars as pl
+        from services.excel_processor import _typed_rows
+        typed = pl.DataFrame({
+            "預り日": [datetime.date(2025, 1, 1), None],
+            "患者ID": [1001, None],
+            "患者名": ["山田", None],
+        })
+        text = pl.DataFrame({
+            "預り日": [" 2025-01-02", "2025-01- 3", "不明"],
+            "患者ID": ["1,002", " 1003 ", "99999999999999999999"],
+            "患者名": ["鈴木", "佐藤", "高橋"],
+        })
+
+        assert _typed_rows(typed) == [
+            (datetime.datetime(2025, 1, 1), 1001, "山田"),
+            (None, None, ""),
+        ]
+        # datetime.strptime・intと同じ結果になる（変換できない場合は文字列のまま）
+        assert _typed_rows(text) == [
+            (" 2025-01-02", 1002, "鈴木"),
+            (datetime.datetime(2025, 1, 3), 1003, "佐藤"),
+            ("不明", 99999999999999999999, "高橋"),
+        ]
+
+    def test_append_after_blank_row(self, tmp_path):
+        """空行の後にデータがある場合は最後の行の次に追記し、追記した行のみ書式を設定するテスト"""
+        import polars as pl
+        from services.excel_processor import append_batches_to_workbook
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, "山田", "診断書", "内科", "田中医師"),
+            (),
+            (datetime.datetime(2025, 1, 3), 1003, "佐藤", "診断書", "内科", "田中医師"),
+        ])
+        df = pl.DataFrame([("2025-01-04", "1004", "鈴木", "紹介状", "外科", "佐藤医師")],
+                          schema=["預り日", "患者ID", "患者名", "文書名", "診療科", "医師名"], orient='row')
+
+        with patch('services.excel_processor.apply_cell_formats', wraps=apply_cell_formats) as mock_formats:
+            result = append_batches_to_workbook(excel_path, [df])
+
+        assert result.existing_rows == 3
+        mock_formats.assert_called_once_with(ANY, 5, 5)
+        rows = read_test_workbook(excel_path)
+        assert rows[1] == (None,) * 6
+        assert rows[2][1] == 1003
+        assert rows[3] == (datetime.datetime(2025, 1, 4), 1004, "鈴木", "紹介状", "外科", "佐藤医師")
+
+    def test_insert_sorted_rows(self, tmp_path):
+        """新規データを預り日・診療科・患者IDの順に既存データの間へ挿入するテスト"""
+        import polars as pl
+        from services.excel_processor import append_batches_to_workbook
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, "山田", "診断書", "内科", "田中医師"),
+            (datetime.datetime(2025, 1, 3), 1003, "佐藤", "診断書", "内科", "田中医師", None, "済"),
+        ])
+        wb = openpyxl.load_workbook(excel_path)
+        wb.active['H3'].number_format = '@'
+        wb.save(excel_path)
+        df = pl.DataFrame([
+            ("2025-01-05", "1005", "伊藤", "意見書", "眼科", "伊藤医師"),
+            ("2025-01-03", "1,002", "鈴木", "紹介状", "内科", "佐藤医師"),
+            ("2025-01-02", "1004", "高橋", "診断書", "内科", "田中医師"),
+        ], schema=["預り日", "患者ID", "患者名", "文書名", "診療科", "医師名"], orient='row')
+
+        with patch('services.excel_processor._sorted_insert_enabled', return_value=True), \
+                patch('services.excel_processor.apply_cell_formats', wraps=apply_cell_formats) as mock_formats:
+            result = append_batches_to_workbook(excel_path, [df], engine='openpyxl')
+
+        assert result.appended_rows == 3
+        assert [call.args[1:] for call in mock_formats.call_args_list] == [(3, 4), (6, 6)]
+        wb = openpyxl.load_workbook(excel_path)
+        ws = wb.active
+        rows = [row for row in ws.iter_rows(min_row=2, values_only=True)]
+        assert [(row[0].day, row[1], row[7]) for row in rows] == [
+            (1, 1001, None), (2, 1004, None), (3, 1002, None), (3, 1003, "済"), (5, 1005, None),
+        ]
+        # 移動した既存の行は書式も移動し、挿入した行は書式を設定し直す
+        assert ws['H5'].number_format == '@'
+        assert ws['H4'].number_format == 'General'
+        assert ws['A4'].number_format == 'yyyy/mm/dd'
+        assert ws['C4'].alignment.shrink_to_fit is True
+        wb.close()
+
+    def test_sorted_insert_skipped_with_com_sort(self):
+        """取り込み後にExcelでソートする場合は並べ替えて挿入しないテスト"""
+        from services.excel_processor import _sorted_insert_enabled
+        config = MagicMock()
+        config.get_sorted_insert_enabled.return_value = True
+        config.get_com_sort_enabled.return_value = True
+
+        with patch('services.excel_processor.COM_AVAILABLE', True):
+            assert _sorted_insert_enabled(config) is False
+            config.get_com_sort_enabled.return_value = False
+            assert _sorted_insert_enabled(config) is True
+        config.get_com_sort_enabled.return_value = True
+        with patch('services.excel_processor.COM_AVAILABLE', False):
+            assert _sorted_insert_enabled(config) is True
+
+    def test_sort_key(self):
+        """Excelの昇順ソートと同様に数値・文字列・空白の順に並べるテスト"""
+        from services.excel_processor import _sort_key
+        keys = [
+            ("", "1001", "", "", "内科", ""),
+            ("不明", "1001", "", "", "内科", ""),
+            ("20250102", "", "", "", "内科", ""),
+            ("20250102", "ABC", "", "", "内科", ""),
+            ("20250102", "1,002", "", "", "内科", ""),
+            ("20250102", "999", "", "", "", ""),
+            ("20250101", "1003", "", "", "眼科", ""),
+        ]
+
+        assert sorted(keys, key=_sort_key) == [
+            ("20250101", "1003", "", "", "眼科", ""),
+            ("20250102", "1,002", "", "", "内科", ""),
+            ("20250102", "ABC", "", "", "内科", ""),
+            ("20250102", "", "", "", "内科", ""),
+            ("20250102", "999", "", "", "", ""),
+            ("不明", "1001", "", "", "内科", ""),
+            ("", "1001", "", "", "内科", ""),
+        ]
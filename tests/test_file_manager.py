@@ -1,17 +1,30 @@
+import os
 import sys
+import time
 import pytest
 import datetime
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from services.file_manager import backup_excel_file, cleanup_old_csv_files, ensure_directories_exist
+from services.file_manager import backup_excel_file, cleanup_old_csv_files, ensure_directories_exist, open_csv_manifest
+
+DAY = 24 * 60 * 60
+
+
+def write_file(path, mtime):
+    """更新日時を指定してファイルを作成"""
+    path.write_text('a', encoding='utf-8')
+    os.utime(path, (mtime, mtime))
+    return path
 
 
 class TestFileManager:
+    @patch('services.file_manager.open_backup_manifest')
+    @patch('services.file_manager.fsync_file')
     @patch('services.file_manager.shutil.copy2')
     @patch('services.file_manager.Path')
     @patch('services.file_manager.ConfigManager')
-    def test_backup_excel_file(self, mock_config_manager, mock_path, mock_copy2):
+    def test_backup_excel_file(self, mock_config_manager, mock_path, mock_copy2, mock_fsync, mock_manifest):
         """バックアップファイル作成機能のテスト"""
         # ConfigManagerのモック設定
         mock_config = MagicMock()
@@ -48,10 +61,20 @@ class TestFileManager:
         assert args[0] == 'C:/Excel/test.xlsm'  # コピー元
         assert args[1] == backup_path  # コピー先
 
+        # コピーしたファイルをディスクに反映したことを確認
+        mock_fsync.assert_called_once_with(backup_path)
+
+        # 保持期間の索引に記録したことを確認
+        mock_manifest.assert_called_once_with(mock_backup_dir)
+        mock_manifest.return_value.add.assert_called_once_with(backup_path)
+
+    @patch('services.file_manager.open_backup_manifest')
+    @patch('services.file_manager.fsync_file')
     @patch('services.file_manager.shutil.copy2')
     @patch('services.file_manager.Path')
     @patch('services.file_manager.ConfigManager')
-    def test_backup_excel_file_create_dir(self, mock_config_manager, mock_path, mock_copy2):
+    def test_backup_excel_file_create_dir(self, mock_config_manager, mock_path, mock_copy2, mock_fsync,
+                                          mock_manifest):
         """バックアップディレクトリが存在しない場合のテスト"""
         # ConfigManagerのモック設定
         mock_config = MagicMock()
@@ -78,68 +101,46 @@ class TestFileManager:
         mock_copy2.assert_called_once()
 
     @patch('services.file_manager.ConfigManager')
-    @patch('services.file_manager.datetime.datetime')
-    def test_cleanup_old_csv_files(self, mock_dt, mock_config_manager):
-        """古いCSVファイルの削除テスト"""
+    def test_cleanup_old_csv_files(self, mock_config_manager, tmp_path):
+        """古いCSVファイルの削除テスト（初回はフォルダを確認して索引を作成）"""
         # ConfigManagerのモック設定（保持期間14日）
         mock_config = MagicMock()
         mock_config.get_backup_retention_days.return_value = 14
+        mock_config.get_retention_reconcile_hours.return_value = 24
         mock_config_manager.return_value = mock_config
 
-        # 現在時刻を固定
-        current_time = MagicMock()
-        current_time.now = MagicMock(return_value=current_time)
-        mock_dt.now.return_value = current_time
-
-        # モックディレクトリと3つのファイル
-        processed_dir = MagicMock(spec=Path)
-
-        file1 = MagicMock()  # 新しいファイル
-        file2 = MagicMock()  # 古いファイル
-        file3 = MagicMock()  # 非CSVファイル
-
-        file1.suffix = '.csv'
-        file2.suffix = '.csv'
-        file3.suffix = '.txt'
-
-        # glob()がCSVファイルだけを返すように設定（実際の動作に合わせる）
-        processed_dir.glob.return_value = [file1, file2]
-
-        # fromtimestampメソッドをモック
-        file1_time = MagicMock()
-        file2_time = MagicMock()
-
-        # 日付比較の結果を設定
-        diff1 = MagicMock()
-        diff1.days = 10  # 10日前（削除しない）
-
-        diff2 = MagicMock()
-        diff2.days = 15  # 15日前（削除する - 保持期間14日以上）
-
-        # 引数に応じて異なる日付オブジェクトを返す
-        def from_timestamp_side_effect(timestamp):
-            if timestamp is file1.stat().st_mtime:
-                return file1_time
-            elif timestamp is file2.stat().st_mtime:
-                return file2_time
-            return MagicMock()
-
-        mock_dt.fromtimestamp.side_effect = from_timestamp_side_effect
-
-        # 日付の差分計算結果を設定
-        current_time.__sub__.side_effect = lambda other: diff1 if other is file1_time else diff2
+        # 新しいCSV・古いCSV・CSV以外のファイル
+        now = time.time()
+        file1 = write_file(tmp_path / 'new.csv', now - 10 * DAY)
+        file2 = write_file(tmp_path / 'old.csv', now - 15 * DAY)
+        file3 = write_file(tmp_path / 'old.txt', now - 15 * DAY)
 
         # 関数を実行
-        cleanup_old_csv_files(processed_dir)
+        cleanup_old_csv_files(tmp_path)
 
-        # ConfigManagerが呼ばれたことを確認
-        mock_config_manager.assert_called_once()
+        # 古いCSVファイル（14日以上前）のみが削除されることを確認
         mock_config.get_backup_retention_days.assert_called_once()
+        assert file1.exists()  # 新しいファイルは削除されない
+        assert not file2.exists()  # 古いファイルは削除される
+        assert file3.exists()  # 非CSVファイルは削除されない
 
-        # 古いCSVファイル（14日以上前）のみが削除されることを確認
-        file1.unlink.assert_not_called()  # 新しいファイルは削除されない
-        file2.unlink.assert_called_once()  # 古いファイルは削除される
-        file3.unlink.assert_not_called()  # 非CSVファイルは削除されない
+    @patch('services.file_manager.ConfigManager')
+    def test_cleanup_old_csv_files_from_manifest(self, mock_config_manager, tmp_path):
+        """照合後はフォルダを確認せずに索引から古いファイルを削除するテスト"""
+        mock_config = MagicMock()
+        mock_config.get_backup_retention_days.return_value = 14
+        mock_config.get_retention_reconcile_hours.return_value = 24
+        mock_config_manager.return_value = mock_config
+        cleanup_old_csv_files(tmp_path)
+        manifest = open_csv_manifest(tmp_path)
+        manifest.add(write_file(tmp_path / 'old.csv', time.time() - 15 * DAY))
+
+        with patch('services.file_manager.scan_files') as mock_scan:
+            cleanup_old_csv_files(tmp_path)
+
+        mock_scan.assert_not_called()
+        assert not (tmp_path / 'old.csv').exists()
+        assert open_csv_manifest(tmp_path).entries() == []
 
     @patch('services.file_manager.ConfigManager')
     def test_ensure_directories_exist(self, mock_config_manager):
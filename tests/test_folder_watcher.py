@@ -0,0 +1,90 @@
+import threading
+import time
+
+from services.folder_watcher import FolderWatcher
+
+
+def make_watcher(tmp_path, handler=None, **kwargs):
+    """テスト用の短い待機時間を設定したFolderWatcherを作成"""
+    options = {'stable_seconds': 1.0, 'debounce_seconds': 2.0, 'poll_interval': 0.05}
+    options.update(kwargs)
+    return FolderWatcher(str(tmp_path), handler or (lambda paths: None), **options)
+
+
+class TestFolderWatcher:
+    def test_update_waits_until_file_is_stable(self, tmp_path):
+        """サイズと更新時刻が変化しなくなるまで取り込まないテスト"""
+        watcher = make_watcher(tmp_path)
+        name = '0001_20250101120000.csv'
+
+        watcher._update({name: (10, 1)}, now=0.0)
+        watcher._update({name: (20, 2)}, now=0.5)  # 書き込み中
+        watcher._update({name: (20, 2)}, now=1.0)
+        assert watcher._batch == []
+
+        watcher._update({name: (20, 2)}, now=1.6)
+        assert watcher._batch == [str(tmp_path / name)]
+        assert watcher._queue.empty()  # 続けて出力されるファイルを待つ
+
+        watcher._update({name: (20, 2)}, now=3.6)
+        assert watcher._queue.get_nowait() == [str(tmp_path / name)]
+
+    def test_update_coalesces_burst(self, tmp_path):
+        """続けて出力されたファイルを1回の取り込みにまとめるテスト"""
+        watcher = make_watcher(tmp_path)
+        first = '0001_20250101120000.csv'
+        second = '0001_20250101120500.csv'
+
+        watcher._update({first: (10, 1)}, now=0.0)
+        watcher._update({first: (10, 1)}, now=1.0)
+        watcher._update({first: (10, 1), second: (5, 1)}, now=1.5)
+        watcher._update({first: (10, 1), second: (5, 1)}, now=2.5)
+        watcher._update({first: (10, 1), second: (5, 1)}, now=4.5)
+
+        assert watcher._queue.get_nowait() == [str(tmp_path / first), str(tmp_path / second)]
+        assert watcher._queue.empty()
+
+    def test_update_skips_delivered_and_empty_files(self, tmp_path):
+        """取り込み済みのファイルと空のファイルは対象外とするテスト"""
+        watcher = make_watcher(tmp_path)
+        delivered = '0001_20250101120000.csv'
+        empty = '0001_20250101120500.csv'
+        watcher._delivered[delivered] = (10, 1)
+
+        watcher._update({delivered: (10, 1), empty: (0, 1)}, now=0.0)
+        watcher._update({delivered: (10, 1), empty: (0, 1)}, now=5.0)
+
+        assert watcher._batch == []
+        assert list(watcher._tracked) == [empty]
+
+    def test_scan_filters_by_name(self, tmp_path):
+        """命名規則に合うCSVファイルのみを確認するテスト"""
+        (tmp_path / '0001_20250101120000.csv').write_bytes(b'data')
+        (tmp_path / 'other.csv').write_bytes(b'data')
+        (tmp_path / '0001_20250101120000.txt').write_bytes(b'data')
+
+        files = make_watcher(tmp_path)._scan()
+
+        assert list(files) == ['0001_20250101120000.csv']
+        assert files['0001_20250101120000.csv'][0] == 4
+
+    def test_start_and_stop(self, tmp_path):
+        """新しく出力されたファイルのみを取り込み処理に渡すテスト"""
+        (tmp_path / '0001_20250101110000.csv').write_bytes(b'existing')
+        received = []
+        done = threading.Event()
+
+        def handler(paths):
+            received.append(paths)
+            done.set()
+
+        watcher = make_watcher(tmp_path, handler, stable_seconds=0.1, debounce_seconds=0.1)
+        watcher.start()
+        try:
+            time.sleep(0.1)
+            (tmp_path / '0001_20250101120000.csv').write_bytes(b'new data')
+            assert done.wait(5)
+        finally:
+            watcher.stop(timeout=5)
+
+        assert received == [[str(tmp_path / '0001_20250101120000.csv')]]
@@ -0,0 +1,165 @@
+import datetime
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from services.dedup_index import DedupIndex, index_path_for
+from services.excel_processor import append_batches_to_workbook, undo_pending_import
+from services.import_journal import (
+    STAGE_BEGIN,
+    STAGE_MOVE,
+    STAGE_SAVE,
+    ImportJournal,
+    journal_path_for,
+    resume_pending_import
+)
+from services.workbook_cache import workbook_cache
+from tests.conftest import create_test_workbook, make_df, read_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+    (datetime.datetime(2025, 1, 3), 1003, '高橋一郎', '紹介状', '眼科', '伊藤医師', None, '済'),
+]
+INCOMING = [
+    ('2025-01-05', '1005', '伊藤美咲', '診断書', '内科', '田中医師'),
+    ('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師'),
+]
+
+
+@pytest.fixture(autouse=True)
+def sorted_insert():
+    """新規データを並べ替えて挿入し、インデックスを使用する（取り消しで移動した行とインデックスを戻す処理を確認するため）"""
+    with patch('services.excel_processor._sorted_insert_enabled', return_value=True), \
+            patch('services.excel_processor._dedup_index_enabled', return_value=True):
+        yield
+
+
+def interrupted_import(excel_path, csv_path='0001_20250101120000.csv'):
+    """保存後（CSVファイルの移動前）に中断した取り込みを再現"""
+    journal = ImportJournal(excel_path)
+    journal.begin([csv_path])
+    append_batches_to_workbook(excel_path, [make_df(INCOMING)], engine='openpyxl', journal=journal)
+    return journal
+
+
+class TestImportJournal:
+    def test_pending(self, tmp_path):
+        """保存した行を範囲にまとめて記録し、完了していない取り込みとして取得するテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        journal = interrupted_import(excel_path)
+        with open(journal_path_for(excel_path), 'a', encoding='utf-8') as f:
+            f.write(f'{{"id": "{journal.import_id}"}}\n')
+            f.write('{"id": "書き込み途中')
+
+        entry = ImportJournal(excel_path).pending()
+
+        assert entry is not None
+        assert entry.saved
+        assert entry.completed == [STAGE_BEGIN, STAGE_SAVE]
+        assert entry.csv_paths == ['0001_20250101120000.csv']
+        assert entry.first_row == 3
+        assert entry.inserted_rows == [3, 5]
+        assert entry.last_row == 5
+
+    def test_complete(self, tmp_path):
+        """完了した取り込みは記録を残さないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        journal = interrupted_import(excel_path)
+
+        journal.record(STAGE_MOVE)
+        journal.complete()
+
+        assert ImportJournal(excel_path).pending() is None
+        assert journal_path_for(excel_path).read_text(encoding='utf-8') == ''
+
+    @patch('services.import_journal.backup_excel_file')
+    @patch('services.import_journal.process_completed_csv')
+    def test_resume_after_save(self, mock_process_csv, mock_backup, tmp_path):
+        """保存後に中断した場合はExcelファイルを読み込まずに移動とバックアップを行うテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        interrupted_import(excel_path)
+
+        with patch('services.excel_processor.load_workbook') as mock_load:
+            entry = resume_pending_import(ImportJournal(excel_path))
+
+        assert entry is not None
+        mock_load.assert_not_called()
+        mock_process_csv.assert_called_once_with('0001_20250101120000.csv')
+        mock_backup.assert_called_once_with(excel_path)
+        assert ImportJournal(excel_path).pending() is None
+
+    @patch('services.import_journal.backup_excel_file')
+    @patch('services.import_journal.process_completed_csv')
+    def test_resume_before_save(self, mock_process_csv, mock_backup, tmp_path):
+        """保存前に中断した場合は記録を破棄して最初から取り込むテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        ImportJournal(excel_path).begin(['0001_20250101120000.csv'])
+
+        assert resume_pending_import(ImportJournal(excel_path)) is None
+
+        mock_process_csv.assert_not_called()
+        assert ImportJournal(excel_path).pending() is None
+
+
+class TestUndoPendingImport:
+    def test_undo_sorted_insert(self, tmp_path):
+        """挿入した行のみを削除し、移動した既存の行とインデックスを元に戻すテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        before = read_test_workbook(excel_path)
+        interrupted_import(excel_path)
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1001, 1002, 1003, 1005]
+
+        assert undo_pending_import(excel_path) == 2
+
+        wb = openpyxl.load_workbook(excel_path)
+        assert wb.active.max_row == 3 or wb.active['A4'].value is None
+        wb.close()
+        assert [row for row in read_test_workbook(excel_path) if any(row)] == before
+        assert ImportJournal(excel_path).pending() is None
+
+        index = DedupIndex(index_path_for(excel_path))
+        try:
+            assert index.last_row == 3
+            assert index.last_key == ('20250103', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師')
+            assert len(index.load_keys()) == 2
+        finally:
+            index.close()
+
+        # 取り消した行は再度取り込める
+        result = append_batches_to_workbook(excel_path, [make_df(INCOMING)], engine='openpyxl')
+        assert result.appended_rows == 2
+
+    def test_undo_after_change(self, tmp_path):
+        """取り込み後にExcelファイルが変更された場合は取り消さないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        interrupted_import(excel_path)
+        wb = openpyxl.load_workbook(excel_path)
+        wb.active['C2'] = '手入力'
+        wb.save(excel_path)
+
+        with pytest.raises(ValueError):
+            undo_pending_import(excel_path)
+
+        assert len(read_test_workbook(excel_path)) == 4
+
+    def test_undo_save_failed(self, tmp_path):
+        """取り消しの保存に失敗した場合は行を削除したブックを再利用しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        interrupted_import(excel_path)
+
+        with patch('services.excel_processor._workbook_cache_enabled', return_value=True), \
+                patch('services.excel_processor.atomic_write', side_effect=PermissionError):
+            with pytest.raises(PermissionError):
+                undo_pending_import(excel_path)
+
+        assert workbook_cache.take(excel_path) is None
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1001, 1002, 1003, 1005]
+        assert ImportJournal(excel_path).pending() is not None
+
+    def test_nothing_to_undo(self, tmp_path):
+        """取り消せる取り込みがない場合のテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+
+        with pytest.raises(ValueError):
+            undo_pending_import(excel_path)
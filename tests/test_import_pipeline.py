@@ -0,0 +1,235 @@
+import datetime
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from cli import main
+from services.excel_processor import ExcelFileLockedError
+from services.import_pipeline import format_stats, run_batch_import, run_import
+from tests.conftest import create_test_workbook, make_df, read_test_workbook, write_papyrus_csv
+
+INCOMING = [
+    ('2025-01-05', '1005', '伊藤美咲', '診断書', '内科', '田中医師'),
+    ('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師'),
+]
+
+
+@pytest.fixture
+def mock_config(tmp_path):
+    """テスト用のフォルダを設定したConfigManagerのモック"""
+    config = MagicMock()
+    config.get_downloads_path.return_value = str(tmp_path)
+    config.get_processed_path.return_value = str(tmp_path / 'processed')
+    config.get_excel_path.return_value = str(tmp_path / 'default.xlsm')
+    config.get_streaming_threshold_mb.return_value = 100
+    with patch('services.import_pipeline.ConfigManager', return_value=config):
+        yield config
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    existing = [(datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師')]
+    return create_test_workbook(tmp_path / 'test.xlsm', existing)
+
+
+def stage_names(stats, skipped=False):
+    return [stage.name for stage in stats.stages if stage.skipped == skipped]
+
+
+@patch('services.import_pipeline.ensure_directories_exist')
+@patch('services.import_pipeline.cleanup_old_csv_files')
+@patch('services.import_pipeline.process_completed_csv')
+@patch('services.import_pipeline.backup_excel_file')
+@patch('services.import_pipeline.open_and_sort_excel')
+class TestRunImport:
+    def test_run_import(self, mock_open_sort, mock_backup, mock_process_csv, mock_cleanup,
+                        mock_ensure_dirs, tmp_path, mock_config, workbook):
+        """検索からバックアップまでを実行し、段階ごとの行数を記録するテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+
+        with patch('services.import_pipeline.COM_AVAILABLE', False):
+            stats = run_import(excel_path=workbook)
+
+        assert stats.csv_path == csv_path
+        assert stage_names(stats) == ['find', 'load', 'open', 'dedup', 'write', 'format',
+                                      'save', 'index', 'move', 'backup']
+        assert stage_names(stats, skipped=True) == ['sort']
+        rows = {stage.name: stage.rows for stage in stats.stages}
+        assert rows['load'] == 2
+        assert rows['open'] == 1
+        assert rows['dedup'] == 1
+        assert rows['write'] == 1
+
+        assert len(read_test_workbook(workbook)) == 2
+        mock_process_csv.assert_called_once_with(csv_path)
+        mock_backup.assert_called_once_with(workbook)
+        mock_open_sort.assert_not_called()
+
+    def test_run_import_dry_run(self, mock_open_sort, mock_backup, mock_process_csv, mock_cleanup,
+                                mock_ensure_dirs, tmp_path, mock_config, workbook):
+        """確認のみの実行ではファイルを変更しないテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+
+        with patch('services.excel_processor._open_writer') as mock_open_writer:
+            stats = run_import(csv_path, workbook, dry_run=True)
+
+        # 確認のみの実行ではブックを開かずにA～F列のみを読み込む
+        mock_open_writer.assert_not_called()
+        assert stage_names(stats, skipped=True) == ['write', 'format', 'save', 'index',
+                                                    'move', 'backup', 'sort']
+        assert [stage.rows for stage in stats.stages if stage.name == 'dedup'] == [1]
+        assert len(read_test_workbook(workbook)) == 1
+        mock_cleanup.assert_not_called()
+        mock_process_csv.assert_not_called()
+        mock_backup.assert_not_called()
+        mock_open_sort.assert_not_called()
+
+    def test_run_import_sorts_when_com_available(self, mock_open_sort, mock_backup,
+                                                 mock_process_csv, mock_cleanup, mock_ensure_dirs,
+                                                 tmp_path, mock_config, workbook):
+        """COMが使える環境ではExcelでのソートを実行するテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+
+        with patch('services.import_pipeline.COM_AVAILABLE', True):
+            stats = run_import(csv_path, workbook)
+
+        assert 'sort' in stage_names(stats)
+        mock_open_sort.assert_called_once_with(workbook)
+
+    def test_run_import_streaming(self, mock_open_sort, mock_backup, mock_process_csv,
+                                  mock_cleanup, mock_ensure_dirs, tmp_path, mock_config, workbook):
+        """大きなCSVファイルは分割読み込みで取り込むテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+        mock_config.get_streaming_threshold_mb.return_value = 0
+
+        stats = run_import(csv_path, workbook, sort=False)
+
+        assert stats.streamed
+        assert [stage.rows for stage in stats.stages if stage.name == 'load'] == [2]
+        assert len(read_test_workbook(workbook)) == 2
+
+    def test_run_batch_import(self, mock_open_sort, mock_backup, mock_process_csv, mock_cleanup,
+                              mock_ensure_dirs, tmp_path, mock_config, workbook):
+        """複数のCSVファイルを1回の保存で取り込み、読み込めなかったファイルは移動しないテスト"""
+        csv_a = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+        csv_b = str(tmp_path / '0002_20250101120000.csv')
+        with open(csv_b, 'wb') as f:
+            f.write(b'\xff\xfe\x00')
+
+        stats = run_batch_import([csv_a, csv_b], workbook, sort=False)
+
+        assert stats.csv_path == csv_a
+        assert stage_names(stats)[:2] == ['load', 'open']
+        assert len(read_test_workbook(workbook)) == 2
+        mock_process_csv.assert_called_once_with(csv_a)
+        mock_backup.assert_called_once_with(workbook)
+
+    def test_run_import_no_csv(self, mock_open_sort, mock_backup, mock_process_csv, mock_cleanup,
+                               mock_ensure_dirs, tmp_path, mock_config, workbook):
+        """CSVファイルがない場合のテスト"""
+        with pytest.raises(FileNotFoundError):
+            run_import(excel_path=workbook)
+
+    def test_run_import_excel_locked(self, mock_open_sort, mock_backup, mock_process_csv,
+                                     mock_cleanup, mock_ensure_dirs, tmp_path, mock_config,
+                                     workbook):
+        """Excelファイルが開かれている場合は例外を送出し、CSVファイルを移動しないテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+
+        with patch('services.excel_processor.load_workbook', side_effect=PermissionError):
+            with pytest.raises(ExcelFileLockedError):
+                run_import(csv_path, workbook)
+
+        mock_process_csv.assert_not_called()
+        mock_backup.assert_not_called()
+
+    def test_run_import_resumes_after_crash(self, mock_open_sort, mock_backup, mock_process_csv,
+                                            mock_cleanup, mock_ensure_dirs, tmp_path, mock_config,
+                                            workbook):
+        """保存後に中断した取り込みは書き込みをやり直さずに移動とバックアップのみを行うテスト"""
+        csv_path = write_papyrus_csv(tmp_path / '0001_20250101120000.csv')
+        mock_process_csv.side_effect = OSError("移動に失敗しました")
+        with pytest.raises(OSError):
+            run_import(csv_path, workbook, sort=False)
+        mock_process_csv.reset_mock(side_effect=True)
+        mock_backup.reset_mock()
+
+        with patch('services.import_journal.process_completed_csv') as mock_resume_csv, \
+                patch('services.import_journal.backup_excel_file') as mock_resume_backup, \
+                patch('services.import_pipeline.append_batches_to_workbook') as mock_append:
+            stats = run_import(excel_path=workbook, sort=False)
+
+        assert stats.resumed
+        assert stats.csv_path == csv_path
+        assert stage_names(stats) == ['resume']
+        mock_append.assert_not_called()
+        mock_resume_csv.assert_called_once_with(csv_path)
+        mock_resume_backup.assert_called_once_with(workbook)
+        assert len(read_test_workbook(workbook)) == 2
+
+
+class TestCli:
+    @patch('cli.run_import')
+    def test_main_json_stats(self, mock_run_import, capsys):
+        """JSON形式で実行結果を出力するテスト"""
+        from services.import_pipeline import ImportStats, StageResult
+        mock_run_import.return_value = ImportStats('a.csv', 'b.xlsm', stages=[StageResult('find', 0.5)])
+
+        assert main(['--csv', 'a.csv', '--excel', 'b.xlsm', '--dry-run', '--json-stats']) == 0
+
+        mock_run_import.assert_called_once_with('a.csv', 'b.xlsm', dry_run=True, sort=True)
+        data = json.loads(capsys.readouterr().out)
+        assert data['csv_path'] == 'a.csv'
+        assert data['stages'][0]['name'] == 'find'
+        assert data['total_seconds'] == 0.5
+
+    @patch('cli.run_import', side_effect=FileNotFoundError("見つかりません"))
+    def test_main_error(self, mock_run_import, capsys):
+        """エラー時は終了コード1を返すテスト"""
+        assert main(['--no-sort']) == 1
+
+        mock_run_import.assert_called_once_with(None, None, dry_run=False, sort=False)
+        assert "見つかりません" in capsys.readouterr().err
+
+    def test_main_undo(self, tmp_path, capsys):
+        """保存後に中断した取り込みで追記した行を取り消すテスト"""
+        from services.excel_processor import append_batches_to_workbook
+        from services.import_journal import ImportJournal
+        existing = [(datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師')]
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', existing)
+        journal = ImportJournal(excel_path)
+        journal.begin(['0001_20250101120000.csv'])
+        append_batches_to_workbook(excel_path, [make_df(INCOMING)], journal=journal)
+
+        assert main(['--excel', excel_path, '--undo']) == 0
+
+        assert "2行の追記を取り消しました" in capsys.readouterr().out
+        assert [row for row in read_test_workbook(excel_path) if any(row)] == existing
+        assert main(['--excel', excel_path, '--undo']) == 1
+
+    def test_main_rollback(self, tmp_path, capsys):
+        """Excelファイルを最後に保存する前の状態に戻すテスト"""
+        from services.excel_processor import append_batches_to_workbook
+        existing = [(datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師')]
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', existing)
+        append_batches_to_workbook(excel_path, [make_df(INCOMING)])
+
+        assert main(['--excel', excel_path, '--rollback']) == 0
+
+        assert "保存前の状態に戻しました" in capsys.readouterr().out
+        assert [row for row in read_test_workbook(excel_path) if any(row)] == existing
+        assert main(['--excel', excel_path, '--rollback']) == 1
+
+    def test_format_stats(self):
+        """処理段階ごとの所要時間と行数を表示するテスト"""
+        from services.import_pipeline import ImportStats, StageResult
+        stats = ImportStats('a.csv', 'b.xlsm', stages=[
+            StageResult('load', 1.25, 1200),
+            StageResult('sort', skipped=True),
+        ])
+
+        text = format_stats(stats)
+
+        assert "1,200行" in text
+        assert "sort     スキップ" in text
@@ -112,6 +112,30 @@ class TestMainWindow:
         assert args[1] == "エラー"  # タイトル
         assert "テストエラー" in args[2]  # エラーメッセージ
 
+    @patch('app.main_window.transfer_all_csv_to_excel')
+    def test_import_all_csv_success(self, mock_transfer_all, app, backup_config):
+        """未処理CSV一括インポート成功のテスト"""
+        window = MainWindow()
+
+        window.import_all_csv()
+
+        mock_transfer_all.assert_called_once()
+
+    @patch('app.main_window.transfer_all_csv_to_excel')
+    @patch('app.main_window.QMessageBox.critical')
+    def test_import_all_csv_error(self, mock_critical, mock_transfer_all, app, backup_config):
+        """未処理CSV一括インポートエラーのテスト"""
+        mock_transfer_all.side_effect = Exception("テストエラー")
+
+        window = MainWindow()
+        window.import_all_csv()
+
+        mock_critical.assert_called_once()
+        args = mock_critical.call_args[0]
+        assert args[0] == window
+        assert args[1] == "エラー"
+        assert "テストエラー" in args[2]
+
     @patch('app.main_window.ExcludeDocsDialog')
     def test_show_exclude_docs_dialog(self, mock_dialog, app, backup_config):
         """除外文書ダイアログ表示テスト"""
@@ -201,3 +225,23 @@ class TestMainWindow:
 
         # closeメソッドが呼ばれたことを確認
         mock_close.assert_called_once()
+
+    @patch('app.main_window.backup_worker')
+    def test_cleanup_in_background(self, mock_worker, app, backup_config):
+        """起動時の古いバックアップの削除をワーカースレッドに依頼するテスト"""
+        from services.file_manager import cleanup_old_backup_files
+
+        MainWindow()
+
+        mock_worker.submit.assert_called_once_with(cleanup_old_backup_files)
+
+    @patch('app.main_window.QMessageBox.warning')
+    def test_backup_failure_reported(self, mock_warning, app, backup_config):
+        """バックアップの失敗を警告ダイアログで表示するテスト"""
+        from services.backup_worker import BackupJob
+        window = MainWindow()
+
+        window.on_backup_finished(BackupJob('backup_excel_file', print, error=OSError("書き込めません")))
+
+        mock_warning.assert_called_once()
+        assert "書き込めません" in mock_warning.call_args[0][2]
@@ -0,0 +1,80 @@
+import os
+import time
+
+from services.retention_manifest import MANIFEST_NAME, RetentionManifest, scan_files
+
+DAY = 24 * 60 * 60
+
+
+def write_file(path, size, mtime):
+    path.write_bytes(b'a' * size)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def open_manifest(directory):
+    return RetentionManifest(directory, lambda: scan_files(directory, ('*.csv',)))
+
+
+class TestRetentionManifest:
+    def test_expire_from_manifest(self, tmp_path):
+        """索引に記録したファイルのうち保持期間を過ぎたもののみを削除するテスト"""
+        now = time.time()
+        manifest = open_manifest(tmp_path)
+        manifest.add(write_file(tmp_path / 'a.csv', 10, now - 20 * DAY))
+        manifest.add(write_file(tmp_path / 'b.csv', 10, now - 1 * DAY))
+        # 索引にないファイルは照合するまで対象外
+        write_file(tmp_path / 'c.csv', 10, now - 20 * DAY)
+
+        expired = open_manifest(tmp_path).expire(now - 14 * DAY)
+
+        assert [entry.name for entry in expired] == ['a.csv']
+        assert sorted(path.name for path in tmp_path.glob('*.csv')) == ['b.csv', 'c.csv']
+        assert [entry.name for entry in open_manifest(tmp_path).entries()] == ['b.csv']
+
+    def test_reconcile(self, tmp_path):
+        """アプリ以外で追加・削除されたファイルを照合で反映するテスト"""
+        now = time.time()
+        manifest = open_manifest(tmp_path)
+        manifest.add(write_file(tmp_path / 'a.csv', 10, now))
+        (tmp_path / 'a.csv').unlink()
+        write_file(tmp_path / 'b.csv', 10, now - 20 * DAY)
+        assert manifest.needs_reconcile(DAY)
+
+        assert manifest.reconcile() == (1, 1)
+
+        manifest = open_manifest(tmp_path)
+        assert not manifest.needs_reconcile(DAY)
+        assert [entry.name for entry in manifest.entries()] == ['b.csv']
+        assert manifest.expire(now - 14 * DAY)[0].name == 'b.csv'
+
+    def test_disk_budget(self, tmp_path):
+        """容量の上限を超える分を古い順に削除するテスト"""
+        now = time.time()
+        manifest = open_manifest(tmp_path)
+        for i, name in enumerate(['c.csv', 'a.csv', 'b.csv']):
+            manifest.add(write_file(tmp_path / name, 100, now - (3 - i) * DAY))
+
+        expired = manifest.expire(now - 14 * DAY, max_bytes=150)
+
+        assert [entry.name for entry in expired] == ['c.csv', 'a.csv']
+        assert manifest.total_size == 100
+        assert [path.name for path in tmp_path.glob('*.csv')] == ['b.csv']
+
+    def test_torn_line_and_compaction(self, tmp_path):
+        """書き込み途中の行を無視し、削除の記録が増えたら索引を書き直すテスト"""
+        now = time.time()
+        manifest = open_manifest(tmp_path)
+        for i in range(120):
+            manifest.add(write_file(tmp_path / f'{i:03d}.csv', 1, now - 20 * DAY))
+        manifest.add(write_file(tmp_path / 'new.csv', 1, now))
+        with open(tmp_path / MANIFEST_NAME, 'a', encoding='utf-8') as f:
+            f.write('{"op": "add", "name": "書き込み途中')
+
+        manifest = open_manifest(tmp_path)
+        assert len(manifest.entries()) == 121
+        assert len(manifest.expire(now - 14 * DAY)) == 120
+
+        lines = (tmp_path / MANIFEST_NAME).read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 1
+        assert [entry.name for entry in open_manifest(tmp_path).entries()] == ['new.csv']
@@ -0,0 +1,116 @@
+import datetime
+import time
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from services.excel_processor import ExcelFileLockedError, append_batches_to_workbook
+from services.workbook_cache import WorkbookCache, workbook_cache
+from tests.conftest import create_test_workbook, make_df, read_test_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+]
+
+
+@pytest.fixture(autouse=True)
+def without_com_sort():
+    """取り込み後にExcelでソートしない（ソートする場合はブックを再利用しないため）"""
+    with patch('services.excel_processor.COM_AVAILABLE', False):
+        yield
+
+
+class TestWorkbookCache:
+    def test_take_after_put(self, tmp_path):
+        """保存後に変更されていないブックは同じオブジェクトを取り出すテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        cache = WorkbookCache()
+        workbook = openpyxl.load_workbook(excel_path)
+
+        assert cache.put(excel_path, workbook)
+
+        assert cache.take(str(tmp_path / 'other.xlsm')) is None
+        cache.put(excel_path, workbook)
+        assert cache.take(excel_path) is workbook
+        assert cache.take(excel_path) is None  # 取り出したブックは保持しない
+
+    def test_idle_release(self, tmp_path):
+        """一定時間使われなかったブックは解放するテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        cache = WorkbookCache()
+        cache.configure(idle_seconds=0.05, max_memory_mb=512)
+
+        cache.put(excel_path, openpyxl.load_workbook(excel_path))
+        time.sleep(0.3)
+
+        assert cache.take(excel_path) is None
+
+    def test_too_large(self, tmp_path):
+        """最大メモリ使用量を超えるブックは保持しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        cache = WorkbookCache()
+        cache.configure(idle_seconds=300, max_memory_mb=0)
+
+        assert not cache.put(excel_path, openpyxl.load_workbook(excel_path))
+        assert cache.take(excel_path) is None
+
+
+class TestAppendWithCache:
+    def test_second_import_skips_load(self, tmp_path):
+        """同じセッションの2回目の取り込みではExcelファイルを読み込まないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        append_batches_to_workbook(excel_path, [make_df([
+            ('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師'),
+        ])], engine='openpyxl')
+
+        with patch('services.excel_processor.load_workbook') as mock_load:
+            result = append_batches_to_workbook(excel_path, [make_df([
+                ('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師'),
+                ('2025-01-03', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師'),
+            ])], engine='openpyxl')
+
+        mock_load.assert_not_called()
+        assert result.appended_rows == 1
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1001, 1002, 1003]
+
+    def test_external_change_reloads(self, tmp_path):
+        """保存後にファイルが変更された場合は読み込み直すテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        append_batches_to_workbook(excel_path, [make_df([])], engine='openpyxl')
+        wb = openpyxl.load_workbook(excel_path)
+        wb.active.append([datetime.datetime(2025, 1, 2), 1002, '手入力'])
+        wb.save(excel_path)
+
+        with patch('services.excel_processor.load_workbook', wraps=openpyxl.load_workbook) as mock_load:
+            append_batches_to_workbook(excel_path, [make_df([
+                ('2025-01-03', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師'),
+            ])], engine='openpyxl')
+
+        mock_load.assert_called_once()
+        assert [row[2] for row in read_test_workbook(excel_path)] == ['山田太郎', '手入力', '高橋一郎']
+
+    def test_failed_save_not_cached(self, tmp_path):
+        """保存に失敗した（ファイルと内容が異なる）ブックは再利用しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        df = make_df([('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')])
+
+        with patch('openpyxl.workbook.workbook.Workbook.save', side_effect=PermissionError):
+            with pytest.raises(ExcelFileLockedError):
+                append_batches_to_workbook(excel_path, [df], engine='openpyxl')
+
+        assert workbook_cache.take(excel_path) is None
+        result = append_batches_to_workbook(excel_path, [df], engine='openpyxl')
+        assert result.appended_rows == 1
+        assert len(read_test_workbook(excel_path)) == 2
+
+    def test_not_cached_with_com_sort(self, tmp_path):
+        """取り込み後にExcelでソートする場合はブックを保持しないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        df = make_df([('2025-01-02', '1002', '鈴木花子', '意見書', '外科', '佐藤医師')])
+
+        with patch('services.excel_processor.COM_AVAILABLE', True), \
+                patch('services.excel_processor.ConfigManager.get_com_sort_enabled', return_value=True):
+            append_batches_to_workbook(excel_path, [df], engine='openpyxl')
+
+        assert workbook_cache.take(excel_path) is None
@@ -0,0 +1,165 @@
+import datetime
+import zipfile
+from unittest.mock import patch
+
+import openpyxl
+import polars as pl
+import pytest
+
+from services.excel_processor import _read_existing_keys, append_batches_to_workbook, get_last_row
+from services.workbook_reader import KEY_COLUMNS, read_key_columns
+from tests.conftest import create_test_workbook
+
+MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+REL_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PKG_REL_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+
+def read_keys_with_openpyxl(path):
+    """従来の方法（openpyxlでセルを1つずつ読み込み）で既存データのキーを取得"""
+    wb = openpyxl.load_workbook(path, keep_vba=True)
+    ws = wb.active
+    last_row = get_last_row(ws)
+    keys = _read_existing_keys(ws, last_row)
+    wb.close()
+    wb.vba_archive.close()
+    return keys, last_row
+
+
+def write_shared_strings_workbook(path):
+    """Excelと同様に共有文字列と表示形式を使うテスト用のExcelファイルを作成"""
+    sheet = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><dimension ref="A1:F3"/><sheetData>
+<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c></row>
+<row r="2"><c r="A2" s="1"><v>45658</v></c><c r="B2"><v>1001</v></c><c r="C2" t="s"><v>2</v></c>
+<c r="D2" t="s"><v>3</v></c><c r="E2" t="inlineStr"><is><t>内科</t></is></c><c r="F2" t="str"><f>"田"&amp;"中"</f><v>田中</v></c></row>
+<row r="3"><c r="A3" t="s"><v>4</v></c><c r="B3"><v>1.5</v></c><c r="C3" s="1"/><c r="F3" t="b"><v>0</v></c></row>
+<row r="5"><c r="A5"><v>1</v></c></row>
+</sheetData></worksheet>'''
+    shared_strings = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<sst xmlns="{MAIN_NS}" count="5" uniqueCount="5">
+<si><t>預り日</t></si><si><t>患者ID</t></si>
+<si><t>山田太郎</t><rPh sb="0" eb="2"><t>ヤマダ</t></rPh></si>
+<si><r><t>診断</t></r><r><rPr><b/></rPr><t>書</t></r></si>
+<si><t>20250102</t></si>
+</sst>'''
+    styles = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="{MAIN_NS}"><numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy/mm/dd"/></numFmts>
+<cellStyleXfs count="1"><xf numFmtId="0"/></cellStyleXfs><cellXfs count="2"><xf numFmtId="0"/><xf numFmtId="164" applyNumberFormat="1"/></cellXfs></styleSheet>'''
+    workbook = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><bookViews><workbookView activeTab="0"/></bookViews>
+<sheets><sheet name="Sheet1" sheetId="1" r:id="rId1"/></sheets></workbook>'''
+    rels = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="{PKG_REL_NS}">
+<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="{REL_NS}/sharedStrings" Target="sharedStrings.xml"/>
+<Relationship Id="rId3" Type="{REL_NS}/styles" Target="styles.xml"/>
+</Relationships>'''
+    root_rels = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="{PKG_REL_NS}">
+<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>'''
+    content_types = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>'''
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', content_types)
+        zf.writestr('_rels/.rels', root_rels)
+        zf.writestr('xl/workbook.xml', workbook)
+        zf.writestr('xl/_rels/workbook.xml.rels', rels)
+        zf.writestr('xl/worksheets/sheet1.xml', sheet)
+        zf.writestr('xl/sharedStrings.xml', shared_strings)
+        zf.writestr('xl/styles.xml', styles)
+    return str(path)
+
+
+class TestReadKeyColumns:
+    def test_matches_openpyxl(self, tmp_path):
+        """openpyxlで読み込んだ場合と同じキーと最終行を取得するテスト"""
+        path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+            ('20250102', '1,002', None, 0, 1.5, True),
+            (None, None, None, None, None, None, None, 'H列のみ'),
+        ])
+        wb = openpyxl.load_workbook(path)
+        wb.active.append([])
+        wb.active.append(['空行の後のデータ'])
+        wb.save(path)
+
+        sheet_keys = read_key_columns(path)
+
+        keys, last_row = read_keys_with_openpyxl(path)
+        assert sheet_keys.last_row == last_row == 6
+        assert sheet_keys.key_set() == keys
+        assert sheet_keys.frame.columns == KEY_COLUMNS
+        assert sheet_keys.frame.schema == {name: pl.String for name in KEY_COLUMNS}
+
+    @pytest.mark.filterwarnings("ignore:Workbook contains no default style")
+    def test_shared_strings_and_styles(self, tmp_path):
+        """共有文字列（ふりがな・書式付き）と日付の表示形式を解決するテスト"""
+        path = write_shared_strings_workbook(tmp_path / 'shared.xlsm')
+
+        sheet_keys = read_key_columns(path)
+
+        keys, last_row = read_keys_with_openpyxl(path)
+        assert sheet_keys.last_row == last_row == 5
+        assert sheet_keys.key_set() == keys
+        assert sheet_keys.frame.rows() == [
+            ('20250101', '1001', '山田太郎', '診断書', '内科', '="田"&"中"'),
+            ('20250102', '1.5', '', '', '', ''),
+            ('', '', '', '', '', ''),
+            ('1', '', '', '', '', ''),
+        ]
+
+    def test_active_sheet(self, tmp_path):
+        """アクティブシートから読み込むテスト"""
+        path = create_test_workbook(tmp_path / 'test.xlsm', [])
+        wb = openpyxl.load_workbook(path)
+        other = wb.create_sheet('別シート')
+        other.append(['見出し'])
+        other.append(['20250101', 1001])
+        wb.active = 1
+        wb.save(path)
+
+        sheet_keys = read_key_columns(path)
+
+        assert sheet_keys.last_row == 2
+        assert sheet_keys.frame.rows() == [('20250101', '1001', '', '', '', '')]
+
+    def test_empty_sheet(self, tmp_path):
+        """データのないシートのテスト"""
+        path = tmp_path / 'empty.xlsm'
+        openpyxl.Workbook().save(path)
+
+        sheet_keys = read_key_columns(str(path))
+
+        assert sheet_keys.last_row == 0
+        assert sheet_keys.frame.is_empty()
+
+    def test_invalid_file(self, tmp_path):
+        """Excelファイルでない場合は例外を送出するテスト"""
+        path = tmp_path / 'invalid.xlsm'
+        path.write_bytes(b'not a zip file')
+
+        with pytest.raises(zipfile.BadZipFile):
+            read_key_columns(str(path))
+
+    def test_writer_falls_back_to_openpyxl(self, tmp_path):
+        """XMLを読み込めない場合はセルごとの読み込みで重複チェックするテスト"""
+        path = create_test_workbook(tmp_path / 'test.xlsm', [
+            (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+        ])
+        df = pl.DataFrame([('2025-01-01', '1001', '山田太郎', '診断書', '内科', '田中医師')],
+                          schema=KEY_COLUMNS, orient='row')
+
+        with patch('services.excel_processor.read_key_columns', side_effect=KeyError('sheet')):
+            result = append_batches_to_workbook(path, [df])
+
+        assert result.existing_rows == 1
+        assert result.appended_rows == 0
@@ -0,0 +1,176 @@
+import datetime
+import shutil
+import zipfile
+from unittest.mock import patch
+
+import openpyxl
+import pytest
+
+from services.excel_processor import ExcelFileLockedError, append_batches_to_workbook
+from services.workbook_reader import read_key_columns
+from services.xlsm_patcher import WorkbookPatchError, XlsmPatcher
+from tests.conftest import VBA_PROJECT, add_vba_project, create_test_workbook, make_df, read_test_workbook
+from tests.test_workbook_reader import write_shared_strings_workbook
+
+EXISTING_ROWS = [
+    (datetime.datetime(2025, 1, 1), 1001, '山田太郎', '診断書', '内科', '田中医師'),
+]
+INCOMING = make_df([
+    ('2025-01-01', '1001', '山田太郎', '診断書', '内科', '田中医師'),
+    ('2025-01-02', '1,002', ' 鈴木花子 ', '<意見書>&', '外科', None),
+    ('不明', 'ID不明', '', '紹介状', '眼科', '伊藤医師'),
+])
+
+
+def read_cells(path):
+    """アクティブシートのすべてのセルの値・表示形式・配置を取得"""
+    wb = openpyxl.load_workbook(path)
+    ws = wb.active
+    cells = [[(cell.value, cell.number_format, cell.alignment.horizontal, cell.alignment.shrink_to_fit)
+              for cell in row] for row in ws.iter_rows()]
+    dimensions = ws.dimensions
+    wb.close()
+    return cells, dimensions
+
+
+class TestXlsmPatcher:
+    def test_same_cells_as_openpyxl(self, tmp_path):
+        """openpyxlで書き込んだ場合と同じ値・表示形式・配置になるテスト"""
+        openpyxl_path = create_test_workbook(tmp_path / 'openpyxl.xlsm', EXISTING_ROWS)
+        patch_path = shutil.copyfile(openpyxl_path, tmp_path / 'patch.xlsm')
+
+        expected = append_batches_to_workbook(openpyxl_path, [INCOMING], engine='openpyxl')
+        result = append_batches_to_workbook(str(patch_path), [INCOMING], engine='patch')
+
+        assert result.appended_rows == expected.appended_rows == 2
+        assert read_cells(patch_path) == read_cells(openpyxl_path)
+        assert read_test_workbook(patch_path)[1] == (
+            datetime.datetime(2025, 1, 2), 1002, ' 鈴木花子 ', '<意見書>&', '外科', None)
+
+    def test_untouched_parts_are_copied(self, tmp_path):
+        """ワークシート以外の部品（マクロを含む）は内容を変更しないテスト"""
+        excel_path = add_vba_project(create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS))
+        with zipfile.ZipFile(excel_path) as zf:
+            before = {name: zf.read(name) for name in zf.namelist()}
+
+        append_batches_to_workbook(excel_path, [INCOMING], engine='patch')
+
+        with zipfile.ZipFile(excel_path) as zf:
+            after = {name: zf.read(name) for name in zf.namelist()}
+        assert list(after) == list(before)
+        assert after['xl/vbaProject.bin'] == VBA_PROJECT
+        changed = [name for name in before if after[name] != before[name]]
+        assert changed == ['xl/worksheets/sheet1.xml', 'xl/styles.xml']
+
+    def test_untouched_parts_not_recompressed(self, tmp_path):
+        """変更しない部品は再圧縮せずに圧縮済みのデータのままコピーするテスト"""
+        source_path = create_test_workbook(tmp_path / 'source.xlsm', EXISTING_ROWS)
+        excel_path = str(tmp_path / 'test.xlsm')
+        # 既定と異なる圧縮レベルで作成し、再圧縮すると圧縮後のサイズが変わるようにする
+        with zipfile.ZipFile(source_path) as src, \
+                zipfile.ZipFile(excel_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as dst:
+            for name in src.namelist():
+                dst.writestr(name, src.read(name))
+        with zipfile.ZipFile(excel_path) as zf:
+            before = {info.filename: (info.CRC, info.compress_size) for info in zf.infolist()}
+
+        append_batches_to_workbook(excel_path, [INCOMING], engine='patch')
+
+        with zipfile.ZipFile(excel_path) as zf:
+            assert zf.testzip() is None
+            after = {info.filename: (info.CRC, info.compress_size) for info in zf.infolist()}
+        untouched = [name for name in before if name not in ('xl/worksheets/sheet1.xml', 'xl/styles.xml')]
+        assert untouched
+        assert {name: after[name] for name in untouched} == {name: before[name] for name in untouched}
+
+    @pytest.mark.filterwarnings("ignore:Workbook contains no default style")
+    def test_shared_strings(self, tmp_path):
+        """共有文字列を使うファイルでは共有文字列に追加して参照するテスト"""
+        excel_path = write_shared_strings_workbook(tmp_path / 'shared.xlsm')
+
+        # 既存データが並べ替えられていないため、並べ替えずに末尾へ追記する
+        with patch('services.excel_processor.ConfigManager.get_sorted_insert_enabled', return_value=False):
+            append_batches_to_workbook(excel_path, [INCOMING[1:]], engine='patch')
+
+        with zipfile.ZipFile(excel_path) as zf:
+            shared_strings = zf.read('xl/sharedStrings.xml').decode('utf-8')
+            sheet = zf.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        assert 'count="13" uniqueCount="13"' in shared_strings
+        assert '<si><t>伊藤医師</t></si>' in shared_strings
+        assert '<dimension ref="A1:F7"/>' in sheet
+        assert 'inlineStr' not in sheet.split('<row r="6">')[1]
+
+        sheet_keys = read_key_columns(excel_path)
+        assert sheet_keys.last_row == 7
+        assert sheet_keys.frame.rows()[-2:] == [
+            ('20250102', '1002', ' 鈴木花子 ', '<意見書>&', '外科', ''),
+            ('不明', 'ID不明', '', '紹介状', '眼科', '伊藤医師'),
+        ]
+
+    def test_empty_sheet(self, tmp_path):
+        """データのないシートにも追記できるテスト"""
+        path = tmp_path / 'empty.xlsm'
+        openpyxl.Workbook().save(path)
+
+        append_batches_to_workbook(str(path), [INCOMING[:1]], engine='patch')
+
+        assert read_test_workbook(path) == []
+        wb = openpyxl.load_workbook(path)
+        assert wb.active['A1'].value == datetime.datetime(2025, 1, 1)
+        wb.close()
+
+    def test_rows_after_last_row(self, tmp_path):
+        """追記先に書式のみの行がある場合はpatchを使わないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        wb = openpyxl.load_workbook(excel_path)
+        wb.active.cell(row=10, column=1).number_format = '0.00'
+        wb.save(excel_path)
+
+        patcher = XlsmPatcher(excel_path)
+        with pytest.raises(WorkbookPatchError):
+            patcher.prepare(3)
+
+        result = append_batches_to_workbook(excel_path, [INCOMING], engine='patch')
+
+        assert result.appended_rows == 2
+        assert len(read_test_workbook(excel_path)) == 9
+        assert read_test_workbook(excel_path)[2][1] == 'ID不明'
+
+    def test_save_locked(self, tmp_path):
+        """置き換え先のファイルが開かれている場合は例外を送出し、一時ファイルを残さないテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+
+        with patch('services.atomic_save.os.replace', side_effect=PermissionError):
+            with pytest.raises(ExcelFileLockedError):
+                append_batches_to_workbook(excel_path, [INCOMING], engine='patch')
+
+        names = sorted(path.name for path in tmp_path.iterdir())
+        assert [name for name in names if not name.endswith('.dedup.sqlite')] == ['test.xlsm']
+        assert len(read_test_workbook(excel_path)) == 1
+
+    def test_insert_before_last_row(self, tmp_path, capsys):
+        """既存データの途中に並ぶ行がある場合はopenpyxlで挿入するテスト"""
+        excel_path = add_vba_project(create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS))
+
+        with patch('services.excel_processor._sorted_insert_enabled', return_value=True):
+            result = append_batches_to_workbook(excel_path, [make_df([
+                ('2024-12-31', '1000', '高橋一郎', '紹介状', '眼科', '伊藤医師'),
+            ])], engine='patch')
+
+        assert result.appended_rows == 1
+        assert "openpyxlで書き込みます" in capsys.readouterr().out
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1000, 1001]
+
+    def test_append_after_last_key_from_index(self, tmp_path):
+        """インデックスに記録した最終行のキーより後に並ぶ場合はpatchで追記するテスト"""
+        excel_path = create_test_workbook(tmp_path / 'test.xlsm', EXISTING_ROWS)
+        append_batches_to_workbook(excel_path, [INCOMING[1:2]], engine='patch')
+
+        with patch('services.excel_processor.load_workbook') as mock_load:
+            result = append_batches_to_workbook(excel_path, [make_df([
+                ('2025-01-03', '1003', '高橋一郎', '紹介状', '眼科', '伊藤医師'),
+            ])], engine='patch')
+
+        mock_load.assert_not_called()
+        assert result.appended_rows == 1
+        assert [row[1] for row in read_test_workbook(excel_path)] == [1001, 1002, 1003]
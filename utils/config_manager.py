@@ -166,6 +166,133 @@ class ConfigManager:
         self.config['Backup']['retention_days'] = str(days)
         self.save_config()
 
+    def get_backup_mode(self) -> str:
+        """バックアップの作成方法を取得（snapshot: zip内の部品ごとに重複を除いて保存、copy: ファイル全体をコピー）"""
+        if 'Backup' not in self.config:
+            return 'snapshot'
+        mode = self.config.get('Backup', 'mode', fallback='snapshot').strip().lower()
+        return mode if mode in ('snapshot', 'copy') else 'snapshot'
+
+    def get_backup_max_disk_mb(self) -> int:
+        """バックアップフォルダの容量の上限（MB）を取得（0は制限なし）"""
+        if 'Backup' not in self.config:
+            return 0
+        return self.config.getint('Backup', 'max_disk_mb', fallback=0)
+
+    def get_retention_reconcile_hours(self) -> float:
+        """保持期間の索引をフォルダの内容と照合する間隔（時間）を取得"""
+        if 'Backup' not in self.config:
+            return 24.0
+        return self.config.getfloat('Backup', 'reconcile_hours', fallback=24.0)
+
+    def get_archive_enabled(self) -> bool:
+        """処理済みCSVをParquetのアーカイブに保存するかを取得"""
+        if 'Archive' not in self.config:
+            return True
+        return self.config.getboolean('Archive', 'enabled', fallback=True)
+
+    def get_archive_path(self) -> str:
+        """アーカイブのフォルダを取得（未設定の場合は処理済みCSVフォルダのarchive）"""
+        if 'Archive' not in self.config:
+            return os.path.join(self.get_processed_path(), 'archive')
+        path = self.config.get('Archive', 'path', fallback='').strip()
+        return path or os.path.join(self.get_processed_path(), 'archive')
+
+    def get_archive_max_parts(self) -> int:
+        """アーカイブの年月ごとのファイル数の上限を取得（超えた場合は1つにまとめる）"""
+        if 'Archive' not in self.config:
+            return 8
+        return self.config.getint('Archive', 'max_parts', fallback=8)
+
+    def get_watcher_enabled(self) -> bool:
+        """ダウンロードフォルダの自動監視を有効にするかを取得"""
+        if 'Watcher' not in self.config:
+            return False
+        return self.config.getboolean('Watcher', 'enabled', fallback=False)
+
+    def set_watcher_enabled(self, enabled: bool) -> None:
+        """ダウンロードフォルダの自動監視を有効にするかを設定"""
+        if 'Watcher' not in self.config:
+            self.config['Watcher'] = {}
+        self.config['Watcher']['enabled'] = str(enabled)
+        self.save_config()
+
+    def get_watcher_stable_seconds(self) -> float:
+        """CSVファイルの書き込み完了とみなすまでの待機秒数を取得"""
+        if 'Watcher' not in self.config:
+            return 2.0
+        return self.config.getfloat('Watcher', 'stable_seconds', fallback=2.0)
+
+    def get_watcher_debounce_seconds(self) -> float:
+        """続けて出力されたCSVファイルをまとめて取り込むための待機秒数を取得"""
+        if 'Watcher' not in self.config:
+            return 3.0
+        return self.config.getfloat('Watcher', 'debounce_seconds', fallback=3.0)
+
+    def get_watcher_poll_interval(self) -> float:
+        """フォルダを確認する間隔（秒）を取得"""
+        if 'Watcher' not in self.config:
+            return 1.0
+        return self.config.getfloat('Watcher', 'poll_interval', fallback=1.0)
+
+    def get_streaming_threshold_mb(self) -> int:
+        """CSVファイルを分割して読み込むファイルサイズ（MB）を取得"""
+        if 'Import' not in self.config:
+            return 100
+        return self.config.getint('Import', 'streaming_threshold_mb', fallback=100)
+
+    def get_parallel_load_threshold_mb(self) -> int:
+        """複数のCSVファイルをプロセスプールで読み込む合計サイズ（MB）を取得"""
+        if 'Import' not in self.config:
+            return 50
+        return self.config.getint('Import', 'parallel_load_threshold_mb', fallback=50)
+
+    def get_excel_writer(self) -> str:
+        """Excelへの書き込み方法を取得（openpyxl: ブック全体を読み込んで保存、patch: zip内のXMLに直接追記）"""
+        if 'Import' not in self.config:
+            return 'openpyxl'
+        writer = self.config.get('Import', 'excel_writer', fallback='openpyxl').strip().lower()
+        return writer if writer in ('openpyxl', 'patch') else 'openpyxl'
+
+    def get_sorted_insert_enabled(self) -> bool:
+        """新規データを預り日・診療科・患者IDの順に並べて挿入するかを取得
+
+        文字列はコードポイント順に並べるため、漢字の並びはExcelのソートと異なる場合がある
+        """
+        if 'Import' not in self.config:
+            return False
+        return self.config.getboolean('Import', 'sorted_insert', fallback=False)
+
+    def get_com_sort_enabled(self) -> bool:
+        """取り込み後にExcelでソートを実行するかを取得"""
+        if 'Import' not in self.config:
+            return True
+        return self.config.getboolean('Import', 'com_sort', fallback=True)
+
+    def get_workbook_cache_enabled(self) -> bool:
+        """保存したExcelブックを次の取り込みで再利用するかを取得"""
+        if 'WorkbookCache' not in self.config:
+            return True
+        return self.config.getboolean('WorkbookCache', 'enabled', fallback=True)
+
+    def get_workbook_cache_idle_seconds(self) -> float:
+        """再利用しなかったExcelブックを解放するまでの秒数を取得"""
+        if 'WorkbookCache' not in self.config:
+            return 300.0
+        return self.config.getfloat('WorkbookCache', 'idle_seconds', fallback=300.0)
+
+    def get_workbook_cache_max_memory_mb(self) -> int:
+        """再利用のために保持するExcelブックの最大メモリ使用量（MB）を取得"""
+        if 'WorkbookCache' not in self.config:
+            return 512
+        return self.config.getint('WorkbookCache', 'max_memory_mb', fallback=512)
+
+    def get_dedup_index_enabled(self) -> bool:
+        """重複チェック用インデックスを使用するかを取得"""
+        if 'Dedup' not in self.config:
+            return True
+        return self.config.getboolean('Dedup', 'index_enabled', fallback=True)
+
     def _ensure_section(self, section: str) -> None:
         """設定セクションが存在することを確認し、必要に応じて作成する"""
         if section not in self.config: